@@ -0,0 +1,500 @@
+# bench.py
+# Reproducible benchmarks of the hot paths: brochure parsing (offer -> product flattening),
+# spec extraction, dedup, the ingest batch loop and the price drop query. Runs offline against
+# the recorded brochure fixture, a local stand-in for the Weaviate batch endpoint and a synthetic
+# price history, and stores the results per version in bench/results/ so regressions show up between runs.
+# Each benchmark imports the modules it measures, so `cli.py bench --help` stays fast.
+#
+#   python cli.py bench                      # all benchmarks at 1000, 10000 and 50000 records
+#   python cli.py bench specs ingest --sizes 1000 100000 --label before-refactor
+#   python cli.py bench price-drops price-drops-compacted --sizes 3000000 --repeat 1
+import argparse
+import gc
+import glob
+import io
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+
+FIXTURE_PATH = os.path.join(BENCH_DIR, "fixtures", "brochure.json")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+DEFAULT_SIZES = (1000, 10000, 50000)
+
+# Objects per request sent to the stand-in batch endpoint
+STAND_IN_BATCH_SIZE = 100
+
+# Change (in percent) of throughput or peak memory reported as a regression
+REGRESSION_THRESHOLD = 10.0
+
+# Synthetic price history: observations per product over the window, and rows per part file
+# (the chunk size of the scraper's price history tee)
+OBSERVATIONS_PER_PRODUCT = 30
+PRICE_PART_ROWS = 10000
+PRICE_WINDOW_DAYS = 30
+
+
+# ---- Fixture ----
+
+def load_fixture_offers(path=FIXTURE_PATH):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["offers"]["_embedded"]["contents"]
+
+
+def scaled_offers(size, path=FIXTURE_PATH):
+    """
+    Offers with `size` products in total, cycling through the recorded ones. Every copy gets
+    its own offer id, name, description and price, so memoization does not flatter the numbers
+    and dedup links the copies to canonical products without dropping any as duplicate listings.
+    """
+    templates = [json.dumps(offer, ensure_ascii=False) for offer in load_fixture_offers(path)]
+    offers = []
+    count = 0
+    copy = 0
+    while count < size:
+        offer = json.loads(templates[copy % len(templates)])
+        offer["id"] = str(uuid.UUID(int=copy))
+        offer["products"] = offer["products"][:size - count]
+        for deal in offer.get("deals", []):
+            deal["min"] = round(deal["min"] + copy // len(templates) * 0.01, 2)
+        for product in offer["products"]:
+            product["name"] = f"{product['name']} {copy // len(templates)}"
+            product["description"][0]["paragraph"] += f" Art.-Nr. {copy}"
+        offers.append(offer)
+        count += len(offer["products"])
+        copy += 1
+    return offers
+
+
+def scaled_brochure(size, path=FIXTURE_PATH):
+    """
+    Brochure API response body (bytes) with `size` products.
+    """
+    return json.dumps({"offers": {"_embedded": {"contents": scaled_offers(size, path)}}}).encode("utf-8")
+
+
+def scaled_products(size, path=FIXTURE_PATH):
+    from main import offer_to_products
+
+    return [product for offer in scaled_offers(size, path) for product in offer_to_products(offer)]
+
+
+def write_price_history(size, root, now):
+    """
+    `size` observations of size / 30 products spread over the window, written as sorted part
+    files in crawl order like the scraper writes them. About one product in five is discounted.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from price_history import HISTORY_SCHEMA, SORT_ORDER
+
+    rng = np.random.default_rng(0)
+    products = max(size // OBSERVATIONS_PER_PRODUCT, 1)
+    product_keys = rng.integers(-2 ** 63, 2 ** 63 - 1, products, dtype=np.int64)
+    regular = rng.integers(99, 2000, products) / 100
+    start = int(now.timestamp()) - PRICE_WINDOW_DAYS * 86400
+
+    for part, offset in enumerate(range(0, size, PRICE_PART_ROWS)):
+        rows = min(PRICE_PART_ROWS, size - offset)
+        product = rng.integers(0, products, rows)
+        observed_at = start + (offset + np.arange(rows)) * PRICE_WINDOW_DAYS * 86400 // size
+        discounted = (product % 5 == 0) & (observed_at > start + (PRICE_WINDOW_DAYS - 3) * 86400)
+        prices = np.where(discounted, regular[product] * 0.7, regular[product])
+        table = pa.Table.from_arrays(
+            [pa.array(product_keys[product]), pa.array(observed_at, pa.timestamp("s", tz="UTC")),
+             pa.array(prices, pa.float32()), pa.array([f"offer-{i}" for i in product]),
+             pa.array([f"Product {i}" for i in product])],
+            schema=HISTORY_SCHEMA,
+        )
+        pq.write_table(table.sort_by(SORT_ORDER), os.path.join(root, f"part-{part:06d}.parquet"))
+
+
+# ---- Stand-ins ----
+
+class StandInResponse:
+    """
+    Recorded brochure response, read through .raw like the streamed requests response.
+    """
+
+    def __init__(self, body):
+        self.status_code = 200
+        self.headers = {}
+        self.elapsed = timedelta(0)
+        self.raw = io.BytesIO(body)
+
+    def raise_for_status(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class StandInSession:
+    def __init__(self, body):
+        self.body = body
+
+    def get(self, url, **kwargs):
+        return StandInResponse(self.body)
+
+
+class StandInBatchEndpoint:
+    """
+    Local stand-in for the Weaviate batch endpoint: every request body is serialized
+    (the work the client does before it hits the network) and then dropped.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.objects = 0
+        self.bytes = 0
+
+    def send(self, objects):
+        body = json.dumps(objects, default=str).encode("utf-8")
+        self.requests += 1
+        self.objects += len(objects)
+        self.bytes += len(body)
+
+
+class _StandInBatch:
+    def __init__(self, endpoint, batch_size, timer):
+        self.endpoint = endpoint
+        self.batch_size = batch_size
+        self.timer = timer
+        self.pending = []
+
+    def add_object(self, properties, uuid=None, vector=None):
+        self.pending.append({"properties": properties, "id": uuid, "vector": vector})
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+        if self.timer is not None:
+            self.timer.tick()
+
+    def flush(self):
+        if self.pending:
+            self.endpoint.send(self.pending)
+            self.pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+        return False
+
+
+class _StandInBatchManager:
+    def __init__(self, endpoint, timer):
+        self.endpoint = endpoint
+        self.timer = timer
+        self.failed_objects = []
+
+    def dynamic(self):
+        return _StandInBatch(self.endpoint, STAND_IN_BATCH_SIZE, self.timer)
+
+    def fixed_size(self, batch_size=STAND_IN_BATCH_SIZE, concurrent_requests=1):
+        return _StandInBatch(self.endpoint, batch_size, self.timer)
+
+
+class _StandInCollection:
+    def __init__(self, endpoint, timer):
+        self.batch = _StandInBatchManager(endpoint, timer)
+
+
+class _StandInCollections:
+    def __init__(self, endpoint, timer):
+        self.collection = _StandInCollection(endpoint, timer)
+
+    def get(self, name):
+        return self.collection
+
+    def exists(self, name):
+        return True
+
+
+class StandInClient:
+    """
+    Just enough of the Weaviate v4 client for ingest_products_to_weaviate().
+    """
+
+    def __init__(self, timer=None):
+        self.endpoint = StandInBatchEndpoint()
+        self.collections = _StandInCollections(self.endpoint, timer)
+
+
+# ---- Measurement ----
+
+class RecordTimer:
+    """
+    Timestamps every record leaving the measured stage; the gaps are the per-record latencies.
+    """
+
+    def __init__(self):
+        self.stamps = [time.perf_counter_ns()]
+
+    def tick(self):
+        self.stamps.append(time.perf_counter_ns())
+
+    def tick_many(self, count):
+        # A vectorized stage hands out all its records at once
+        self.stamps.extend([time.perf_counter_ns()] * count)
+
+    @property
+    def records(self):
+        return len(self.stamps) - 1
+
+    def latencies_us(self):
+        return np.diff(np.array(self.stamps, dtype=np.int64)) / 1000
+
+
+def bench_parse(size):
+    """
+    Brochure bytes -> products, through scrape_kaufda_products() with a stand-in session.
+    """
+    from main import scrape_kaufda_products
+
+    session = StandInSession(scaled_brochure(size))
+
+    def run(timer):
+        def sink(products, store, brochure_id=None):
+            for _ in products:
+                timer.tick()
+            return timer.records
+        scrape_kaufda_products("bench", "Bench", session=session, sink=sink)
+    return run
+
+
+def bench_specs(size):
+    """
+    extract_specs_from_description() on distinct descriptions (memo cleared before each run).
+    """
+    import specs
+
+    descriptions = [product["description"] for product in scaled_products(size)]
+
+    def run(timer):
+        specs._extract_specs.cache_clear()
+        for description in descriptions:
+            specs.extract_specs_from_description(description)
+            timer.tick()
+    return run
+
+
+def bench_dedup(size):
+    """
+    ProductResolver.resolve() over built data objects.
+    """
+    from dedup import ProductResolver
+    from import_data import build_data_object
+
+    data_objects = [build_data_object(product) for product in scaled_products(size)]
+
+    def run(timer):
+        for _ in ProductResolver().resolve(data_objects):
+            timer.tick()
+    return run
+
+
+def bench_ingest(size):
+    """
+    The ingest_products_to_weaviate() batch loop (object building, specs, hashing, batching)
+    against the stand-in batch endpoint.
+    """
+    import queries
+    import specs
+    from import_data import ingest_products_to_weaviate
+
+    # Benchmark ingests must not invalidate the search caches of real processes
+    queries.INGEST_MARKER_PATH = os.path.join(tempfile.gettempdir(), "bench_last_ingest")
+    products = scaled_products(size)
+
+    def run(timer):
+        specs._extract_specs.cache_clear()
+        ingest_products_to_weaviate(iter(products), client=StandInClient(timer))
+    return run
+
+
+def bench_price_drops(size, compacted=False):
+    """
+    find_price_drops() over `size` observations in the scraper's part files, or in one
+    compacted file; each observation counts as a record.
+    """
+    from price_history import compact_price_history, find_price_drops
+
+    directory = tempfile.TemporaryDirectory(prefix="bench-price-history-")
+    now = datetime(2025, 7, 1, tzinfo=timezone.utc)
+    write_price_history(size, directory.name, now)
+    if compacted:
+        compact_price_history(directory.name)
+
+    def run(timer, directory=directory):
+        find_price_drops(window_days=PRICE_WINDOW_DAYS, root=directory.name, now=now)
+        timer.tick_many(size)
+    return run
+
+
+BENCHMARKS = {
+    "parse": bench_parse,
+    "specs": bench_specs,
+    "dedup": bench_dedup,
+    "ingest": bench_ingest,
+    "price-drops": bench_price_drops,
+    "price-drops-compacted": lambda size: bench_price_drops(size, compacted=True),
+}
+
+
+def measure(name, size, repeat=3):
+    """
+    Runs one benchmark `repeat` times and keeps the median run; peak memory comes
+    from one extra run under tracemalloc, which would distort the timings.
+    """
+    run = BENCHMARKS[name](size)
+    runs = []
+    for _ in range(repeat):
+        gc.collect()
+        timer = RecordTimer()
+        started = time.perf_counter()
+        run(timer)
+        runs.append((time.perf_counter() - started, timer))
+    elapsed, timer = sorted(runs, key=lambda item: item[0])[len(runs) // 2]
+
+    gc.collect()
+    tracemalloc.start()
+    run(RecordTimer())
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    latencies = timer.latencies_us()
+    return {
+        "benchmark": name,
+        "size": size,
+        "records": timer.records,
+        "seconds": round(elapsed, 4),
+        "records_per_sec": round(timer.records / elapsed, 1) if elapsed else None,
+        "p50_us": round(float(np.percentile(latencies, 50)), 2) if len(latencies) else None,
+        "p99_us": round(float(np.percentile(latencies, 99)), 2) if len(latencies) else None,
+        "peak_mib": round(peak / 2 ** 20, 2),
+    }
+
+
+# ---- Results ----
+
+def current_version():
+    """
+    Short commit hash of the working tree, with -dirty when it has uncommitted changes.
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=BACKEND_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unversioned"
+    return f"{commit}-dirty" if dirty else commit
+
+
+def save_results(results, label, results_dir=RESULTS_DIR):
+    os.makedirs(results_dir, exist_ok=True)
+    report = {
+        "label": label,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()}, {os.cpu_count()} CPUs",
+        "results": results,
+    }
+    path = os.path.join(results_dir, f"{label}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    return path
+
+
+def load_baseline(label, results_dir=RESULTS_DIR, baseline=None):
+    """
+    The stored run to compare against: `baseline` by label, or else the latest other run.
+    """
+    if baseline:
+        with open(os.path.join(results_dir, f"{baseline}.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    reports = []
+    for path in glob.glob(os.path.join(results_dir, "*.json")):
+        with open(path, "r", encoding="utf-8") as f:
+            report = json.load(f)
+        if report.get("label") != label:
+            reports.append(report)
+    return max(reports, key=lambda report: report["created_at"]) if reports else None
+
+
+def _change(new, old):
+    if not new or not old:
+        return None
+    return (new - old) / old * 100
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """
+    Prints the results next to the baseline. Returns the regressions found.
+    """
+    previous = {(row["benchmark"], row["size"]): row for row in (baseline or {}).get("results", [])}
+    regressions = []
+
+    print(f"{'benchmark':<22}{'size':>8}{'records/s':>14}{'p50 µs':>10}{'p99 µs':>10}{'peak MiB':>10}  "
+          f"vs {baseline['label'] if baseline else '-'}")
+    for row in results:
+        old = previous.get((row["benchmark"], row["size"]))
+        notes = ""
+        if old:
+            speed = _change(row["records_per_sec"], old["records_per_sec"])
+            memory = _change(row["peak_mib"], old["peak_mib"])
+            notes = f"{speed:+.1f}% speed, {memory:+.1f}% memory" if speed is not None and memory is not None else ""
+            if (speed is not None and speed < -threshold) or (memory is not None and memory > threshold):
+                regressions.append(row)
+                notes += "  ⚠️ regression"
+        print(f"{row['benchmark']:<22}{row['size']:>8}{row['records_per_sec']:>14,.0f}{row['p50_us']:>10}"
+              f"{row['p99_us']:>10}{row['peak_mib']:>10}  {notes}")
+    return regressions
+
+
+def main(argv=None):
+    """
+    Command line entry point (also `cli.py bench`). Returns the exit status.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark parsing, spec extraction, dedup, ingest and price drops.")
+    parser.add_argument("benchmarks", nargs="*", default=list(BENCHMARKS),
+                        help=f"Benchmarks to run: {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="Catalog sizes in records")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per benchmark and size (the median is kept)")
+    parser.add_argument("--label", default=None, help="Name of this run in bench/results (default: git commit)")
+    parser.add_argument("--baseline", default=None, help="Label of the run to compare with (default: the latest other run)")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="Regression threshold in percent")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 when something regressed")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+
+    label = args.label or current_version()
+    results = []
+    for name in args.benchmarks:
+        for size in args.sizes:
+            print(f"⏱️ {name} at {size} records...")
+            results.append(measure(name, size, args.repeat))
+
+    path = save_results(results, label)
+    print(f"\nResults saved to {path}\n")
+    regressions = compare(results, load_baseline(label, baseline=args.baseline), args.threshold)
+    return 1 if regressions and args.fail_on_regression else 0
+
@@ -0,0 +1,154 @@
+# cli.py
+# Single entry point for the backend jobs, e.g.
+#   python cli.py scrape --workers 8
+#   python cli.py ingest ../scrapper/scrapped/*.csv --delta
+#   python cli.py query Kaffee --max-price 5
+# Only argparse is loaded up front. Each subcommand imports its modules when it runs,
+# so a short query or --help does not pay for the Weaviate client library or pyarrow.
+import argparse
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Subcommand -> (handler name, help)
+COMMANDS = {
+    "scrape": ("run_scrape", "Scrape kaufda.de brochures (scrapper/main.py)"),
+    "pipeline": ("run_pipeline", "Scrape straight into Weaviate (pipeline.py)"),
+    "ingest": ("run_ingest", "Ingest scraper CSV files into Weaviate (weaviate/import_data.py)"),
+    "migrate-schema": ("run_migrate_schema", "Create or migrate the ProductOffer schema (weaviate/schema.py)"),
+    "query": ("run_query", "Search offers in Weaviate or in a local index"),
+    "archive": ("run_archive", "Maintain the Parquet offer archive (scrapper/archive.py)"),
+    "price-drops": ("run_price_drops", "Report price drops and store them in Weaviate (scrapper/price_history.py)"),
+    "bench": ("run_bench", "Run the offline benchmarks (bench/bench.py)"),
+}
+
+
+def _use(*directories):
+    # The scripts import their siblings by bare name, so their directories go on sys.path
+    for directory in directories:
+        path = os.path.join(BACKEND_DIR, directory)
+        if path not in sys.path:
+            sys.path.append(path)
+
+
+def run_scrape(argv):
+    _use("scrapper")
+    import main
+    return main.main(argv)
+
+
+def run_pipeline(argv):
+    _use("scrapper", "weaviate")
+    import pipeline
+    return pipeline.main(argv)
+
+
+def run_ingest(argv):
+    _use("scrapper", "weaviate")
+    import import_data
+    return import_data.main(argv)
+
+
+def run_migrate_schema(argv):
+    _use("weaviate")
+    import schema
+    return schema.main(argv)
+
+
+def run_archive(argv):
+    _use("scrapper")
+    import archive
+    return archive.main(argv)
+
+
+def run_price_drops(argv):
+    _use("scrapper", "weaviate")
+    import price_history
+    return price_history.main(argv)
+
+
+def run_bench(argv):
+    _use("scrapper", "weaviate", "bench")
+    import bench
+    return bench.main(argv)
+
+
+def _parse_valid_on(value):
+    from datetime import date
+    if value == "any":
+        return None
+    return date.today() if value == "today" else date.fromisoformat(value)
+
+
+def run_query(argv):
+    _use("weaviate")
+    import queries
+
+    parser = argparse.ArgumentParser(prog="cli.py query", description="Search offers in Weaviate or in a local index.")
+    parser.add_argument("query", nargs="*", help="Search text")
+    parser.add_argument("--mode", choices=queries.SEARCH_MODES, default="hybrid", help="Search mode")
+    parser.add_argument("--publisher", default=None, help="Only offers of this publisher")
+    parser.add_argument("--category", default=None, help="Only offers whose categories contain this text")
+    parser.add_argument("--min-price", type=float, default=None, help="Lowest sale price")
+    parser.add_argument("--max-price", type=float, default=None, help="Highest sale price")
+    parser.add_argument("--min-price-drop", type=float, default=None, help="Only offers at least this many percent below their median")
+    parser.add_argument("--valid-on", type=_parse_valid_on, default="today",
+                        help="Only offers valid on this date (YYYY-MM-DD, 'today' (default) or 'any')")
+    parser.add_argument("--limit", type=int, default=10, help="Number of results")
+    parser.add_argument("--cheapest", action="store_true", help="Find the cheapest publisher per canonical product instead")
+    parser.add_argument("--brand", default=None, help="Brand filter for --cheapest")
+    parser.add_argument("--local", nargs="+", metavar="CSV", default=None,
+                        help="Search an in-process index built from these scraper CSV files instead of Weaviate")
+    parser.add_argument("--complete", action="store_true", help="Autocomplete product names (needs --local)")
+    parser.add_argument("--local-vectors", action="store_true", help="Compute vectors locally for --local semantic and hybrid search")
+    args = parser.parse_args(argv)
+    text = " ".join(args.query)
+
+    if args.local:
+        from import_data import read_products_csv
+        from local_index import LocalIndex
+        embedder = None
+        if args.local_vectors:
+            from embeddings import LocalEmbedder
+            embedder = LocalEmbedder()
+        index = LocalIndex.from_products((product for path in args.local for product in read_products_csv(path)),
+                                         embedder=embedder)
+        queries.SEARCH_BACKEND = "local"
+        queries.use_local_index(index)
+        if args.complete:
+            print("\n".join(index.complete(text, limit=args.limit)))
+            return 0
+    elif args.complete:
+        parser.error("--complete needs --local")
+
+    if args.cheapest:
+        for product in queries.find_cheapest(text, brand=args.brand, limit=args.limit):
+            print(f"{product.get('minPrice')} EUR  {product.get('name')}  ({product.get('cheapestPublisher')})")
+        return 0
+
+    results = queries.search_products(text, mode=args.mode, publisher=args.publisher, min_price=args.min_price,
+                                      max_price=args.max_price, category=args.category, valid_on=args.valid_on,
+                                      min_price_drop=args.min_price_drop, limit=args.limit)
+    for product in results:
+        print(f"{product.get('salePrice')} EUR  {product.get('name')}  ({product.get('publisher')})")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="cli.py", description="Backend jobs. Run 'cli.py <command> --help' for the options of a command.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="commands:\n" + "\n".join(f"  {name:<16}{help_text}" for name, (_, help_text) in COMMANDS.items()),
+    )
+    parser.add_argument("command", choices=list(COMMANDS), metavar="command")
+    # Everything after the command is parsed by the command's own parser
+    parser.add_argument("args", nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    handler = globals()[COMMANDS[args.command][0]]
+    return handler(args.args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
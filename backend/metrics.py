@@ -0,0 +1,139 @@
+# metrics.py
+# In-process counters and timers for the scrape and ingest stages, exported as
+# Prometheus text or JSON lines at the end of a run, plus the shared logging setup.
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets, from spec extraction (µs) to slow batch sends
+DEFAULT_BUCKETS = (0.00001, 0.0001, 0.001, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0)
+
+LOG_FORMAT = "%(asctime)s %(levelname)-7s %(name)s: %(message)s"
+
+
+def setup_logging(level="INFO"):
+    """
+    Leveled logging for the command line entry points (replaces the old progress prints).
+    """
+    logging.basicConfig(level=getattr(logging, str(level).upper(), logging.INFO), format=LOG_FORMAT)
+
+
+class Metrics:
+    """
+    Thread-safe registry of counters and latency histograms.
+
+    Series are identified by name plus labels, e.g. inc("http_requests_total", endpoint="brochure").
+    Histograms keep cumulative bucket counts, sum, count and max, like Prometheus histograms.
+    Worker processes have their own registry; only the calling process is exported.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counters = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {"buckets": [0] * len(self.buckets), "count": 0, "sum": 0.0, "max": 0.0}
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram["buckets"][i] += 1
+            histogram["count"] += 1
+            histogram["sum"] += seconds
+            histogram["max"] = max(histogram["max"], seconds)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def to_prometheus(self):
+        """
+        Prometheus text exposition format (counters and histograms).
+        """
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((key, dict(value, buckets=list(value["buckets"]))) for key, value in self.histograms.items())
+
+        lines = []
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        for (name, labels), histogram in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            for bound, count in zip(self.buckets, histogram["buckets"]):
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', repr(bound)),))} {count}")
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {histogram['count']}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram['sum']}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+    def to_json_lines(self):
+        """
+        One JSON object per series, e.g. for log shipping or diffing runs.
+        """
+        timestamp = time.time()
+        with self._lock:
+            rows = [
+                {"ts": timestamp, "type": "counter", "name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self.counters.items())
+            ]
+            rows += [
+                {"ts": timestamp, "type": "histogram", "name": name, "labels": dict(labels),
+                 "count": histogram["count"], "sum": round(histogram["sum"], 6), "max": round(histogram["max"], 6),
+                 "buckets": dict(zip(map(str, self.buckets), histogram["buckets"]))}
+                for (name, labels), histogram in sorted(self.histograms.items())
+            ]
+        return "".join(json.dumps(row) + "\n" for row in rows)
+
+    def write(self, path):
+        """
+        Writes the metrics to `path`: JSON lines for *.jsonl / *.json, Prometheus text otherwise.
+        """
+        text = self.to_json_lines() if path.endswith((".jsonl", ".json")) else self.to_prometheus()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        logging.getLogger(__name__).info("Wrote metrics to %s", path)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+# Registry shared by everything in the process
+METRICS = Metrics()
+
+inc = METRICS.inc
+observe = METRICS.observe
+timer = METRICS.timer
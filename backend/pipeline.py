@@ -0,0 +1,162 @@
+# pipeline.py
+# End-to-end mode: scraped products flow straight into the Weaviate batch,
+# without writing CSV files and reading them back in between.
+# Run it through `cli.py pipeline`, which puts scrapper/ and weaviate/ on sys.path.
+import logging
+import queue
+import threading
+
+from main import build_parser, run_scraper, tee_products_csv
+from import_data import ingest_products_parallel, ingest_products_to_weaviate, push_price_drops
+from metrics import METRICS, setup_logging
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of the product stream
+_DONE = object()
+
+
+class WeaviateStreamSink:
+    """
+    Scraper sink that feeds products into a single Weaviate batch as they are produced.
+
+    The crawler calls the sink from several worker threads, while Weaviate batching
+    is not thread-safe, so products are handed over through a bounded queue to one
+    ingest thread. The bound applies backpressure when Weaviate is slower than the crawl.
+
+    Brochure cache entries are held back (commit_later) until close(): only brochures
+    whose offers all reached Weaviate are marked as seen, so a failed batch or a crash
+    before the final flush makes the next run send them again.
+    """
+
+    def __init__(self, write_csv=False, write_archive=False, price_history=False, max_pending=1000,
+                 ingest=ingest_products_to_weaviate, **ingest_options):
+        self.write_csv = write_csv
+        self.write_archive = write_archive
+        self.price_history = price_history
+        self.ingest = ingest
+        self.ingest_options = ingest_options
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.result = None
+        self.finished = False
+        self.failed_offer_ids = set()
+        self.offer_brochures = {}
+        self.commits = {}
+        self._lock = threading.Lock()
+        self.thread = threading.Thread(target=self._ingest, name="weaviate-ingest", daemon=True)
+        self.thread.start()
+
+    def _products(self):
+        while True:
+            product_info = self.queue.get()
+            if product_info is _DONE:
+                self.finished = True
+                return
+            yield product_info
+
+    def _ingest(self):
+        try:
+            self.result = self.ingest(self._products(), failed_offer_ids=self.failed_offer_ids, **self.ingest_options)
+        finally:
+            # Keep draining so the crawler never blocks on a consumer that gave up
+            if not self.finished:
+                for _ in self._products():
+                    pass
+
+    def __call__(self, products, store, brochure_id=None):
+        if self.write_csv:
+            products = tee_products_csv(products, store, brochure_id)
+        if self.write_archive:
+            from archive import tee_products_archive
+            products = tee_products_archive(products, store)
+
+        count = 0
+        for product_info in products:
+            self.offer_brochures.setdefault(product_info.get("offer_id"), set()).add(brochure_id)
+            self.queue.put(product_info)
+            count += 1
+        return count
+
+    def observe(self, products, store):
+        """
+        Records the prices of every parsed offer, before the offer cache drops the unchanged ones.
+        """
+        if not self.price_history:
+            return products
+        from price_history import tee_price_history
+        return tee_price_history(products, store)
+
+    def commit_later(self, brochure_id, cache, commit):
+        """
+        Holds back a brochure cache update until close() confirmed the brochure's offers.
+        """
+        with self._lock:
+            self.commits[brochure_id] = (cache, commit)
+
+    def close(self):
+        """
+        Ends the stream and waits for the last batch to be sent, then commits the cache
+        entries of the brochures that were stored completely. Returns the ingest result.
+        """
+        self.queue.put(_DONE)
+        self.thread.join()
+
+        failed_brochures = set().union(*(self.offer_brochures.get(offer_id, ()) for offer_id in self.failed_offer_ids))
+        caches = set()
+        held_back = 0
+        for brochure_id, (cache, commit) in self.commits.items():
+            if self.result and brochure_id not in failed_brochures:
+                commit()
+                caches.add(cache)
+            else:
+                held_back += 1
+        for cache in caches:
+            cache.save()
+        if held_back:
+            logger.warning("Not marking %d brochures as seen: their offers did not all reach Weaviate.", held_back)
+        return self.result
+
+
+def main(argv=None):
+    """
+    Command line entry point (also `cli.py pipeline`).
+    """
+    parser = build_parser("Scrape kaufda.de brochures straight into Weaviate.")
+    parser.add_argument("--csv", action="store_true", help="Also write scrapped/*.csv files as a side output")
+    parser.add_argument("--archive", action="store_true", help="Also append products to the Parquet archive")
+    parser.add_argument("--delta", action="store_true", help="Only send new or changed offers to Weaviate")
+    parser.add_argument("--delete-expired", action="store_true", help="Delete offers whose validTo has passed")
+    parser.add_argument("--parallel", action="store_true", help="Build objects in a process pool and send with several senders")
+    parser.add_argument("--local-vectors", action="store_true", help="Compute vectors locally with a persistent vector cache")
+    parser.add_argument("--dedup", action="store_true", help="Link offers to canonical products and drop duplicate listings")
+    # --output comes with the scraper's parser but the sink here is Weaviate; --csv and --archive replace it
+    parser.set_defaults(output=None)
+    args = parser.parse_args(argv)
+    if args.output is not None:
+        parser.error("--output does not apply to the pipeline, use --csv and/or --archive")
+    setup_logging(args.log_level)
+
+    embedder = None
+    if args.local_vectors:
+        from embeddings import LocalEmbedder
+        embedder = LocalEmbedder()
+
+    resolver = None
+    if args.dedup:
+        from dedup import ProductResolver
+        resolver = ProductResolver()
+
+    ingest = ingest_products_parallel if args.parallel else ingest_products_to_weaviate
+    sink = WeaviateStreamSink(write_csv=args.csv, write_archive=args.archive, price_history=args.price_history,
+                              ingest=ingest, skip_unchanged=args.delta, delete_expired=args.delete_expired,
+                              embedder=embedder, resolver=resolver)
+    try:
+        run_scraper(args, sink=sink)
+    finally:
+        result = sink.close()
+        # Offers sent again were replaced without priceDropPct, and new prices move the medians
+        if result and args.price_history:
+            from price_history import offer_price_drops
+            push_price_drops(offer_price_drops())
+        if args.metrics_out:
+            METRICS.write(args.metrics_out)
@@ -0,0 +1,220 @@
+import argparse
+import glob
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from cache import parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+# Root of the offer archive: archive/scrape_date=YYYY-MM-DD/publisher=<name>/part-*.parquet
+ARCHIVE_DIR = "archive"
+
+# Products buffered before they are written out as one Parquet row group
+ROW_GROUP_SIZE = 10000
+
+# Age after which an unfinished part file is taken for the leftover of a crashed writer
+ORPHAN_SECONDS = 24 * 3600
+
+# Typed columns of the archive (scrape_date and publisher are partition keys)
+ARCHIVE_SCHEMA = pa.schema([
+    ("name", pa.string()),
+    ("brand", pa.string()),
+    ("description", pa.string()),
+    ("categories", pa.string()),
+    ("sale_price", pa.float64()),
+    ("regular_price", pa.float64()),
+    ("currency", pa.string()),
+    ("image_url", pa.string()),
+    ("offer_id", pa.string()),
+    ("valid_from", pa.timestamp("ms", tz="UTC")),
+    ("valid_to", pa.timestamp("ms", tz="UTC")),
+    ("scraped_at", pa.timestamp("ms", tz="UTC")),
+])
+
+PRICE_COLUMNS = ("sale_price", "regular_price")
+TIMESTAMP_COLUMNS = ("valid_from", "valid_to", "scraped_at")
+
+
+def _to_float(value):
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# Turn a batch of product dicts into a typed Arrow table
+def products_to_table(products):
+    columns = {}
+    for field in ARCHIVE_SCHEMA:
+        values = [product.get(field.name) for product in products]
+        if field.name in PRICE_COLUMNS:
+            values = [_to_float(value) for value in values]
+        elif field.name in TIMESTAMP_COLUMNS:
+            values = [parse_timestamp(value) for value in values]
+        columns[field.name] = values
+    return pa.Table.from_pydict(columns, schema=ARCHIVE_SCHEMA)
+
+# Directory of the partition a store's products go to today
+def partition_dir(root, store, scrape_date=None):
+    scrape_date = scrape_date or datetime.now(timezone.utc).date()
+    return os.path.join(root, f"scrape_date={scrape_date.isoformat()}", f"publisher={quote(str(store), safe='')}")
+
+# Hidden name a Parquet file is written under until it is complete. Readers and compactions only
+# look at *.parquet, so they never see a file without its footer.
+def temp_path(path):
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f".{name}.tmp")
+
+# Pass products through while appending them to the archive partition of `store`
+def tee_products_archive(products, store, root=ARCHIVE_DIR):
+    writer = None
+    path = None
+    buffer = []
+    count = 0
+    try:
+        for product in products:
+            buffer.append(product)
+            count += 1
+            if len(buffer) >= ROW_GROUP_SIZE:
+                writer, path = _write_row_group(writer, path, buffer, store, root)
+                buffer = []
+            yield product
+        if buffer:
+            writer, path = _write_row_group(writer, path, buffer, store, root)
+    finally:
+        if writer is not None:
+            writer.close()
+            os.replace(temp_path(path), path)
+            logger.info("Archived %d products to %s", count, path)
+
+def _write_row_group(writer, path, buffer, store, root):
+    if writer is None:
+        directory = partition_dir(root, store)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"part-{uuid.uuid4().hex}.parquet")
+        writer = pq.ParquetWriter(temp_path(path), ARCHIVE_SCHEMA, compression="zstd")
+    writer.write_table(products_to_table(buffer))
+    return writer, path
+
+# Scraper sink: write products to the archive, returns the row count (fragment names are unique already,
+# so the brochure id is not needed)
+def write_products_archive(products, store, brochure_id=None, root=ARCHIVE_DIR):
+    count = 0
+    for _ in tee_products_archive(products, store, root):
+        count += 1
+    return count
+
+# Open the archive as a dataset; scrape_date and publisher come from the partition paths
+def open_archive(root=ARCHIVE_DIR):
+    partitioning = ds.partitioning(
+        pa.schema([("scrape_date", pa.date32()), ("publisher", pa.string())]), flavor="hive"
+    )
+    files = live_parquet_files(glob.glob(os.path.join(root, "scrape_date=*", "publisher=*")))
+    return ds.dataset(files, schema=ARCHIVE_SCHEMA if not files else None, format="parquet",
+                      partitioning=partitioning, partition_base_dir=root)
+
+# Read only the needed columns and partitions, e.g.
+# read_archive(columns=["name", "sale_price"], filter=ds.field("publisher") == "Lidl")
+def read_archive(root=ARCHIVE_DIR, columns=None, filter=None):
+    return open_archive(root).to_table(columns=columns, filter=filter)
+
+# Compactions write .compacting-<id>.json before the merged file becomes visible. It names the merged
+# file and its sources, so a crash between publishing the merged file and removing the sources is
+# finished by the next compaction, and readers skip those sources meanwhile instead of counting rows twice.
+def _manifests(directory):
+    for manifest_path in sorted(glob.glob(os.path.join(directory, ".compacting-*.json"))):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            yield manifest_path, json.load(f)
+
+# Sources of compactions whose merged file is already in place
+def superseded_files(directory):
+    return {
+        os.path.join(directory, name)
+        for _, manifest in _manifests(directory) if os.path.exists(os.path.join(directory, manifest["target"]))
+        for name in manifest["sources"]
+    }
+
+# The Parquet files readers should see in the given directories
+def live_parquet_files(directories):
+    files = []
+    for directory in sorted(directories):
+        superseded = superseded_files(directory)
+        files += [path for path in sorted(glob.glob(os.path.join(directory, "*.parquet"))) if path not in superseded]
+    return files
+
+# Finish (or undo) compactions a crash interrupted, and drop orphaned temp files. Part files still
+# being written are left alone; only those untouched for ORPHAN_SECONDS belong to a crashed writer.
+def recover_compactions(directory):
+    for manifest_path, manifest in _manifests(directory):
+        if os.path.exists(os.path.join(directory, manifest["target"])):
+            for name in manifest["sources"]:
+                if os.path.exists(os.path.join(directory, name)):
+                    os.remove(os.path.join(directory, name))
+        os.remove(manifest_path)
+    for tmp_path in glob.glob(os.path.join(directory, ".compacting-*.tmp")):
+        os.remove(tmp_path)
+    for tmp_path in glob.glob(os.path.join(directory, ".part-*.parquet.tmp")):
+        if time.time() - os.path.getmtime(tmp_path) > ORPHAN_SECONDS:
+            os.remove(tmp_path)
+
+# Replace `files` with one file holding `table`, safe against a crash at any step
+def replace_with_compacted(directory, files, table, row_group_size):
+    compaction_id = uuid.uuid4().hex
+    tmp_path = os.path.join(directory, f".compacting-{compaction_id}.tmp")
+    target = f"part-{uuid.uuid4().hex}.parquet"
+    pq.write_table(table, tmp_path, compression="zstd", row_group_size=row_group_size)
+
+    manifest_path = os.path.join(directory, f".compacting-{compaction_id}.json")
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"target": target, "sources": [os.path.basename(path) for path in files]}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+    os.replace(tmp_path, os.path.join(directory, target))
+    for path in files:
+        os.remove(path)
+    os.remove(manifest_path)
+
+# Merge the small files of every partition into one file per partition
+def compact_archive(root=ARCHIVE_DIR, min_files=2):
+    compacted = 0
+    for directory in sorted(glob.glob(os.path.join(root, "scrape_date=*", "publisher=*"))):
+        recover_compactions(directory)
+        files = sorted(glob.glob(os.path.join(directory, "*.parquet")))
+        if len(files) < min_files:
+            continue
+
+        table = pq.read_table(files, schema=ARCHIVE_SCHEMA)
+        replace_with_compacted(directory, files, table, ROW_GROUP_SIZE * 10)
+
+        compacted += 1
+        logger.info("Compacted %d files (%d rows) in %s", len(files), table.num_rows, directory)
+    logger.info("Compaction done: %d partitions rewritten.", compacted)
+    return compacted
+
+
+# Maintain the archive (also `cli.py archive`)
+def main(argv=None):
+    from metrics import setup_logging
+
+    parser = argparse.ArgumentParser(description="Maintain the Parquet offer archive.")
+    parser.add_argument("command", choices=["compact"], help="compact: merge small files per partition")
+    parser.add_argument("--root", default=ARCHIVE_DIR, help="Archive root directory")
+    args = parser.parse_args(argv)
+    setup_logging()
+
+    if args.command == "compact":
+        compact_archive(args.root)
@@ -0,0 +1,191 @@
+import copy
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+# Product fields that change on every run and must not affect the offer fingerprint
+VOLATILE_FIELDS = ("scraped_at",)
+
+# Hours a checked brochure is skipped; after that it is fetched again with a conditional GET,
+# since offers can be added or repriced while the brochure is running
+RECHECK_HOURS = 6
+
+
+# Parse the API's ISO timestamps, treating naive values as UTC
+def parse_timestamp(value):
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+# Stable hash of a product dict, ignoring fields that change on every scrape
+def product_fingerprint(product):
+    stable = {key: value for key, value in product.items() if key not in VOLATILE_FIELDS}
+    encoded = json.dumps(stable, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+
+# Passes through products not seen before while collecting the fingerprints and
+# validity window of every product of the brochure
+class OfferTracker:
+    def __init__(self, seen=()):
+        self.seen = set(seen)
+        self.hashes = set()
+        self.valid_from = None
+        self.valid_to = None
+
+    def changed(self, products):
+        for product in products:
+            fingerprint = product_fingerprint(product)
+            self.hashes.add(fingerprint)
+
+            valid_from = parse_timestamp(product.get("valid_from"))
+            valid_to = parse_timestamp(product.get("valid_to"))
+            if valid_from and (self.valid_from is None or valid_from < self.valid_from):
+                self.valid_from = valid_from
+            if valid_to and (self.valid_to is None or valid_to > self.valid_to):
+                self.valid_to = valid_to
+
+            if fingerprint not in self.seen:
+                yield product
+
+
+# Local cache of brochure fingerprints, keyed by brochure id.
+# Each entry keeps the HTTP validators (ETag/Last-Modified), a hash of the raw
+# response, the validity window of the brochure and the fingerprints of the
+# offers already sent downstream, so unchanged brochures and offers are skipped.
+# Several crawl workers may share one file; save() merges their changes.
+class BrochureCache:
+    def __init__(self, path="brochure_cache.json", recheck_hours=RECHECK_HOURS):
+        self.path = path
+        self.recheck_hours = recheck_hours
+        self._lock = threading.Lock()
+        self.entries = self._read()
+        # What the file held when we last read it, to tell our changes from other workers'
+        self._loaded = copy.deepcopy(self.entries)
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning("Ignoring unreadable brochure cache '%s': %s", self.path, e)
+            return {}
+
+    def get(self, brochure_id):
+        with self._lock:
+            return self.entries.get(str(brochure_id))
+
+    # True while the brochure is still running and was checked less than recheck_hours ago,
+    # so it does not need re-fetching yet
+    def is_still_valid(self, brochure_id, now=None):
+        entry = self.get(brochure_id)
+        if not entry:
+            return False
+        now = now or datetime.now(timezone.utc)
+        valid_to = parse_timestamp(entry.get("valid_to"))
+        checked_at = parse_timestamp(entry.get("checked_at"))
+        if valid_to is None or checked_at is None or valid_to <= now:
+            return False
+        return now - checked_at < timedelta(hours=self.recheck_hours)
+
+    # True if the response body is byte-identical to the one seen last time
+    def is_unchanged(self, brochure_id, content_hash):
+        entry = self.get(brochure_id)
+        return bool(entry) and entry.get("content_hash") == content_hash
+
+    # Headers that let the server answer 304 Not Modified
+    def conditional_headers(self, brochure_id):
+        entry = self.get(brochure_id) or {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    # Tracker that streams products through and remembers what it saw for update()
+    def tracker(self, brochure_id):
+        entry = self.get(brochure_id) or {}
+        return OfferTracker(entry.get("offer_hashes", []))
+
+    def update(self, brochure_id, response, content_hash, tracker):
+        entry = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "content_hash": content_hash,
+            "valid_from": tracker.valid_from.isoformat() if tracker.valid_from else None,
+            "valid_to": tracker.valid_to.isoformat() if tracker.valid_to else None,
+            "offer_hashes": sorted(tracker.hashes),
+            "checked_at": datetime.now(timezone.utc).isoformat(),
+        }
+        with self._lock:
+            self.entries[str(brochure_id)] = entry
+
+    def touch(self, brochure_id):
+        with self._lock:
+            entry = self.entries.get(str(brochure_id))
+            if entry:
+                entry["checked_at"] = datetime.now(timezone.utc).isoformat()
+
+    # Drop brochures whose validity window has ended
+    def prune(self, now=None):
+        now = now or datetime.now(timezone.utc)
+        with self._lock:
+            expired = [
+                key for key, entry in self.entries.items()
+                if (parse_timestamp(entry.get("valid_to")) or now) < now
+            ]
+            for key in expired:
+                del self.entries[key]
+        return len(expired)
+
+    # Merge our changes into the entries other workers saved meanwhile, under a lock file, and
+    # write through a private tmp file so a crash or a concurrent save never publishes half a cache.
+    # Where two workers changed the same brochure, the later check wins.
+    def save(self):
+        with self._lock, open(f"{self.path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            merged = self._read()
+            for key in set(self.entries) | set(self._loaded):
+                ours = self.entries.get(key)
+                if ours == self._loaded.get(key):
+                    continue
+                if ours is None:
+                    merged.pop(key, None)
+                elif not _checked_later(merged.get(key), ours):
+                    merged[key] = ours
+
+            tmp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(merged, f, ensure_ascii=False, indent=2)
+                os.replace(tmp_path, self.path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            self.entries = merged
+            self._loaded = copy.deepcopy(merged)
+
+
+# True if entry was checked after other
+def _checked_later(entry, other):
+    if not entry:
+        return False
+    checked_at = parse_timestamp(entry.get("checked_at"))
+    other_checked_at = parse_timestamp(other.get("checked_at"))
+    return checked_at is not None and (other_checked_at is None or checked_at > other_checked_at)
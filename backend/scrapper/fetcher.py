@@ -0,0 +1,94 @@
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Seconds before a single HTTP request is abandoned
+REQUEST_TIMEOUT = 30
+
+# Status codes that are worth retrying (rate limited or temporary server trouble)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+# Spaces out requests so each host sees at most `rate` requests per second
+class HostRateLimiter:
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = {}
+
+    def wait(self, url):
+        self.wait_host(urlparse(url).hostname)
+
+    def wait_host(self, host):
+        if not self.interval:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+
+        if slot > now:
+            time.sleep(slot - now)
+
+
+# Retry that also takes a rate limiter slot before every retry, so urllib3's internal
+# retries (429/5xx storms) cannot exceed the per-host rate either
+class RateLimitedRetry(Retry):
+    def __init__(self, *args, rate_limiter=None, host=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rate_limiter = rate_limiter
+        self.host = host
+
+    def new(self, **kwargs):
+        retry = super().new(**kwargs)
+        retry.rate_limiter = self.rate_limiter
+        retry.host = self.host
+        return retry
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        if _pool is not None:
+            retry.host = _pool.host
+        return retry
+
+    def sleep(self, response=None):
+        super().sleep(response)
+        if self.rate_limiter and self.host:
+            self.rate_limiter.wait_host(self.host)
+
+
+# requests.Session that waits for the rate limiter before every request
+class RateLimitedSession(requests.Session):
+    def __init__(self, rate_limiter=None):
+        super().__init__()
+        self.rate_limiter = rate_limiter
+
+    def request(self, method, url, *args, **kwargs):
+        if self.rate_limiter:
+            self.rate_limiter.wait(url)
+        kwargs.setdefault("timeout", REQUEST_TIMEOUT)
+        return super().request(method, url, *args, **kwargs)
+
+
+# Build a session with pooled keep-alive connections and retry with exponential backoff
+def create_session(pool_size=8, rate_limit=5.0, retries=3, backoff=0.5):
+    rate_limiter = HostRateLimiter(rate_limit)
+    retry = RateLimitedRetry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=("GET",),
+        respect_retry_after_header=True,
+        rate_limiter=rate_limiter,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+    session = RateLimitedSession(rate_limiter)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
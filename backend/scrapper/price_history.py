@@ -0,0 +1,326 @@
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from archive import live_parquet_files, recover_compactions, replace_with_compacted, temp_path
+from cache import parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+# Append-only observations: price_history/part-*.parquet
+PRICE_HISTORY_DIR = "price_history"
+
+# One row per observed price; product_key is a 64-bit hash of name + brand + publisher.
+# offer_id and name identify the ProductOffer object the price belongs to.
+HISTORY_SCHEMA = pa.schema([
+    ("product_key", pa.int64()),
+    ("observed_at", pa.timestamp("s", tz="UTC")),
+    ("sale_price", pa.float32()),
+    ("offer_id", pa.string()),
+    ("name", pa.string()),
+])
+
+# Row order of part files and compacted files
+SORT_ORDER = [("product_key", "ascending"), ("observed_at", "ascending")]
+
+SECONDS_PER_DAY = 86400
+
+
+def _normalize(value):
+    return re.sub(r"\s+", " ", str(value or "")).strip().casefold()
+
+
+# Stable identity of a product across brochures and runs
+def product_key(name, brand, publisher):
+    identity = "\x1f".join(_normalize(part) for part in (name, brand, publisher))
+    return int.from_bytes(hashlib.blake2b(identity.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+
+
+def _observation(product):
+    price = product.get("sale_price")
+    try:
+        price = float(price)
+    except (TypeError, ValueError):
+        return None
+    if np.isnan(price):
+        return None
+
+    observed_at = parse_timestamp(product.get("scraped_at")) or datetime.now(timezone.utc)
+    key = product_key(product.get("name"), product.get("brand"), product.get("publisher"))
+    return key, observed_at, price, product.get("offer_id"), product.get("name")
+
+
+# Append price observations of a batch of products as one new part file, returns the row count
+def record_prices(products, root=PRICE_HISTORY_DIR):
+    rows = [row for row in map(_observation, products) if row is not None]
+    if not rows:
+        return 0
+
+    keys, observed_at, prices, offer_ids, names = zip(*rows)
+    table = pa.Table.from_arrays(
+        [pa.array(keys, pa.int64()), pa.array(observed_at, pa.timestamp("s", tz="UTC")),
+         pa.array(prices, pa.float32()), pa.array(offer_ids, pa.string()), pa.array(names, pa.string())],
+        schema=HISTORY_SCHEMA,
+    )
+    # Sorted like a compacted file, so reading many parts costs a merge of sorted runs, not a full sort
+    table = table.sort_by(SORT_ORDER)
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, f"part-{uuid.uuid4().hex}.parquet")
+    pq.write_table(table, temp_path(path), compression="zstd")
+    os.replace(temp_path(path), path)
+    return len(rows)
+
+# Scraper side tee: pass products through and record their prices in chunks. The scraper applies it
+# to every parsed offer, before the offer cache drops the unchanged ones (see main._scrape_brochure).
+def tee_price_history(products, store, root=PRICE_HISTORY_DIR, chunk_size=10000):
+    pending = []
+    try:
+        for product in products:
+            pending.append(product)
+            if len(pending) >= chunk_size:
+                record_prices(pending, root)
+                pending = []
+            yield product
+    finally:
+        record_prices(pending, root)
+
+# Merge all part files into one, sorted by product and time for fast range reads
+def compact_price_history(root=PRICE_HISTORY_DIR):
+    recover_compactions(root)
+    files = sorted(glob.glob(os.path.join(root, "part-*.parquet")))
+    if len(files) < 2:
+        return 0
+
+    table = pq.read_table(files, schema=HISTORY_SCHEMA).sort_by(SORT_ORDER)
+    replace_with_compacted(root, files, table, row_group_size=1_000_000)
+    logger.info("Compacted %d price history files (%d observations)", len(files), table.num_rows)
+    return len(files)
+
+# Load observations newer than `since` as an Arrow table (zero-copy into NumPy for the numeric columns)
+def load_observations(root=PRICE_HISTORY_DIR, since=None):
+    files = live_parquet_files([root])
+    if not files:
+        return HISTORY_SCHEMA.empty_table()
+
+    dataset = ds.dataset(files, format="parquet", schema=HISTORY_SCHEMA)
+    filter = ds.field("observed_at") >= pa.scalar(since, pa.timestamp("s", tz="UTC")) if since else None
+    return dataset.to_table(filter=filter).combine_chunks()
+
+def _bits(value):
+    return max(int(value), 0).bit_length()
+
+# Rows of the last run of equal values in a sorted array
+def _run_ends(values):
+    ends = np.ones(len(values), dtype=bool)
+    ends[:-1] = values[1:] != values[:-1]
+    return ends
+
+# Row order by (product key, time), or None when the rows are in that order already (a compacted file),
+# plus the keys in that order. One stable argsort of a packed int64, the key above the time offset;
+# a stable sort merges the sorted runs of part files quickly. The 64-bit keys leave room for only
+# their high bits, so keys that share them come out interleaved; a stable pass over the then nearly
+# sorted keys puts those right.
+def _sort_order(keys, observed_at):
+    same_key = keys[1:] == keys[:-1]
+    if np.all(keys[1:] >= keys[:-1]) and np.all(observed_at[1:][same_key] >= observed_at[:-1][same_key]):
+        return None, keys
+
+    offset = observed_at - observed_at.min()
+    time_bits = _bits(offset.max())
+    if time_bits > 62:
+        order = np.lexsort((observed_at, keys))
+        return order, keys[order]
+    # Order-preserving unsigned view of the keys, from 0 up
+    unsigned = keys.view(np.uint64) ^ np.uint64(1 << 63)
+    unsigned -= unsigned.min()
+    shift = max(_bits(unsigned.max()) + time_bits - 63, 0)
+    high = (unsigned >> np.uint64(shift)).view(np.int64)
+    order = np.argsort((high << time_bits) | offset, kind="stable")
+    sorted_keys = keys[order]
+    if shift and np.any(sorted_keys[1:] < sorted_keys[:-1]):
+        order = order[np.argsort(sorted_keys, kind="stable")]
+        sorted_keys = keys[order]
+    return order, sorted_keys
+
+# Sort by (group, price) within the daily rows, carrying the weights. Fits one packed int64 for any
+# realistic size: group, the bits of the non-negative float32 price (ordered like the price) and the
+# weight; np.sort on values is much faster than an argsort. Falls back to lexsort otherwise.
+def _sort_by_price(g, p, weights):
+    if len(g) == 0:
+        return g, p, weights
+    p = p.astype(np.float32) + np.float32(0)  # turns -0.0 into 0.0
+    weight_bits = _bits(weights.max())
+    group_bits = _bits(g[-1])
+    if group_bits + 31 + weight_bits > 63 or np.any(p < 0):
+        by_price = np.lexsort((p, g))
+        return g[by_price], p[by_price], weights[by_price]
+
+    packed = (g << (31 + weight_bits)) | (p.view(np.uint32).astype(np.int64) << weight_bits) | weights
+    packed.sort()
+    price_bits = ((packed >> weight_bits) & 0x7FFFFFFF).astype(np.uint32)
+    return packed >> (31 + weight_bits), price_bits.view(np.float32), packed & ((1 << weight_bits) - 1)
+
+# Daily medians (see daily_medians) plus the latest row of every product
+def _daily_medians(table, start, now):
+    keys = table["product_key"].to_numpy()
+    observed_at = table["observed_at"].cast(pa.int64()).to_numpy()
+    prices = table["sale_price"].to_numpy()
+    start_s = int(start.timestamp())
+    # Day of the last second before now: the window holds exactly window_days days
+    last_day = (int(now.timestamp()) - start_s - 1) // SECONDS_PER_DAY
+
+    # Sort once by (product, time); groups come out in sorted key order
+    order, keys = _sort_order(keys, observed_at)
+    if order is not None:
+        observed_at = observed_at[order]
+    group_end = _run_ends(keys)
+    first = np.ones(len(keys), dtype=bool)
+    first[1:] = group_end[:-1]
+    sorted_group = np.cumsum(first) - 1
+    unique_keys = keys[first]
+
+    # Last price per (product, day)
+    day = (observed_at - start_s) // SECONDS_PER_DAY
+    daily = np.flatnonzero(group_end | _run_ends(day))
+    g, d = sorted_group[daily], day[daily]
+    p = prices[daily if order is None else order[daily]]
+
+    # Days each price holds: until the product's next daily price, the last one until today
+    next_day = np.empty_like(d)
+    next_day[:-1] = d[1:]
+    next_day[group_end[daily]] = last_day + 1
+    weights = np.maximum(next_day - d, 1)
+
+    # Weighted median: sort by (product, price) and find the middle day of each product
+    g, p, weights = _sort_by_price(g, p, weights)
+    cumulative = np.cumsum(weights)
+    days = np.bincount(g, weights=weights, minlength=len(unique_keys)).astype(np.int64)
+    base = np.concatenate(([0], np.cumsum(days)[:-1]))
+    lower = p[np.searchsorted(cumulative, base + (days - 1) // 2, side="right")].astype(np.float64)
+    upper = p[np.searchsorted(cumulative, base + days // 2, side="right")].astype(np.float64)
+
+    # The sort order also gives the group of every row and each product's latest row
+    latest = np.flatnonzero(group_end)
+    if order is None:
+        group = sorted_group
+    else:
+        group = np.empty_like(sorted_group)
+        group[order] = sorted_group
+        latest = order[latest]
+    return unique_keys, group, (lower + upper) / 2, days, latest
+
+# Median of the daily price of every product over [start, now]. Each day counts once, at the last
+# price seen on or before it, and a price holds until the next observation (the last one until now):
+# brochures skipped by the cache are not parsed again, and an offer seen on every crawl must not
+# outweigh one that was seen once. Fully vectorized: one argsort of the rows (none for a compacted
+# file) and one value sort of the daily prices, no per-product Python loop.
+# Returns (product keys, group index of every row, median per product, days per product).
+def daily_medians(table, start, now):
+    return _daily_medians(table, start, now)[:4]
+
+def _window(root, window_days, now):
+    now = now or datetime.now(timezone.utc)
+    start = now - timedelta(days=window_days)
+    table = load_observations(root, start)
+    return table.filter(pc.greater_equal(table["sale_price"], 0)), start, now
+
+def _drop_pct(medians, prices):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(medians > 0, (medians - prices) / medians * 100, 0.0)
+
+def _rounded(values, decimals):
+    return np.round(values, decimals).tolist()
+
+# Products whose latest price is at least `min_drop_pct` percent below the median of their daily
+# prices over the last `window_days` (see daily_medians)
+def find_price_drops(min_drop_pct=20.0, window_days=30, min_observations=2, root=PRICE_HISTORY_DIR, now=None):
+    table, start, now = _window(root, window_days, now)
+    if table.num_rows == 0:
+        return []
+    unique_keys, _, medians, days, latest = _daily_medians(table, start, now)
+
+    latest_prices = table["sale_price"].to_numpy()[latest].astype(np.float64)
+    drop_pct = _drop_pct(medians, latest_prices)
+    mask = (days >= min_observations) & (medians > 0) & (drop_pct >= min_drop_pct)
+
+    rows = table.take(pa.array(latest[mask]))
+    return [
+        {
+            "product_key": key,
+            "offer_id": offer_id,
+            "name": name,
+            "latest_price": price,
+            "median_price": median,
+            "drop_pct": pct,
+        }
+        for key, offer_id, name, price, median, pct in zip(
+            unique_keys[mask].tolist(), rows["offer_id"].to_pylist(), rows["name"].to_pylist(),
+            _rounded(latest_prices[mask], 2), _rounded(medians[mask], 2), _rounded(drop_pct[mask], 1)
+        )
+    ]
+
+# priceDropPct of every offer seen in the window: how far its latest price is below the daily
+# median of its product, 0 when it is not below or the product has fewer than `min_observations` days.
+# Writing it for every offer clears the value of offers that are no longer discounted.
+def offer_price_drops(window_days=30, min_observations=2, root=PRICE_HISTORY_DIR, now=None):
+    table, start, now = _window(root, window_days, now)
+    if table.num_rows == 0:
+        return []
+    _, group, medians, days, _ = _daily_medians(table, start, now)
+
+    # Latest observation per offer object (offer_id + name): a hash aggregation instead of a sort.
+    # The maximum of (time, row) packed into one int64 is the latest row.
+    observed_at = table["observed_at"].cast(pa.int64()).to_numpy()
+    row_bits = _bits(table.num_rows)
+    latest = (observed_at - observed_at.min()) << row_bits | np.arange(table.num_rows)
+    offers = pa.table({"offer_id": table["offer_id"], "name": table["name"], "latest": latest})
+    latest = offers.group_by(["offer_id", "name"]).aggregate([("latest", "max")])["latest_max"].to_numpy()
+    latest = np.sort(latest & ((1 << row_bits) - 1))
+
+    latest_group = group[latest]
+    drop_pct = _drop_pct(medians[latest_group], table["sale_price"].to_numpy()[latest].astype(np.float64))
+    drop_pct = np.where(days[latest_group] >= min_observations, np.maximum(drop_pct, 0.0), 0.0)
+
+    rows = table.take(pa.array(latest))
+    return [
+        {"offer_id": offer_id, "name": name, "drop_pct": pct}
+        for offer_id, name, pct in zip(rows["offer_id"].to_pylist(), rows["name"].to_pylist(), _rounded(drop_pct, 1))
+        if offer_id is not None
+    ]
+
+# Report (and store) price drops (also `cli.py price-drops`)
+def main(argv=None):
+    from metrics import setup_logging
+
+    parser = argparse.ArgumentParser(description="Query the price history for price drops.")
+    parser.add_argument("--min-drop", type=float, default=20.0, help="Minimum drop versus the window median, in percent")
+    parser.add_argument("--window", type=int, default=30, help="Window for the median, in days")
+    parser.add_argument("--compact", action="store_true", help="Merge the part files first")
+    parser.add_argument("--push", action="store_true",
+                        help="Rewrite ProductOffer.priceDropPct of every offer in the window (0 where there is no drop)")
+    args = parser.parse_args(argv)
+    setup_logging()
+
+    if args.compact:
+        compact_price_history()
+
+    drops = find_price_drops(args.min_drop, args.window)
+    print(f"📉 {len(drops)} products dropped at least {args.min_drop}% below their {args.window}-day median")
+    for drop in sorted(drops, key=lambda drop: -drop["drop_pct"])[:20]:
+        print(json.dumps(drop))
+
+    if args.push:
+        from import_data import push_price_drops
+        push_price_drops(offer_price_drops(args.window))
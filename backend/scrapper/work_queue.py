@@ -0,0 +1,217 @@
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import time
+from contextlib import contextmanager
+
+# Job states: pending -> in_flight -> done, or back to pending (with backoff) until max_attempts, then failed
+PENDING = "pending"
+IN_FLIGHT = "in_flight"
+DONE = "done"
+FAILED = "failed"
+
+WORK_QUEUE_PATH = "work_queue.sqlite3"
+
+# An in-flight job whose lease ran out belongs to a crashed worker and is handed out again.
+# Live workers renew their leases (see renew), so a slow brochure is never scraped twice.
+LEASE_SECONDS = 600
+
+MAX_ATTEMPTS = 5
+
+# Seconds before the first retry; doubles with every further attempt
+RETRY_BACKOFF = 30.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    brochure_id TEXT PRIMARY KEY,
+    publisher TEXT,
+    location TEXT,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    not_before REAL NOT NULL DEFAULT 0,
+    lease_until REAL,
+    worker TEXT,
+    last_error TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (state, not_before);
+"""
+
+# Columns added after the first release, created on queues that predate them
+ADDED_COLUMNS = {"location": "TEXT"}
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class WorkQueue:
+    """
+    Durable queue of brochure jobs in SQLite, shared by every scraper process on the machine.
+
+    Claims run in an immediate (write-locked) transaction, so two workers never get the
+    same job. A claimed job is leased; when its worker dies, the lease runs out and the job
+    is claimed again, so a crash costs only the brochures that were in flight.
+    """
+
+    def __init__(self, path=WORK_QUEUE_PATH, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS,
+                 retry_backoff=RETRY_BACKOFF):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+            columns = {row["name"] for row in db.execute("PRAGMA table_info(jobs)")}
+            for column, column_type in ADDED_COLUMNS.items():
+                if column not in columns:
+                    db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per call, so threads and processes never share one
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            yield db
+        finally:
+            db.close()
+
+    @contextmanager
+    def _transaction(self):
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    def _has_work(self, db):
+        return db.execute("SELECT 1 FROM jobs WHERE state IN (?, ?) LIMIT 1", (PENDING, IN_FLIGHT)).fetchone() is not None
+
+    def has_work(self):
+        """
+        True while a crawl is unfinished (jobs pending, waiting for a retry or in flight).
+        """
+        with self._connect() as db:
+            return self._has_work(db)
+
+    def start_crawl(self, brochures):
+        """
+        Replaces the finished job set with the brochures of a new shelf, unless another
+        process started a crawl in the meantime. Returns the number of jobs queued.
+        """
+        now = time.time()
+        with self._transaction() as db:
+            if self._has_work(db):
+                return 0
+            db.execute("DELETE FROM jobs")
+            db.executemany(
+                "INSERT OR IGNORE INTO jobs (brochure_id, publisher, location, state, updated_at) VALUES (?, ?, ?, ?, ?)",
+                [(x["contentId"], (x.get("publisher") or {}).get("name"),
+                  json.dumps(x["location"]) if x.get("location") else None, PENDING, now)
+                 for x in brochures if x.get("contentId")],
+            )
+            return db.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+
+    def claim(self, worker=None, limit=1):
+        """
+        Leases up to `limit` due jobs to `worker`. Returns them as dicts (brochure_id, publisher, location, attempts).
+        """
+        now = time.time()
+        with self._transaction() as db:
+            rows = db.execute(
+                "SELECT brochure_id, publisher, location, attempts FROM jobs "
+                "WHERE (state = ? AND not_before <= ?) OR (state = ? AND lease_until < ?) "
+                "ORDER BY not_before LIMIT ?",
+                (PENDING, now, IN_FLIGHT, now, limit),
+            ).fetchall()
+            db.executemany(
+                "UPDATE jobs SET state = ?, attempts = attempts + 1, lease_until = ?, worker = ?, updated_at = ? "
+                "WHERE brochure_id = ?",
+                [(IN_FLIGHT, now + self.lease_seconds, worker or worker_id(), now, row["brochure_id"]) for row in rows],
+            )
+        return [dict(row, location=json.loads(row["location"]) if row["location"] else None, attempts=row["attempts"] + 1)
+                for row in rows]
+
+    def renew(self, brochure_ids, worker=None):
+        """
+        Extends the leases `worker` holds on the given in-flight jobs. Returns how many were renewed.
+        """
+        now = time.time()
+        with self._transaction() as db:
+            return db.executemany(
+                "UPDATE jobs SET lease_until = ?, updated_at = ? WHERE brochure_id = ? AND state = ? AND worker = ?",
+                [(now + self.lease_seconds, now, brochure_id, IN_FLIGHT, worker or worker_id()) for brochure_id in brochure_ids],
+            ).rowcount
+
+    def complete(self, brochure_id):
+        with self._transaction() as db:
+            db.execute("UPDATE jobs SET state = ?, lease_until = NULL, last_error = NULL, updated_at = ? WHERE brochure_id = ?",
+                       (DONE, time.time(), brochure_id))
+
+    def fail(self, brochure_id, error=None):
+        """
+        Puts a job back with exponential backoff, or marks it failed after max_attempts.
+        Returns the new state.
+        """
+        now = time.time()
+        with self._transaction() as db:
+            row = db.execute("SELECT attempts FROM jobs WHERE brochure_id = ?", (brochure_id,)).fetchone()
+            if row is None:
+                return None
+            attempts = row["attempts"]
+            if attempts >= self.max_attempts:
+                state, not_before = FAILED, now
+            else:
+                state, not_before = PENDING, now + self.retry_backoff * 2 ** (attempts - 1)
+            db.execute(
+                "UPDATE jobs SET state = ?, not_before = ?, lease_until = NULL, last_error = ?, updated_at = ? "
+                "WHERE brochure_id = ?",
+                (state, not_before, str(error) if error else None, now, brochure_id),
+            )
+        return state
+
+    def retry_failed(self):
+        """
+        Gives jobs that used up their attempts a fresh start. Returns how many were requeued.
+        """
+        with self._transaction() as db:
+            return db.execute(
+                "UPDATE jobs SET state = ?, attempts = 0, not_before = 0, updated_at = ? WHERE state = ?",
+                (PENDING, time.time(), FAILED),
+            ).rowcount
+
+    def next_due_in(self):
+        """
+        Seconds until the next job may be claimed (0 if one is due), or None if none is left: a pending
+        job once its backoff is over, an in-flight one once its lease runs out (its worker died).
+        """
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT MIN(CASE state WHEN ? THEN not_before ELSE lease_until END) FROM jobs WHERE state IN (?, ?)",
+                (PENDING, PENDING, IN_FLIGHT),
+            ).fetchone()
+        return None if row[0] is None else max(row[0] - time.time(), 0.0)
+
+    def counts(self):
+        with self._connect() as db:
+            return {state: count for state, count in db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state")}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect the brochure work queue.")
+    parser.add_argument("--path", default=WORK_QUEUE_PATH, help="Queue database")
+    parser.add_argument("--retry-failed", action="store_true", help="Requeue jobs that used up their attempts")
+    args = parser.parse_args()
+
+    work_queue = WorkQueue(args.path)
+    if args.retry_failed:
+        print(f"Requeued {work_queue.retry_failed()} failed jobs.")
+    counts = work_queue.counts()
+    print(", ".join(f"{state}: {counts.get(state, 0)}" for state in (PENDING, IN_FLIGHT, DONE, FAILED)))
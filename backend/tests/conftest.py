@@ -0,0 +1,16 @@
+# conftest.py
+# The backend scripts import their siblings by bare name (see cli._use), so the tests put the
+# same directories on sys.path: backend/ for the shared modules, scrapper/ and weaviate/ for the rest.
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for directory in ("", "scrapper", "weaviate"):
+    path = os.path.join(BACKEND_DIR, directory)
+    if path not in sys.path:
+        sys.path.append(path)
+
+# Ingest runs touch the search cache marker in the state directory; keep it out of the user's
+os.environ.setdefault("PROJECTX_STATE_DIR", tempfile.mkdtemp(prefix="projectx-tests-"))
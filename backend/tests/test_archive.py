@@ -0,0 +1,96 @@
+import glob
+import os
+
+import pytest
+
+import archive
+from archive import compact_archive, live_parquet_files, read_archive, recover_compactions, replace_with_compacted, \
+    tee_products_archive, write_products_archive
+
+
+def _products(count, start=0):
+    return [{"name": f"Kaffee {i}", "brand": "Tchibo", "sale_price": 4.99, "offer_id": f"o{i}",
+             "scraped_at": "2025-06-09T08:00:00+00:00"} for i in range(start, start + count)]
+
+
+def _partition(root):
+    [directory] = glob.glob(os.path.join(root, "scrape_date=*", "publisher=*"))
+    return directory
+
+
+def test_unfinished_part_file_is_invisible(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "ROW_GROUP_SIZE", 2)
+    root = str(tmp_path)
+    products = tee_products_archive(iter(_products(5)), "Lidl", root)
+    for _ in range(3):
+        next(products)
+
+    # A row group is on disk, but under the hidden name until the writer closes
+    assert glob.glob(os.path.join(_partition(root), ".part-*.parquet.tmp"))
+    assert read_archive(root).num_rows == 0
+    assert list(products)
+    assert read_archive(root).num_rows == 5
+    assert not glob.glob(os.path.join(_partition(root), ".*.tmp"))
+
+
+class Crash(Exception):
+    pass
+
+
+def _crash_on(monkeypatch, name, call):
+    # Fails the call-th call of os.<name> in the archive module, as if the process died there
+    original = getattr(os, name)
+    calls = []
+
+    def crashing(*args):
+        calls.append(args)
+        if len(calls) == call:
+            raise Crash()
+        return original(*args)
+    monkeypatch.setattr(archive.os, name, crashing)
+
+
+def _two_parts(root):
+    write_products_archive(iter(_products(3)), "Lidl", root=root)
+    write_products_archive(iter(_products(2, start=3)), "Lidl", root=root)
+    return _partition(root)
+
+
+def test_crash_after_publishing_the_compacted_file_is_finished_later(tmp_path, monkeypatch):
+    root = str(tmp_path)
+    directory = _two_parts(root)
+    files = sorted(glob.glob(os.path.join(directory, "*.parquet")))
+
+    _crash_on(monkeypatch, "remove", 1)
+    with pytest.raises(Crash):
+        replace_with_compacted(directory, files, read_archive(root, columns=list(archive.ARCHIVE_SCHEMA.names)), 100)
+    monkeypatch.undo()
+
+    # Merged file and sources are both on disk; readers skip the sources
+    assert len(glob.glob(os.path.join(directory, "*.parquet"))) == 3
+    assert len(live_parquet_files([directory])) == 1
+    assert read_archive(root).num_rows == 5
+
+    recover_compactions(directory)
+    assert glob.glob(os.path.join(directory, "*")) == live_parquet_files([directory])
+    assert not glob.glob(os.path.join(directory, ".compacting-*"))
+    assert read_archive(root).num_rows == 5
+
+
+def test_crash_before_publishing_the_compacted_file_is_undone(tmp_path, monkeypatch):
+    root = str(tmp_path)
+    directory = _two_parts(root)
+
+    # The first replace publishes the manifest, the second would publish the merged file
+    _crash_on(monkeypatch, "replace", 2)
+    with pytest.raises(Crash):
+        compact_archive(root)
+    monkeypatch.undo()
+
+    assert len(live_parquet_files([directory])) == 2
+    assert read_archive(root).num_rows == 5
+
+    assert compact_archive(root) == 1
+    assert len(glob.glob(os.path.join(directory, "*"))) == 1
+    assert not glob.glob(os.path.join(directory, ".compacting-*"))
+    assert read_archive(root).num_rows == 5
@@ -0,0 +1,101 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+from cache import BrochureCache
+
+NOW = datetime(2025, 6, 10, 12, 0, tzinfo=timezone.utc)
+
+
+def _cache(tmp_path, **entry):
+    cache = BrochureCache(str(tmp_path / "brochure_cache.json"), recheck_hours=6)
+    cache.entries["b1"] = entry
+    return cache
+
+
+def test_unknown_brochure_is_not_valid(tmp_path):
+    cache = BrochureCache(str(tmp_path / "brochure_cache.json"))
+    assert not cache.is_still_valid("b1", NOW)
+    assert not cache.is_unchanged("b1", "hash")
+
+
+def test_running_brochure_checked_recently_is_valid(tmp_path):
+    cache = _cache(tmp_path, valid_to=(NOW + timedelta(days=3)).isoformat(),
+                   checked_at=(NOW - timedelta(hours=5)).isoformat())
+    assert cache.is_still_valid("b1", NOW)
+
+
+def test_brochure_is_rechecked_after_recheck_hours(tmp_path):
+    cache = _cache(tmp_path, valid_to=(NOW + timedelta(days=3)).isoformat(),
+                   checked_at=(NOW - timedelta(hours=6)).isoformat())
+    assert not cache.is_still_valid("b1", NOW)
+
+
+def test_expired_brochure_is_not_valid(tmp_path):
+    cache = _cache(tmp_path, valid_to=NOW.isoformat(), checked_at=NOW.isoformat())
+    assert not cache.is_still_valid("b1", NOW)
+
+
+def test_brochure_without_timestamps_is_not_valid(tmp_path):
+    assert not _cache(tmp_path, valid_to=None, checked_at=NOW.isoformat()).is_still_valid("b1", NOW)
+    assert not _cache(tmp_path, valid_to=(NOW + timedelta(days=1)).isoformat()).is_still_valid("b1", NOW)
+
+
+def test_is_unchanged_compares_the_content_hash(tmp_path):
+    cache = _cache(tmp_path, content_hash="abc")
+    assert cache.is_unchanged("b1", "abc")
+    assert not cache.is_unchanged("b1", "def")
+
+
+def test_validity_survives_save_and_reload(tmp_path):
+    cache = _cache(tmp_path, valid_to=(NOW + timedelta(days=3)).isoformat(),
+                   checked_at=(NOW - timedelta(hours=1)).isoformat(), content_hash="abc")
+    cache.save()
+    reloaded = BrochureCache(cache.path, recheck_hours=6)
+    assert reloaded.is_still_valid("b1", NOW)
+    assert reloaded.is_unchanged("b1", "abc")
+
+
+def _entry(checked_at, **extra):
+    return dict(valid_to=(NOW + timedelta(days=3)).isoformat(), checked_at=checked_at.isoformat(), **extra)
+
+
+def test_concurrent_workers_keep_each_others_entries(tmp_path):
+    path = str(tmp_path / "brochure_cache.json")
+    BrochureCache(path).save()
+    first, second = BrochureCache(path), BrochureCache(path)
+    first.entries["b1"] = _entry(NOW)
+    second.entries["b2"] = _entry(NOW)
+    first.save()
+    second.save()
+
+    assert set(BrochureCache(path).entries) == {"b1", "b2"}
+    assert set(second.entries) == {"b1", "b2"}
+    assert sorted(os.listdir(tmp_path)) == ["brochure_cache.json", "brochure_cache.json.lock"]
+
+
+def test_later_check_of_the_same_brochure_wins(tmp_path):
+    path = str(tmp_path / "brochure_cache.json")
+    first, second = BrochureCache(path), BrochureCache(path)
+    first.entries["b1"] = _entry(NOW, content_hash="new")
+    second.entries["b1"] = _entry(NOW - timedelta(hours=1), content_hash="old")
+    first.save()
+    second.save()
+    assert BrochureCache(path).is_unchanged("b1", "new")
+
+
+def test_pruned_entries_stay_deleted_and_untouched_ones_are_not_overwritten(tmp_path):
+    path = str(tmp_path / "brochure_cache.json")
+    seed = BrochureCache(path)
+    seed.entries["expired"] = dict(_entry(NOW), valid_to=(NOW - timedelta(days=1)).isoformat())
+    seed.entries["b1"] = _entry(NOW - timedelta(hours=2), content_hash="old")
+    seed.save()
+
+    pruning, updating = BrochureCache(path), BrochureCache(path)
+    updating.entries["b1"] = _entry(NOW, content_hash="new")
+    updating.save()
+    assert pruning.prune(NOW) == 1
+    pruning.save()
+
+    reloaded = BrochureCache(path)
+    assert set(reloaded.entries) == {"b1"}
+    assert reloaded.is_unchanged("b1", "new")
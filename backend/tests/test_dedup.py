@@ -0,0 +1,71 @@
+import pytest
+
+from dedup import ProductResolver, blocking_key, name_key, normalize_size
+
+
+def _offer(name, brand="Milka", size="100 g", publisher="Lidl", price=1.29):
+    return {"name": name, "brand": brand, "specs": {"size": size}, "publisher": publisher, "salePrice": price,
+            "validFrom": "2025-06-09T00:00:00+00:00", "validTo": "2025-06-14T00:00:00+00:00"}
+
+
+def _canonical_ids(resolver, offers):
+    return [offer["canonicalId"] for offer in resolver.resolve(offers)]
+
+
+@pytest.mark.parametrize("size, normalized", [("0,5 l", "500ml"), ("1 kg", "1000g"), ("190 x 300 cm", "190x300cm"), (None, "")])
+def test_normalize_size(size, normalized):
+    assert normalize_size(size) == normalized
+
+
+def test_name_key_ignores_brand_size_case_and_order():
+    assert name_key("MILKA Schokolade Alpenmilch 100g", "Milka") == name_key("Alpenmilch-Schokolade", "milka")
+
+
+def test_blocking_key_falls_back_to_the_size_in_the_name():
+    assert blocking_key({"brand": "Milka", "name": "Schokolade 100 g"}) == ("milka", "100g")
+
+
+def test_same_normalized_product_matches():
+    ids = _canonical_ids(ProductResolver(), [
+        _offer("Milka Schokolade Alpenmilch 100g", publisher="Lidl"),
+        _offer("Alpenmilch-Schokolade", publisher="Aldi"),
+    ])
+    assert ids[0] == ids[1]
+
+
+def test_similar_name_matches_above_the_threshold():
+    # The name keys share 52 of 64 MinHash values (about 0.81)
+    offers = [_offer("Schokolade Alpenmilch", publisher="Lidl"), _offer("Schokolade Alpenmilch Nuss", publisher="Aldi")]
+    ids = _canonical_ids(ProductResolver(threshold=0.7), [dict(offer) for offer in offers])
+    assert ids[0] == ids[1]
+
+    ids = _canonical_ids(ProductResolver(threshold=0.9), [dict(offer) for offer in offers])
+    assert ids[0] != ids[1]
+
+
+def test_different_product_does_not_match():
+    ids = _canonical_ids(ProductResolver(), [_offer("Schokolade Alpenmilch"), _offer("Zartbitter Keks", price=2.49)])
+    assert ids[0] != ids[1]
+
+
+def test_other_brand_or_size_does_not_match():
+    ids = _canonical_ids(ProductResolver(), [
+        _offer("Schokolade Alpenmilch"),
+        _offer("Schokolade Alpenmilch", brand="Ritter Sport"),
+        _offer("Schokolade Alpenmilch", size="300 g"),
+    ])
+    assert len(set(ids)) == 3
+
+
+def test_canonical_id_does_not_depend_on_the_order():
+    offers = [_offer("Milka Schokolade Alpenmilch 100g", publisher="Lidl"), _offer("Zartbitter Keks", publisher="Rewe")]
+    forward = _canonical_ids(ProductResolver(), [dict(offer) for offer in offers])
+    backward = _canonical_ids(ProductResolver(), [dict(offer) for offer in offers[::-1]])
+    assert forward == backward[::-1]
+
+
+def test_duplicate_listing_is_dropped():
+    resolver = ProductResolver()
+    resolved = list(resolver.resolve([_offer("Schokolade Alpenmilch"), _offer("Alpenmilch Schokolade 100 g")]))
+    assert len(resolved) == 1
+    assert resolver.duplicates == 1
@@ -0,0 +1,74 @@
+import multiprocessing
+import os
+
+import numpy as np
+import pytest
+
+from embeddings import VectorCache, text_key, vectorized_text
+
+
+def test_vectorized_text_covers_only_product_text():
+    offer = {"name": "Kaffee Crema", "brand": "Tchibo", "description": "500 g", "categories": "Kaffee",
+             "currency": "EUR", "imageURL": "https://img/1.jpg", "offerId": "a1", "publisher": "Lidl"}
+    elsewhere = dict(offer, imageURL="https://img/2.jpg", offerId="b2", publisher="Aldi Nord")
+    assert vectorized_text(offer) == vectorized_text(elsewhere)
+    assert "Tchibo" in vectorized_text(offer) and "Lidl" not in vectorized_text(offer)
+
+
+def _vectors(seed, count, dim=8):
+    return np.random.default_rng(seed).random((count, dim), dtype=np.float32)
+
+
+def _append(directory, worker):
+    cache = VectorCache(directory, "test-model")
+    vectors = _vectors(worker, 40)
+    for start in range(0, 40, 5):
+        cache.add_many([text_key(f"{worker}-{i}") for i in range(start, start + 5)], vectors[start:start + 5])
+
+
+def test_vector_cache_instances_share_rows(tmp_path):
+    first, second = VectorCache(str(tmp_path), "test-model"), VectorCache(str(tmp_path), "test-model")
+    vectors = _vectors(0, 4)
+    first.add_many([b"a" * 20, b"b" * 20], vectors[:2])
+    # The second instance has not seen those rows; its rows go after them, not over them
+    second.add_many([b"b" * 20, b"c" * 20, b"d" * 20], vectors[1:])
+    assert len(second) == 4
+
+    found = first.get_many([b"a" * 20, b"c" * 20, b"d" * 20])
+    np.testing.assert_array_equal(found[b"a" * 20], vectors[0])
+    np.testing.assert_array_equal(found[b"d" * 20], vectors[3])
+    assert len(VectorCache(str(tmp_path), "test-model")) == 4
+
+
+def test_vector_cache_concurrent_appends_keep_rows_aligned(tmp_path):
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_append, args=(str(tmp_path), worker)) for worker in range(4)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+    assert all(process.exitcode == 0 for process in workers)
+
+    cache = VectorCache(str(tmp_path), "test-model")
+    assert len(cache) == 160
+    for worker in range(4):
+        found = cache.get_many([text_key(f"{worker}-{i}") for i in range(40)])
+        np.testing.assert_array_equal(np.stack(list(found.values())), _vectors(worker, 40))
+
+
+def test_vector_cache_drops_a_half_finished_append(tmp_path):
+    cache = VectorCache(str(tmp_path), "test-model")
+    cache.add_many([b"a" * 20], _vectors(0, 1))
+    with open(cache.vectors_path, "ab") as f:
+        f.write(_vectors(1, 1).tobytes())  # crashed before writing its key
+
+    other = VectorCache(str(tmp_path), "test-model")
+    other.add_many([b"b" * 20], _vectors(2, 1))
+    np.testing.assert_array_equal(cache.get_many([b"b" * 20])[b"b" * 20], _vectors(2, 1)[0])
+    assert os.path.getsize(cache.vectors_path) == 2 * 8 * 4
+
+
+def test_vector_cache_rejects_another_model(tmp_path):
+    VectorCache(str(tmp_path), "test-model").add_many([b"a" * 20], _vectors(0, 1))
+    with pytest.raises(ValueError):
+        VectorCache(str(tmp_path), "other-model")
@@ -0,0 +1,72 @@
+import uuid
+
+from import_data import build_data_object, delete_expired_offers, ingest_products_to_weaviate, object_uuid, \
+    rekey_legacy_offers
+from weaviate_fakes import FakeClient
+
+OFFER_ID = "0b3f6c1e-6a47-4c1f-9d0e-2f1b7c9a8e11"
+
+
+def _product(name="Kaffee Crema", price=4.99, offer_id=OFFER_ID, valid_to="2099-06-14T23:59:59+00:00"):
+    return {"name": name, "brand": "Tchibo", "description": "500 g", "categories": "Kaffee", "sale_price": price,
+            "regular_price": 6.99, "currency": "EUR", "image_url": "", "offer_id": offer_id, "publisher": "Lidl",
+            "valid_from": "2025-06-09T00:00:00+00:00", "valid_to": valid_to,
+            "scraped_at": "2025-06-09T08:00:00+00:00"}
+
+
+def test_every_product_of_an_offer_gets_its_own_object():
+    first, second = build_data_object(_product("Kaffee Crema")), build_data_object(_product("Espresso"))
+    assert object_uuid(first) != object_uuid(second)
+    assert object_uuid(first) == object_uuid(build_data_object(_product("Kaffee Crema", price=3.99)))
+
+
+def test_delta_ingest_skips_unchanged_objects():
+    client = FakeClient("ProductOffer")
+    offers = client.get("ProductOffer")
+    assert ingest_products_to_weaviate([_product("Kaffee Crema"), _product("Espresso")], skip_unchanged=True,
+                                       client=client)
+    stored = {object_id: obj["updated_at"] for object_id, obj in offers.objects.items()}
+    assert len(stored) == 2
+
+    # scrapedAt changes every run but is not part of the hash; only the repriced offer is sent
+    rescraped = [dict(_product("Kaffee Crema"), scraped_at="2025-06-10T08:00:00+00:00"), _product("Espresso", price=5.49)]
+    assert ingest_products_to_weaviate(rescraped, skip_unchanged=True, client=client)
+    changed = {object_id for object_id, obj in offers.objects.items() if obj["updated_at"] != stored[object_id]}
+    assert changed == {object_uuid(build_data_object(_product("Espresso")))}
+    assert offers.objects[object_uuid(build_data_object(_product("Espresso")))]["properties"]["salePrice"] == 5.49
+
+
+def test_delete_expired_offers():
+    client = FakeClient("ProductOffer")
+    ingest_products_to_weaviate([_product("Kaffee Crema"), _product("Espresso", valid_to="2000-01-01T00:00:00+00:00")],
+                                client=client)
+    assert delete_expired_offers(client.get("ProductOffer")) == 1
+    assert [obj["properties"]["name"] for obj in client.get("ProductOffer").objects.values()] == ["Kaffee Crema"]
+
+
+def test_rekey_moves_legacy_offers_and_removes_duplicates():
+    client = FakeClient("ProductOffer")
+    offers = client.get("ProductOffer")
+    # Stored by an old ingest under the offerId: one re-ingested since, one not
+    duplicated, alone = build_data_object(_product("Kaffee Crema")), build_data_object(_product("Tee", offer_id=str(uuid.uuid4())))
+    offers.put(duplicated["offerId"], duplicated, vector=[0.1, 0.2])
+    offers.put(alone["offerId"], alone, vector=[0.3, 0.4])
+    offers.put(object_uuid(duplicated), dict(duplicated, salePrice=3.99), vector=[0.5, 0.6])
+
+    assert rekey_legacy_offers(client) == 2
+    assert set(offers.objects) == {object_uuid(duplicated), object_uuid(alone)}
+    # The current copy wins over the legacy one, a legacy-only offer keeps its vector
+    assert offers.objects[object_uuid(duplicated)]["properties"]["salePrice"] == 3.99
+    assert offers.objects[object_uuid(alone)]["vector"] == [0.3, 0.4]
+    assert rekey_legacy_offers(client) == 0
+
+
+def test_rekey_keeps_a_legacy_offer_whose_copy_failed():
+    client = FakeClient("ProductOffer")
+    offers = client.get("ProductOffer")
+    legacy = build_data_object(_product("Tee"))
+    offers.put(legacy["offerId"], legacy)
+    offers.failing_ids.add(object_uuid(legacy))
+
+    assert rekey_legacy_offers(client) == 0
+    assert set(offers.objects) == {legacy["offerId"]}
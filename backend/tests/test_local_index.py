@@ -0,0 +1,80 @@
+from datetime import date, datetime, timezone
+
+import numpy as np
+import pytest
+from weaviate.collections.classes.filters import _FilterAnd, _FilterValue, _Operator
+
+from local_index import LocalIndex
+from queries import build_filters
+
+OBJECTS = [
+    {"name": "Kaffee Crema", "publisher": "Lidl", "salePrice": 4.99, "categories": "Kaffee, Heißgetränke",
+     "validFrom": "2025-06-09T00:00:00.000+0000", "validTo": "2025-06-14T23:59:59.000+0000", "priceDropPct": 25.0},
+    {"name": "Espresso", "publisher": "LIDL", "salePrice": 7.49, "categories": "kaffee",
+     "validFrom": "2025-06-16T00:00:00.000+0000", "validTo": "2025-06-21T23:59:59.000+0000", "priceDropPct": 0.0},
+    {"name": "Grüner Tee", "publisher": "Aldi", "salePrice": 1.29, "categories": "Tee, Heißgetränke",
+     "validFrom": "2025-06-01T00:00:00.000+0000", "validTo": "2025-06-30T23:59:59.000+0000", "priceDropPct": None},
+    {"name": "Schokolade", "publisher": "Rewe", "salePrice": None, "categories": None,
+     "validFrom": None, "validTo": None, "priceDropPct": 40.0},
+    {"name": "Kekse", "publisher": None, "salePrice": 2.0, "categories": "Süßwaren",
+     "validFrom": "2025-06-14T12:00:00", "validTo": "2025-06-15T12:00:00", "priceDropPct": 10.0},
+]
+
+
+def _value(value):
+    if isinstance(value, str):
+        try:
+            moment = datetime.fromisoformat(value)
+        except ValueError:
+            return value
+        return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _matches(filter, data_object):
+    # Reference evaluation of a Weaviate filter: text compares case-insensitively (word tokenization
+    # lower-cases), LIKE "*x*" is a substring match and a missing value never matches
+    if filter is None:
+        return True
+    if isinstance(filter, _FilterAnd):
+        return all(_matches(child, data_object) for child in filter.filters)
+    assert isinstance(filter, _FilterValue)
+    value = _value(data_object.get(filter.target))
+    if value is None:
+        return False
+    if filter.operator == _Operator.EQUAL:
+        return value.casefold() == filter.value.casefold()
+    if filter.operator == _Operator.LIKE:
+        return filter.value.strip("*").casefold() in value.casefold()
+    if filter.operator == _Operator.GREATER_THAN_EQUAL:
+        return value >= filter.value
+    if filter.operator == _Operator.LESS_THAN_EQUAL:
+        return value <= filter.value
+    raise AssertionError(f"Unexpected operator {filter.operator}")
+
+
+@pytest.mark.parametrize("filters", [
+    {},
+    {"publisher": "lidl"},
+    {"publisher": "Netto"},
+    {"min_price": 2.0},
+    {"max_price": 4.99},
+    {"min_price": 1.0, "max_price": 5.0},
+    {"category": "kaffee"},
+    {"category": "Heißgetränke"},
+    {"valid_on": date(2025, 6, 14)},
+    {"valid_on": datetime(2025, 6, 15, 13, 0, tzinfo=timezone.utc)},
+    {"min_price_drop": 10},
+    {"publisher": "Lidl", "category": "kaffee", "valid_on": date(2025, 6, 10), "min_price_drop": 20},
+])
+def test_filter_mask_matches_build_filters(filters):
+    index = LocalIndex(OBJECTS)
+    expected = np.array([_matches(build_filters(**filters), data_object) for data_object in OBJECTS])
+    np.testing.assert_array_equal(index.filter_mask(**filters), expected)
+
+
+def test_search_applies_the_filters():
+    index = LocalIndex(OBJECTS)
+    assert {result["name"] for result in index.search("kaffee", mode="keyword", publisher="lidl")} == {"Kaffee Crema", "Espresso"}
+    assert [result["name"] for result in index.search("kaffee", mode="keyword", max_price=5)] == ["Kaffee Crema"]
+    assert index.search("kaffee", mode="keyword", valid_on=date(2025, 6, 1)) == []
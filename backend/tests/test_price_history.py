@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pyarrow as pa
+import pytest
+
+from price_history import daily_medians, find_price_drops, load_observations, offer_price_drops, record_prices
+
+START = datetime(2025, 6, 1, tzinfo=timezone.utc)
+
+
+def _offer(day, price, name="Kaffee", offer_id="o1", hour=12):
+    return {"name": name, "brand": "Tchibo", "publisher": "Lidl", "offer_id": offer_id, "sale_price": price,
+            "scraped_at": (START + timedelta(days=day, hours=hour)).isoformat()}
+
+
+def test_median_weights_every_day_once(tmp_path):
+    # Seen 20 times on the first day at 8, then once at 10, which holds for the next five days
+    record_prices([_offer(0, 8.0, hour=h % 24) for h in range(20)] + [_offer(1, 10.0)], root=str(tmp_path))
+    now = START + timedelta(days=5, hours=12)
+    keys, _, medians, days = daily_medians(load_observations(str(tmp_path)), START, now)
+    assert len(keys) == 1
+    assert days[0] == 6
+    assert medians[0] == pytest.approx(10.0)
+
+
+def test_median_of_an_even_number_of_days(tmp_path):
+    record_prices([_offer(0, 4.0), _offer(1, 6.0)], root=str(tmp_path))
+    _, _, medians, days = daily_medians(load_observations(str(tmp_path)), START, START + timedelta(days=1, hours=12))
+    assert days[0] == 2
+    assert medians[0] == pytest.approx(5.0)
+
+
+def test_price_drop_against_the_window_median(tmp_path):
+    record_prices([_offer(day, 10.0) for day in range(10)] + [_offer(10, 5.0)], root=str(tmp_path))
+    now = START + timedelta(days=10, hours=13)
+
+    [drop] = find_price_drops(min_drop_pct=20, window_days=30, root=str(tmp_path), now=now)
+    assert drop["offer_id"] == "o1"
+    assert drop["name"] == "Kaffee"
+    assert drop["latest_price"] == 5.0
+    assert drop["median_price"] == 10.0
+    assert drop["drop_pct"] == 50.0
+
+    assert find_price_drops(min_drop_pct=60, window_days=30, root=str(tmp_path), now=now) == []
+
+
+def test_no_drop_below_min_observations(tmp_path):
+    record_prices([_offer(0, 10.0), _offer(1, 5.0)], root=str(tmp_path))
+    now = START + timedelta(days=1, hours=13)
+
+    [drop] = find_price_drops(min_drop_pct=20, min_observations=2, root=str(tmp_path), now=now)
+    assert drop["drop_pct"] == pytest.approx(33.3)
+    assert find_price_drops(min_drop_pct=20, min_observations=3, root=str(tmp_path), now=now) == []
+    assert offer_price_drops(min_observations=3, root=str(tmp_path), now=now) == [
+        {"offer_id": "o1", "name": "Kaffee", "drop_pct": 0.0}
+    ]
+
+
+def test_offer_price_drops_covers_every_offer(tmp_path):
+    # The same product in an older and a newer offer, plus a product whose price went up
+    record_prices([_offer(day, 10.0) for day in range(10)] + [_offer(10, 8.0, offer_id="o2")]
+                  + [_offer(day, 2.0, name="Tee", offer_id="o3") for day in range(10)] + [_offer(10, 3.0, name="Tee", offer_id="o3")],
+                  root=str(tmp_path))
+    now = START + timedelta(days=10, hours=13)
+
+    drops = {(row["offer_id"], row["name"]): row["drop_pct"] for row in offer_price_drops(root=str(tmp_path), now=now)}
+    assert drops == {("o1", "Kaffee"): 0.0, ("o2", "Kaffee"): 20.0, ("o3", "Tee"): 0.0}
+
+
+def test_window_leaves_out_old_observations(tmp_path):
+    record_prices([_offer(0, 100.0)] + [_offer(day, 10.0) for day in range(40, 45)], root=str(tmp_path))
+    now = START + timedelta(days=45)
+    assert find_price_drops(min_drop_pct=1, window_days=30, root=str(tmp_path), now=now) == []
+
+
+def test_medians_do_not_depend_on_row_order():
+    # Keys 0 and 1 share their high bits next to 2**62, so the packed sort interleaves them at first
+    rng = np.random.default_rng(0)
+    keys = np.repeat(np.array([0, 1, 2 ** 62, -5], dtype=np.int64), 12)
+    observed_at = int(START.timestamp()) + rng.integers(0, 10 * 86400, len(keys))
+    prices = rng.integers(1, 40, len(keys)).astype(np.float32) / 4
+    table = pa.table({"product_key": keys, "observed_at": pa.array(observed_at, pa.timestamp("s", tz="UTC")),
+                      "sale_price": prices})
+    now = START + timedelta(days=10)
+
+    expected = daily_medians(table.sort_by([("product_key", "ascending"), ("observed_at", "ascending")]), START, now)
+    shuffled = rng.permutation(len(keys))
+    unique_keys, group, medians, days = daily_medians(table.take(shuffled), START, now)
+    assert unique_keys.tolist() == [-5, 0, 1, 2 ** 62]
+    assert np.array_equal(unique_keys[group], keys[shuffled])
+    assert np.array_equal(medians, expected[2]) and np.array_equal(days, expected[3])
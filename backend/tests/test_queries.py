@@ -0,0 +1,100 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+import queries
+from queries import SearchCache, invalidate_search_cache, search_products
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(queries.time, "monotonic", clock)
+    return clock
+
+
+def test_entries_expire_after_the_ttl(tmp_path, clock):
+    cache = SearchCache(ttl=60, marker_path=str(tmp_path / "marker"))
+    cache.put("kaffee", [1])
+    clock.now += 59
+    assert cache.get("kaffee") == [1]
+    clock.now += 2
+    assert cache.get("kaffee") is None
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path, clock):
+    cache = SearchCache(maxsize=2, marker_path=str(tmp_path / "marker"))
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+
+def test_results_are_copied_in_and_out(tmp_path, clock):
+    cache = SearchCache(marker_path=str(tmp_path / "marker"))
+    results = [{"name": "Kaffee"}]
+    cache.put("kaffee", results)
+    results[0]["name"] = "Tee"
+    cache.get("kaffee")[0]["name"] = "Tee"
+    assert cache.get("kaffee") == [{"name": "Kaffee"}]
+
+
+def test_a_touched_marker_drops_the_entries_of_other_processes(tmp_path, clock):
+    marker = str(tmp_path / "marker")
+    cache = SearchCache(marker_path=marker)
+    cache.put("kaffee", [1])
+
+    # Another process commits an ingest run: first the marker appears, then it is touched again
+    open(marker, "a").close()
+    assert cache.get("kaffee") is None
+    cache.put("kaffee", [1])
+    assert cache.get("kaffee") == [1]
+    os.utime(marker, ns=(1, 1))
+    assert cache.get("kaffee") is None
+
+
+class Collection:
+    def __init__(self):
+        self.calls = []
+        self.query = SimpleNamespace(hybrid=self.hybrid)
+
+    def hybrid(self, query, **options):
+        self.calls.append(query)
+        obj = SimpleNamespace(properties={"name": "Kaffee Crema"}, uuid="0b3f6c1e-6a47-4c1f-9d0e-2f1b7c9a8e11",
+                              metadata=SimpleNamespace(score=0.9, distance=None))
+        return SimpleNamespace(objects=[obj])
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    collection = Collection()
+    client = SimpleNamespace(collections=SimpleNamespace(get=lambda name: collection))
+    monkeypatch.setattr(queries, "get_weaviate_client", lambda: client)
+    queries._cache.clear()
+    return collection
+
+
+def test_search_is_cached_by_normalized_query_until_an_ingest_commits(collection):
+    assert search_products("  Kaffee ")[0]["name"] == "Kaffee Crema"
+    assert search_products("kaffee")[0]["name"] == "Kaffee Crema"
+    assert collection.calls == ["kaffee"]
+
+    # Filters are part of the key, use_cache=False always asks Weaviate
+    search_products("kaffee", publisher="Lidl")
+    search_products("kaffee", use_cache=False)
+    assert len(collection.calls) == 3
+
+    invalidate_search_cache()
+    search_products("kaffee")
+    assert len(collection.calls) == 4
@@ -0,0 +1,92 @@
+import pytest
+
+import schema
+from weaviate_fakes import FakeClient
+
+IDS = [f"00000000-0000-4000-8000-{i:012d}" for i in range(10)]
+
+
+def _offer(i, price=1.0, scraped_at="2025-06-09T08:00:00+00:00"):
+    return {"name": f"Offer {i}", "offerId": IDS[i], "salePrice": price, "scrapedAt": scraped_at, "contentHash": f"h{i}"}
+
+
+@pytest.fixture
+def client():
+    client = FakeClient("ProductOffer")
+    for i in range(4):
+        client.get("ProductOffer").put(IDS[i], _offer(i), vector=[float(i)])
+    return client
+
+
+def _during_backfill(monkeypatch, change):
+    # Runs `change` on the live collection right after the backfill copied it
+    copy_objects = schema._copy_objects
+
+    def copy_then_change(client, source_name, target_name, *args):
+        copied = copy_objects(client, source_name, target_name, *args)
+        if "_legacy_" not in target_name:
+            change(client.get(source_name))
+        return copied
+
+    monkeypatch.setattr(schema, "_copy_objects", copy_then_change)
+
+
+def _contents(collection):
+    return {object_id: (obj["properties"], obj["vector"]) for object_id, obj in collection.objects.items()}
+
+
+def test_blue_green_catches_up_rewrites_deletions_and_new_objects(client, monkeypatch):
+    def change(offers):
+        # A priceDropPct rewrite keeps scrapedAt and contentHash
+        offers.put(IDS[0], dict(_offer(0), priceDropPct=25.0), vector=[0.0])
+        del offers.objects[IDS[1]]
+        offers.put(IDS[5], _offer(5), vector=[5.0])
+
+    _during_backfill(monkeypatch, change)
+    live = client.get("ProductOffer")
+    new_name = schema.blue_green_migrate(client)
+
+    assert client.aliases["ProductOffer"] == new_name
+    new = client.store[new_name]
+    assert set(new.objects) == {IDS[0], IDS[2], IDS[3], IDS[5]}
+    assert new.objects[IDS[0]]["properties"]["priceDropPct"] == 25.0
+    assert new.objects[IDS[5]]["vector"] == [5.0]
+    # The original is kept as a rollback copy with the same objects
+    [legacy_name] = [name for name in client.store if "_legacy_" in name]
+    assert _contents(client.store[legacy_name]) == _contents(live)
+
+
+def test_catch_up_is_not_capped_by_a_page_size(client, monkeypatch):
+    monkeypatch.setattr(schema, "SYNC_CHUNK_SIZE", 2)
+
+    def change(offers):
+        for i in range(4, 10):
+            offers.put(IDS[i], _offer(i), vector=[float(i)])
+
+    _during_backfill(monkeypatch, change)
+    new_name = schema.blue_green_migrate(client, drop_old=True)
+    assert set(client.store[new_name].objects) == set(IDS)
+    assert not any("_legacy_" in name for name in client.store)
+
+
+def test_alias_stays_when_the_copy_never_matches(client, monkeypatch):
+    diff_collections = schema.diff_collections
+
+    def always_stale(client, source_name, target_name):
+        stale, extra = diff_collections(client, source_name, target_name)
+        return stale + [IDS[0]], extra
+
+    monkeypatch.setattr(schema, "diff_collections", always_stale)
+    assert schema.blue_green_migrate(client) is None
+    assert client.aliases == {}
+    assert set(client.get("ProductOffer").objects) == set(IDS[:4])
+
+
+def test_second_switch_moves_the_alias_and_keeps_new_writes(client):
+    first = schema.blue_green_migrate(client, drop_old=True)
+    client.get("ProductOffer").put(IDS[6], _offer(6))
+    second = schema.blue_green_migrate(client)
+
+    assert client.aliases["ProductOffer"] == second != first
+    assert set(client.store[second].objects) == set(IDS[:4]) | {IDS[6]}
+    assert first in client.store
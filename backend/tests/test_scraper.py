@@ -0,0 +1,119 @@
+import io
+import json
+import os
+from datetime import timedelta
+
+import main
+from cache import BrochureCache
+from work_queue import WorkQueue
+
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bench", "fixtures",
+                            "brochure.json")
+
+
+def _brochure(copies=20):
+    with open(FIXTURE_PATH, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    offers = data["offers"]["_embedded"]["contents"]
+    data["offers"]["_embedded"]["contents"] = [dict(offer, id=f"{offer['id']}-{i}") for i in range(copies) for offer in offers]
+    return json.dumps(data).encode("utf-8")
+
+
+class Raw(io.BytesIO):
+    # Response body that hands out small chunks, like a socket
+    def read(self, size=-1):
+        return super().read(512 if size is None or size < 0 else min(size, 512))
+
+
+class Response:
+    def __init__(self, body, status_code=200):
+        self.raw = Raw(body)
+        self.status_code = status_code
+        self.elapsed = timedelta(milliseconds=5)
+        self.headers = {"ETag": '"v1"'}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+
+class Session:
+    def __init__(self, body):
+        self.body = body
+        self.requests = 0
+
+    def get(self, url, **kwargs):
+        self.requests += 1
+        self.response = Response(self.body)
+        return self.response
+
+    def close(self):
+        pass
+
+
+def test_first_products_reach_the_sink_before_the_download_finished():
+    body = _brochure()
+    session = Session(body)
+    read_at_first_product = []
+
+    def sink(products, store, brochure_id=None):
+        count = 0
+        for _ in products:
+            if not count:
+                read_at_first_product.append(session.response.raw.tell())
+            count += 1
+        return count
+
+    assert main.scrape_kaufda_products("b1", "Lidl", session=session, sink=sink)
+    assert read_at_first_product[0] < len(body) / 2
+
+
+class RecordingSink:
+    # Collects what reaches the sink, and with observe() every offer that was parsed
+    def __init__(self):
+        self.sent = []
+        self.parsed = []
+
+    def __call__(self, products, store, brochure_id=None):
+        self.sent.extend(products)
+        return len(self.sent)
+
+    def observe(self, products, store):
+        for product in products:
+            self.parsed.append(product)
+            yield product
+
+
+def test_prehash_skips_a_byte_identical_brochure_without_parsing(tmp_path):
+    body = _brochure(copies=2)
+    cache = BrochureCache(str(tmp_path / "brochure_cache.json"), recheck_hours=0)
+    first = RecordingSink()
+    assert main.scrape_kaufda_products("b1", "Lidl", session=Session(body), cache=cache, sink=first)
+    assert first.sent
+
+    # Streaming: the offers are parsed again, but the offer cache sends none of them
+    streamed = RecordingSink()
+    assert main.scrape_kaufda_products("b1", "Lidl", session=Session(body), cache=cache, sink=streamed)
+    assert len(streamed.parsed) == len(first.sent)
+    assert streamed.sent == []
+
+    # prehash: the unchanged body is not parsed at all
+    prehashed = RecordingSink()
+    assert main.scrape_kaufda_products("b1", "Lidl", session=Session(body), cache=cache, sink=prehashed, prehash=True)
+    assert prehashed.parsed == [] and prehashed.sent == []
+
+
+def test_empty_brochure_finishes_its_queue_job(tmp_path, monkeypatch):
+    session = Session(_brochure(copies=0))
+    monkeypatch.setattr(main, "create_session", lambda **kwargs: session)
+    queue = WorkQueue(str(tmp_path / "work_queue.sqlite3"))
+    queue.start_crawl([{"contentId": "b1", "publisher": {"name": "Lidl"}}])
+
+    assert main.crawl_queue(queue, max_workers=1, sink=RecordingSink()) == {"b1": True}
+    assert session.requests == 1
+    assert not queue.has_work()
@@ -0,0 +1,101 @@
+import io
+import json
+from datetime import timedelta
+
+import pytest
+
+import main
+from work_queue import WorkQueue
+
+BERLIN = {"lat": 52.52, "lng": 13.405, "zip": "10115"}
+POTSDAM = {"lat": 52.39, "lng": 13.065, "zip": "14467"}
+
+
+class Response:
+    def __init__(self, data=None, status_code=200):
+        self.data = data
+        self.status_code = status_code
+        self.elapsed = timedelta(milliseconds=5)
+        self.content = json.dumps(data).encode("utf-8")
+        self.raw = io.BytesIO(self.content)
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.data
+
+
+class ShelfSession:
+    # Serves shelf pages {(lat, page): [contentIds]} and records every request
+    def __init__(self, pages, total_pages=None):
+        self.pages = pages
+        self.total_pages = total_pages
+        self.requests = []
+
+    def get(self, url, params=None, **kwargs):
+        self.requests.append(params)
+        ids = self.pages.get((float(params["lat"]), int(params["page"])), [])
+        data = {"_embedded": {"contents": [{"content": {"contentId": i, "publisher": {"name": f"P{i}"}}} for i in ids]}}
+        if self.total_pages is not None:
+            data["page"] = {"totalPages": self.total_pages}
+        return Response(data)
+
+    def close(self):
+        pass
+
+
+def test_crawl_shelf_follows_pages_until_a_short_page():
+    session = ShelfSession({(BERLIN["lat"], 0): ["a", "b"], (BERLIN["lat"], 1): ["c", "d"], (BERLIN["lat"], 2): ["e"]})
+    brochures = main.crawl_shelf([BERLIN], session=session, page_size=2)
+    assert [b["content"]["contentId"] for b in brochures] == ["a", "b", "c", "d", "e"]
+    assert [params["page"] for params in session.requests] == ["0", "1", "2"]
+
+
+def test_crawl_shelf_stops_at_the_last_page_reported():
+    session = ShelfSession({(BERLIN["lat"], 0): ["a", "b"], (BERLIN["lat"], 1): ["c", "d"]}, total_pages=2)
+    assert len(main.crawl_shelf([BERLIN], session=session, page_size=2)) == 4
+    assert len(session.requests) == 2
+
+
+def test_crawl_shelf_dedupes_across_locations_and_keeps_the_first_location():
+    session = ShelfSession({(BERLIN["lat"], 0): ["lidl", "action"], (POTSDAM["lat"], 0): ["action", "rewe"]})
+    brochures = main.crawl_shelf([BERLIN, POTSDAM], session=session, page_size=24)
+    assert {b["content"]["contentId"]: b["location"] for b in brochures} == {
+        "lidl": BERLIN, "action": BERLIN, "rewe": POTSDAM,
+    }
+
+
+def test_brochure_is_fetched_for_the_location_that_found_it(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    session = ShelfSession({(POTSDAM["lat"], 0): ["rewe"]})
+    with open("brochures.json", "w", encoding="utf-8") as f:
+        json.dump({"_embedded": {"contents": main.crawl_shelf([POTSDAM], session=session)}}, f)
+
+    queue = WorkQueue(str(tmp_path / "work_queue.sqlite3"))
+    queue.start_crawl(main.find_products())
+    [job] = queue.claim("w1")
+    assert job["location"] == POTSDAM
+
+    class BrochureSession:
+        def get(self, url, params=None, **kwargs):
+            self.params = params
+            return Response()
+
+    brochure_session = BrochureSession()
+    main.fetch_brochure(job["brochure_id"], brochure_session, location=job["location"])
+    assert (brochure_session.params["lat"], brochure_session.params["lng"]) == ("52.39", "13.065")
+
+
+@pytest.mark.parametrize("value, location", [
+    ("52.52,13.405", {"lat": 52.52, "lng": 13.405, "zip": ""}),
+    ("52.52, 13.405, 10115", BERLIN),
+])
+def test_parse_location(value, location):
+    assert main.parse_location(value) == location
+
+
+@pytest.mark.parametrize("value", ["10115", "52.52", "1,2,3,4"])
+def test_parse_location_needs_coordinates(value):
+    with pytest.raises(ValueError):
+        main.parse_location(value)
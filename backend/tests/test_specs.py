@@ -0,0 +1,47 @@
+import pytest
+
+from specs import SpecRules, extract_specs_batch, extract_specs_from_description, set_spec_rules, SPEC_RULES_PATH
+
+
+@pytest.mark.parametrize("description, size, quantity, material", [
+    ("Alpenmilch 100 g, 3 Stück, Kunststoff", "100 g", 3, "Kunststoff"),
+    ("Sessel 190 x 300 x 125 cm Velours-Stoff mit Kippfunktion", "190 x 300 x 125 cm", None, "Velours-Stoff"),
+    ("0,5 l Flasche", "0,5 l", None, None),
+    # The longest material wins over the one it contains
+    ("ABS-Kunststoff Koffer", None, None, "ABS-Kunststoff"),
+    ("nur Text", None, None, None),
+])
+def test_extract_specs(description, size, quantity, material):
+    specs = extract_specs_from_description(description)
+    assert (specs["size"], specs["quantity"], specs["material"]) == (size, quantity, material)
+
+
+def test_extract_specs_keeps_the_rest_as_special_feature():
+    assert extract_specs_from_description("0,5 l Flasche")["specialFeature"] == "Flasche"
+    assert extract_specs_from_description("ABS-Kunststoff Koffer")["specialFeature"] == "Koffer"
+    assert extract_specs_from_description("250 g")["specialFeature"] is None
+
+
+@pytest.mark.parametrize("description", ["", None, 42])
+def test_extract_specs_without_description(description):
+    assert extract_specs_from_description(description) == {
+        "size": None, "quantity": None, "material": None, "specialFeature": None,
+    }
+
+
+def test_extract_specs_batch_returns_independent_dicts():
+    specs = extract_specs_batch(["0,5 l", None, "0,5 l"])
+    assert [s["size"] for s in specs] == ["0,5 l", None, "0,5 l"]
+    specs[0]["size"] = "changed"
+    assert specs[2]["size"] == "0,5 l"
+    assert extract_specs_from_description("0,5 l")["size"] == "0,5 l"
+
+
+def test_set_spec_rules_drops_memoized_results():
+    assert extract_specs_from_description("Becher aus Kork")["material"] is None
+    try:
+        set_spec_rules(SpecRules(["g"], ["Stück"], ["Kork"]))
+        assert extract_specs_from_description("Becher aus Kork")["material"] == "Kork"
+    finally:
+        set_spec_rules(SpecRules.from_file(SPEC_RULES_PATH))
+    assert extract_specs_from_description("Becher aus Kork")["material"] is None
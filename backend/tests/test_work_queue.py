@@ -0,0 +1,114 @@
+import pytest
+
+import work_queue
+from work_queue import DONE, FAILED, IN_FLIGHT, PENDING, WorkQueue
+
+BROCHURES = [
+    {"contentId": "a", "publisher": {"name": "Lidl"}},
+    {"contentId": "b", "publisher": None},
+    {"contentId": None, "publisher": {"name": "Aldi"}},
+]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(work_queue.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    queue = WorkQueue(str(tmp_path / "work_queue.sqlite3"), lease_seconds=60, max_attempts=3, retry_backoff=10)
+    queue.start_crawl(BROCHURES)
+    return queue
+
+
+def _state(queue, brochure_id):
+    with queue._connect() as db:
+        return db.execute("SELECT state FROM jobs WHERE brochure_id = ?", (brochure_id,)).fetchone()[0]
+
+
+def test_start_crawl_skips_brochures_without_id_and_tolerates_null_publisher(queue):
+    assert queue.counts() == {PENDING: 2}
+    jobs = {job["brochure_id"]: job["publisher"] for job in queue.claim("w1", 10)}
+    assert jobs == {"a": "Lidl", "b": None}
+
+
+def test_start_crawl_does_not_replace_an_unfinished_crawl(queue):
+    assert queue.start_crawl([{"contentId": "c", "publisher": None}]) == 0
+    assert queue.counts() == {PENDING: 2}
+
+
+def test_claimed_job_is_leased_to_one_worker(queue):
+    [first] = queue.claim("w1")
+    [second] = queue.claim("w2")
+    assert first["brochure_id"] != second["brochure_id"]
+    assert queue.claim("w3") == []
+
+
+def test_expired_lease_is_claimed_again(queue, clock):
+    claimed = queue.claim("w1", 10)
+    assert queue.claim("w2", 10) == []
+    clock.now += 61
+    reclaimed = queue.claim("w2", 10)
+    assert {job["brochure_id"] for job in reclaimed} == {job["brochure_id"] for job in claimed}
+    assert all(job["attempts"] == 2 for job in reclaimed)
+
+
+def test_renewed_lease_is_not_claimed_again(queue, clock):
+    queue.claim("w1", 10)
+    clock.now += 50
+    assert queue.renew(["a", "b"], "w1") == 2
+    clock.now += 50
+    assert queue.claim("w2", 10) == []
+    # Only the lease holder can renew
+    assert queue.renew(["a"], "w2") == 0
+
+
+def test_failed_job_is_retried_with_backoff_until_max_attempts(queue, clock):
+    queue.complete("b")
+    for attempt in range(1, 3):
+        [job] = queue.claim("w1")
+        assert job["attempts"] == attempt
+        assert queue.fail("a", "boom") == PENDING
+        assert queue.claim("w1") == []
+        assert queue.next_due_in() == pytest.approx(10 * 2 ** (attempt - 1))
+        clock.now += 10 * 2 ** (attempt - 1)
+
+    queue.claim("w1")
+    assert queue.fail("a", "boom") == FAILED
+    assert queue.next_due_in() is None
+    assert not queue.has_work()
+
+    assert queue.retry_failed() == 1
+    assert queue.claim("w1")[0]["attempts"] == 1
+
+
+def test_complete_finishes_the_crawl(queue):
+    for job in queue.claim("w1", 10):
+        queue.complete(job["brochure_id"])
+    assert queue.counts() == {DONE: 2}
+    assert not queue.has_work()
+    assert queue.start_crawl([{"contentId": "c", "publisher": None}]) == 1
+
+
+def test_resuming_worker_waits_for_in_flight_leases(queue, clock):
+    queue.claim("crashed", 10)
+    assert queue.has_work()
+    assert queue.next_due_in() == pytest.approx(60)
+
+    # A resuming worker picks the jobs up once the lease of the crashed one ran out
+    resumed = WorkQueue(queue.path, lease_seconds=60)
+    clock.now += 60.5
+    assert resumed.next_due_in() == 0
+    assert {job["brochure_id"] for job in resumed.claim("w2", 10)} == {"a", "b"}
+    assert _state(resumed, "a") == IN_FLIGHT
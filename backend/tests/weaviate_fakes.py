@@ -0,0 +1,153 @@
+# weaviate_fakes.py
+# In-memory stand-in for the parts of the Weaviate v4 collection API the backend uses:
+# fetch_objects with id/property filters, the cursor iterator, batches, delete_many and counts.
+import dataclasses
+import itertools
+import time
+import uuid as uuid_module
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from weaviate.collections.classes.filters import _FilterAnd, _FilterValue, _Operator
+
+
+def _comparable(value):
+    if isinstance(value, str):
+        try:
+            moment = datetime.fromisoformat(value)
+        except ValueError:
+            return value
+        return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+    return value
+
+
+def matches(filter, obj):
+    if filter is None:
+        return True
+    if isinstance(filter, _FilterAnd):
+        return all(matches(child, obj) for child in filter.filters)
+    assert isinstance(filter, _FilterValue), filter
+    if filter.target == "_id":
+        value = obj["uuid"]
+    elif filter.target == "_lastUpdateTimeUnix":
+        value = obj["updated_at"]
+    else:
+        value = _comparable(obj["properties"].get(filter.target))
+    wanted = _comparable(filter.value)
+    if filter.operator == _Operator.CONTAINS_ANY:
+        return value in {str(item) for item in wanted}
+    if value is None:
+        return False
+    if filter.operator == _Operator.EQUAL:
+        return value == wanted
+    if filter.operator == _Operator.GREATER_THAN:
+        return value > wanted
+    if filter.operator == _Operator.GREATER_THAN_EQUAL:
+        return value >= wanted
+    if filter.operator == _Operator.LESS_THAN:
+        return value < wanted
+    if filter.operator == _Operator.LESS_THAN_EQUAL:
+        return value <= wanted
+    raise AssertionError(f"Unsupported operator {filter.operator}")
+
+
+class FakeBatch:
+    def __init__(self, collection):
+        self.collection = collection
+
+    def __enter__(self):
+        self.collection.batch.failed_objects = []
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add_object(self, properties, uuid=None, vector=None):
+        object_id = str(uuid or uuid_module.uuid4())
+        if object_id in self.collection.failing_ids:
+            error = SimpleNamespace(object_=SimpleNamespace(properties=properties, uuid=object_id, vector=vector),
+                                    message="rejected")
+            self.collection.batch.failed_objects.append(error)
+            return
+        self.collection.put(object_id, properties, vector)
+
+
+class FakeCollection:
+    def __init__(self, name):
+        self.name = name
+        self.objects = {}
+        self.failing_ids = set()
+        self._clock = itertools.count(int(time.time() * 1000))
+        self.batch = SimpleNamespace(failed_objects=[], fixed_size=lambda batch_size=None, **kw: FakeBatch(self),
+                                     dynamic=lambda: FakeBatch(self))
+        self.query = SimpleNamespace(fetch_objects=self.fetch_objects)
+        self.data = SimpleNamespace(delete_many=self.delete_many)
+        self.aggregate = SimpleNamespace(over_all=lambda total_count=True: SimpleNamespace(total_count=len(self.objects)))
+
+    def put(self, object_id, properties, vector=None):
+        self.objects[str(object_id)] = {"uuid": str(object_id), "properties": dict(properties), "vector": vector,
+                                        "updated_at": next(self._clock)}
+
+    def _object(self, obj, include_vector=False, return_properties=None):
+        properties = obj["properties"]
+        if return_properties is not None:
+            properties = {key: value for key, value in properties.items() if key in return_properties}
+        return SimpleNamespace(uuid=uuid_module.UUID(obj["uuid"]), properties=dict(properties),
+                               vector={"default": obj["vector"]} if include_vector and obj["vector"] is not None else {},
+                               metadata=SimpleNamespace(last_update_time=obj["updated_at"]))
+
+    def fetch_objects(self, filters=None, limit=None, offset=0, after=None, include_vector=False,
+                      return_properties=None, sort=None, return_metadata=None):
+        found = sorted((obj for obj in self.objects.values() if matches(filters, obj)), key=lambda obj: obj["uuid"])
+        if after is not None:
+            found = [obj for obj in found if obj["uuid"] > str(after)]
+        found = found[offset:offset + limit if limit else None]
+        return SimpleNamespace(objects=[self._object(obj, include_vector, return_properties) for obj in found])
+
+    def iterator(self, include_vector=False, return_properties=None, return_metadata=None):
+        for object_id in sorted(self.objects):
+            if object_id in self.objects:
+                yield self._object(self.objects[object_id], include_vector, return_properties)
+
+    def delete_many(self, where=None):
+        doomed = [object_id for object_id, obj in self.objects.items() if matches(where, obj)]
+        for object_id in doomed:
+            del self.objects[object_id]
+        return SimpleNamespace(successful=len(doomed), failed=0)
+
+
+@dataclasses.dataclass
+class FakeConfig:
+    name: str
+    properties: list
+
+
+class FakeClient:
+    def __init__(self, *names):
+        self.store = {name: FakeCollection(name) for name in names}
+        self.aliases = {}
+        self.collections = SimpleNamespace(
+            get=self.get, exists=lambda name: self._resolve(name) in self.store,
+            delete=lambda name: self.store.pop(name, None), create=self.create,
+            export_config=lambda name: FakeConfig(name, [SimpleNamespace(name=key) for key in self._property_names(name)]),
+            create_from_config=lambda config: self.create(config.name),
+        )
+        self.alias = SimpleNamespace(
+            get=lambda alias_name: SimpleNamespace(collection=self.aliases[alias_name]) if alias_name in self.aliases else None,
+            exists=lambda alias_name: alias_name in self.aliases,
+            create=lambda alias_name, target_collection: self.aliases.__setitem__(alias_name, target_collection),
+            update=lambda alias_name, new_target_collection: self.aliases.__setitem__(alias_name, new_target_collection),
+        )
+
+    def create(self, name, **config):
+        assert name not in self.store, f"{name} exists"
+        self.store[name] = FakeCollection(name)
+
+    def _property_names(self, name):
+        return {key for obj in self.get(name).objects.values() for key in obj["properties"]}
+
+    def _resolve(self, name):
+        return self.aliases.get(name, name)
+
+    def get(self, name):
+        return self.store.setdefault(self._resolve(name), FakeCollection(self._resolve(name)))
@@ -1,27 +1,130 @@
-import weaviate
+# client.py
+import atexit
+import logging
 import os
-from weaviate.classes.init import Auth
-from dotenv import load_dotenv
-
-load_dotenv()  # Load .env file
-
-# client = weaviate.Client(
-#     url=os.getenv("WEAVIATE_URL"),
-#     auth_client_secret=weaviate.AuthApiKey(os.getenv("WEAVIATE_API_KEY"))
-# )
-
-# Instantiate your client (not shown). e.g.:
-# client = weaviate.connect_to_weaviate_cloud(...) or
-# client = weaviate.connect_to_local(...)
-client = weaviate.connect_to_weaviate_cloud(
-    cluster_url=os.getenv("WEAVIATE_URL"),
-   auth_credentials=Auth.api_key(os.getenv("WEAVIATE_API_KEY")),
-)
-
-try:
-    # Work with the client here - e.g.:
-    assert client.is_live()
-    pass
-
-finally:  # This will always be executed, even if an exception is raised
-    client.close()
\ No newline at end of file
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Seconds between liveness checks of the shared client
+HEALTH_CHECK_INTERVAL = 30
+
+_client = None
+_client_pid = None
+_last_health_check = 0.0
+_lock = threading.Lock()
+
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def create_weaviate_client():
+    """
+    Opens a new Weaviate connection configured from the environment (.env).
+
+    WEAVIATE_MODE=cloud (default) uses WEAVIATE_URL and WEAVIATE_API_KEY.
+    WEAVIATE_MODE=local uses WEAVIATE_HOST, WEAVIATE_HTTP_PORT and WEAVIATE_GRPC_PORT
+    for a self-hosted instance. Timeouts (seconds) come from WEAVIATE_TIMEOUT_INIT,
+    WEAVIATE_TIMEOUT_QUERY and WEAVIATE_TIMEOUT_INSERT.
+
+    Most callers want the shared get_weaviate_client() instead.
+    """
+    # Imported on first connect: the client library alone takes about a second to load
+    import weaviate
+    from weaviate.classes.init import AdditionalConfig, Auth, Timeout
+    from dotenv import load_dotenv
+
+    load_dotenv()  # Load .env file
+
+    additional_config = AdditionalConfig(
+        timeout=Timeout(
+            init=_env_int("WEAVIATE_TIMEOUT_INIT", 10),
+            query=_env_int("WEAVIATE_TIMEOUT_QUERY", 30),
+            insert=_env_int("WEAVIATE_TIMEOUT_INSERT", 90),
+        )
+    )
+    api_key = os.getenv("WEAVIATE_API_KEY")
+
+    if os.getenv("WEAVIATE_MODE", "cloud") == "local":
+        return weaviate.connect_to_local(
+            host=os.getenv("WEAVIATE_HOST", "localhost"),
+            port=_env_int("WEAVIATE_HTTP_PORT", 8080),
+            grpc_port=_env_int("WEAVIATE_GRPC_PORT", 50051),
+            auth_credentials=Auth.api_key(api_key) if api_key else None,
+            additional_config=additional_config,
+        )
+
+    return weaviate.connect_to_weaviate_cloud(
+        cluster_url=os.getenv("WEAVIATE_URL"),
+        auth_credentials=Auth.api_key(api_key),
+        additional_config=additional_config,
+    )
+
+
+def _is_healthy(client):
+    try:
+        return client.is_connected() and client.is_ready()
+    except Exception:
+        return False
+
+
+def get_weaviate_client():
+    """
+    Returns the client shared by everything in this process, or None if Weaviate is unreachable.
+
+    The connection is opened on first use, checked at most every HEALTH_CHECK_INTERVAL
+    seconds and reopened when it went away. A forked worker process gets its own
+    connection. Callers must not close it; it is closed at interpreter exit.
+    """
+    global _client, _client_pid, _last_health_check
+
+    with _lock:
+        # Connections are not shared across forks
+        if _client is not None and _client_pid != os.getpid():
+            _client = None
+
+        now = time.monotonic()
+        if _client is not None and now - _last_health_check > HEALTH_CHECK_INTERVAL:
+            _last_health_check = now
+            if not _is_healthy(_client):
+                logger.warning("Weaviate connection lost. Reconnecting...")
+                try:
+                    _client.close()
+                except Exception:
+                    pass
+                _client = None
+
+        if _client is None:
+            try:
+                _client = create_weaviate_client()
+            except Exception as e:
+                logger.error("Could not connect to Weaviate: %s", e)
+                return None
+            _client_pid = os.getpid()
+            _last_health_check = now
+
+        return _client
+
+
+def close_weaviate_client():
+    """
+    Closes the shared client, if any. The next get_weaviate_client() reconnects.
+    """
+    global _client
+
+    with _lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+
+
+atexit.register(close_weaviate_client)
+
+
+if __name__ == "__main__":
+    # Connection check
+    client = get_weaviate_client()
+    print("Weaviate is live." if client and client.is_live() else "Weaviate is not reachable.")
@@ -0,0 +1,349 @@
+# dedup.py
+# Entity resolution: offers of the same real-world product from different brochures and
+# publishers are linked to one CanonicalProduct, and repeated listings of the same deal dropped.
+import logging
+import re
+import zlib
+from datetime import datetime, timezone
+
+import numpy as np
+from weaviate.util import generate_uuid5
+
+from client import get_weaviate_client # Shared, lazily connected client
+from schema import CANONICAL_COLLECTION_NAME, COLLECTION_NAME, create_canonical_product_schema
+from specs import get_spec_rules
+
+logger = logging.getLogger(__name__)
+
+# MinHash signature length, split into LSH bands of BAND_ROWS values each.
+# 16 bands of 4 rows make names with a Jaccard similarity above ~0.5 likely to become candidates.
+NUM_PERM = 64
+BAND_ROWS = 4
+NUM_BANDS = NUM_PERM // BAND_ROWS
+
+# Minimum estimated Jaccard similarity of name shingles for two offers to be the same product
+# (flavour variants such as "Alpenmilch" vs. "Haselnuss Alpenmilch" stay around 0.6)
+MATCH_THRESHOLD = 0.7
+
+# Character n-grams the names are compared on
+SHINGLE_SIZE = 3
+
+# Offers whose signatures are computed together
+RESOLVE_CHUNK_SIZE = 512
+
+# Canonical products whose offers are read back per query when their aggregates are recomputed,
+# and offers per page of that query
+REFRESH_CHUNK_SIZE = 100
+REFRESH_PAGE_SIZE = 1000
+
+# Fixed hash family (a * h + b mod 2^32, odd a: a permutation of the 32-bit shingle hashes),
+# so signatures and canonical ids are the same in every run
+_rng = np.random.default_rng(20240601)
+_HASH_A = (_rng.integers(0, 1 << 32, NUM_PERM, dtype=np.uint64) | np.uint64(1)).astype(np.uint32)
+_HASH_B = _rng.integers(0, 1 << 32, NUM_PERM, dtype=np.uint64).astype(np.uint32)
+_BAND_MIX = _rng.integers(1, 1 << 63, BAND_ROWS + 1, dtype=np.uint64) | np.uint64(1)
+
+# Sizes are compared in a base unit, so "0,5 l" and "500 ml" end up in the same block
+_UNIT_SCALE = {
+    "kg": ("g", 1000), "g": ("g", 1), "mg": ("g", 0.001),
+    "l": ("ml", 1000), "cl": ("ml", 10), "ml": ("ml", 1),
+    "m": ("cm", 100), "cm": ("cm", 1), "mm": ("cm", 0.1),
+}
+_SIZE = re.compile(r"(\d+(?:[.,]\d+)?)\s*([a-zA-Z]+)")
+
+
+def _normalize_text(value):
+    return re.sub(r"\s+", " ", str(value or "")).strip().casefold()
+
+
+def normalize_size(size):
+    """
+    "0,5 l" -> "500ml", "1 kg" -> "1000g"; other sizes (e.g. "190 x 300 cm") are only tidied up.
+    """
+    if not size:
+        return ""
+    match = _SIZE.fullmatch(size.strip())
+    if not match or match.group(2).lower() not in _UNIT_SCALE:
+        return re.sub(r"\s+", "", size).lower()
+    unit, scale = _UNIT_SCALE[match.group(2).lower()]
+    return f"{round(float(match.group(1).replace(',', '.')) * scale, 3):g}{unit}"
+
+
+def name_key(name, brand=None):
+    """
+    Order-insensitive form of a product name without brand, size and punctuation,
+    e.g. "MILKA Schokolade Alpenmilch 100g" and "Alpenmilch-Schokolade" -> "alpenmilch schokolade".
+    """
+    text = get_spec_rules().size.sub(" ", name or "")
+    tokens = set(re.findall(r"\w+", _normalize_text(text)))
+    tokens -= set(re.findall(r"\w+", _normalize_text(brand)))
+    return " ".join(sorted(tokens))
+
+
+def blocking_key(data_object):
+    """
+    Only offers with the same brand and normalized size are compared with each other.
+    """
+    size = (data_object.get("specs") or {}).get("size")
+    if not size:
+        size_match = get_spec_rules().size.search(data_object.get("name") or "")
+        size = size_match.group(1) if size_match else None
+    return _normalize_text(data_object.get("brand")), normalize_size(size)
+
+
+def _shingle_hashes(text):
+    padded = f" {text} "
+    shingles = {padded[i:i + SHINGLE_SIZE] for i in range(max(len(padded) - SHINGLE_SIZE + 1, 1))}
+    return [zlib.crc32(shingle.encode("utf-8")) for shingle in shingles]
+
+
+def minhash_many(texts):
+    """
+    MinHash signatures of the character shingles of many texts, as an (n, NUM_PERM) uint32 array.
+    All shingles of the batch are hashed in one NumPy pass and reduced per text.
+    """
+    per_text = [_shingle_hashes(text) for text in texts]
+    if not per_text:
+        return np.empty((0, NUM_PERM), dtype=np.uint32)
+    lengths = np.fromiter(map(len, per_text), dtype=np.int64, count=len(per_text))
+    hashes = np.fromiter((h for text_hashes in per_text for h in text_hashes), dtype=np.uint32, count=int(lengths.sum()))
+    # Every hash function applied to every shingle at once (uint32 wraps around), then the minimum per text
+    permuted = np.outer(hashes, _HASH_A)
+    permuted += _HASH_B
+    return np.minimum.reduceat(permuted, np.concatenate(([0], np.cumsum(lengths)[:-1])), axis=0)
+
+
+def minhash(text):
+    return minhash_many([text])[0]
+
+
+def band_keys(signatures, block_ids):
+    """
+    One 64-bit LSH bucket key per band of each signature, as an (n, NUM_BANDS) array.
+    The key mixes in the block and the band number, so buckets never span blocks or bands.
+    """
+    rows = signatures.reshape(len(signatures), NUM_BANDS, BAND_ROWS).astype(np.uint64)
+    slots = block_ids.astype(np.uint64)[:, None] * np.uint64(NUM_BANDS) + np.arange(NUM_BANDS, dtype=np.uint64)
+    # Multiply-and-add with wrap-around; a rare collision only adds a candidate that fails the score check
+    return (rows * _BAND_MIX[:BAND_ROWS]).sum(axis=2) + slots * _BAND_MIX[BAND_ROWS]
+
+
+def _chunked(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _offer_aggregates(offers, canonical_ids):
+    # Offer count, publishers and cheapest offer of each canonical product, from its stored offers
+    from weaviate.classes.query import Filter, Sort
+
+    aggregates = {}
+    offset = 0
+    while True:
+        objects = offers.query.fetch_objects(
+            filters=Filter.by_property("canonicalId").contains_any(canonical_ids),
+            return_properties=["canonicalId", "publisher", "salePrice", "offerId"],
+            sort=Sort.by_property("offerId").by_property("name"), limit=REFRESH_PAGE_SIZE, offset=offset,
+        ).objects
+        for obj in objects:
+            offer = obj.properties
+            aggregate = aggregates.setdefault(offer["canonicalId"], {
+                "offerCount": 0, "publishers": set(), "minPrice": None, "cheapestPublisher": None, "cheapestOfferId": None,
+            })
+            aggregate["offerCount"] += 1
+            if offer.get("publisher"):
+                aggregate["publishers"].add(offer["publisher"])
+            price = offer.get("salePrice")
+            if price is not None and (aggregate["minPrice"] is None or price < aggregate["minPrice"]):
+                aggregate["minPrice"] = price
+                aggregate["cheapestPublisher"] = offer.get("publisher")
+                aggregate["cheapestOfferId"] = offer.get("offerId")
+        if len(objects) < REFRESH_PAGE_SIZE:
+            break
+        offset += REFRESH_PAGE_SIZE
+
+    for aggregate in aggregates.values():
+        aggregate["publishers"] = sorted(aggregate["publishers"])
+    return aggregates
+
+
+class ProductResolver:
+    """
+    Streaming entity resolution of ProductOffer data objects.
+
+    Every offer is compared only with the canonical products in its block (brand + size)
+    that share at least one LSH band of its name signature. Each band bucket keeps only the
+    first product that landed in it, so an offer has at most NUM_BANDS candidates and the
+    cost per offer does not grow with the catalog, even for very common names. An offer joins the best match above MATCH_THRESHOLD, otherwise
+    it founds a new canonical product. Offers are tagged with `canonicalId`; a second
+    listing of the same deal (same product, publisher, price and validity) is dropped.
+
+    A canonical product's UUID is derived from its normalized key (brand, size and the sorted
+    name tokens), so offers that normalize alike get the same product in any order. load()
+    seeds the resolver with the stored products, so fuzzy matches also reach the products of
+    earlier runs instead of founding new ones depending on which offer a run sees first.
+    """
+
+    def __init__(self, threshold=MATCH_THRESHOLD):
+        self.threshold = threshold
+        self.block_ids = {}
+        self.buckets = {}
+        self.signatures = np.empty((1024, NUM_PERM), dtype=np.uint32)
+        self.products = []
+        self.seen_deals = set()
+        self.resolved = 0
+        self.duplicates = 0
+
+    def _match(self, data_object, block, key, signature, object_band_keys):
+        candidates = list({self.buckets[band_key] for band_key in object_band_keys if band_key in self.buckets})
+        if candidates:
+            # Share of equal signature values estimates the Jaccard similarity, for all candidates at once
+            scores = np.count_nonzero(self.signatures[candidates] == signature, axis=1)
+            best = int(np.argmax(scores))
+            if scores[best] >= self.threshold * NUM_PERM:
+                return candidates[best]
+
+        return self._add_product(generate_uuid5("|".join((*block, key))), data_object.get("name"),
+                                 data_object.get("brand"), block, signature, object_band_keys)
+
+    def _add_product(self, uuid, name, brand, block, signature, object_band_keys):
+        index = len(self.products)
+        if index == len(self.signatures):
+            self.signatures = np.concatenate([self.signatures, np.empty_like(self.signatures)])
+        self.signatures[index] = signature
+        self.products.append({"uuid": uuid, "name": name, "brand": brand, "size": block[1] or None, "offers": 0})
+        for band_key in object_band_keys:
+            self.buckets.setdefault(band_key, index)
+        return index
+
+    def _band_keys(self, blocks, keys):
+        block_ids = np.fromiter((self.block_ids.setdefault(block, len(self.block_ids)) for block in blocks),
+                                dtype=np.int64, count=len(blocks))
+        signatures = minhash_many(keys)
+        return signatures, band_keys(signatures, block_ids).tolist()
+
+    def load(self, client=None):
+        """
+        Seeds the resolver with the stored canonical products. Returns the number loaded.
+        """
+        client = client or get_weaviate_client()
+        if not client or not client.collections.exists(CANONICAL_COLLECTION_NAME):
+            return 0
+
+        collection = client.collections.get(CANONICAL_COLLECTION_NAME)
+        known = {product["uuid"] for product in self.products}
+        stored = [
+            (str(obj.uuid), obj.properties) for obj in collection.iterator(return_properties=["name", "brand", "size"])
+            if str(obj.uuid) not in known
+        ]
+        for chunk in _chunked(stored, RESOLVE_CHUNK_SIZE):
+            blocks = [(_normalize_text(properties.get("brand")), properties.get("size") or "") for _, properties in chunk]
+            keys = [name_key(properties.get("name"), properties.get("brand")) for _, properties in chunk]
+            signatures, chunk_band_keys = self._band_keys(blocks, keys)
+            for (uuid, properties), block, signature, object_band_keys in zip(chunk, blocks, signatures, chunk_band_keys):
+                self._add_product(uuid, properties.get("name"), properties.get("brand"), block, signature, object_band_keys)
+        logger.info("Loaded %d stored canonical products.", len(stored))
+        return len(stored)
+
+    def resolve(self, data_objects):
+        """
+        Yields the data objects with `canonicalId` set, leaving out duplicate listings.
+        """
+        for chunk in _chunked(data_objects, RESOLVE_CHUNK_SIZE):
+            yield from self._resolve_chunk(chunk)
+
+    def _resolve_chunk(self, data_objects):
+        blocks = [blocking_key(data_object) for data_object in data_objects]
+        keys = [name_key(data_object.get("name"), data_object.get("brand")) for data_object in data_objects]
+        signatures, chunk_band_keys = self._band_keys(blocks, keys)
+
+        for data_object, block, key, signature, object_band_keys in zip(data_objects, blocks, keys, signatures, chunk_band_keys):
+            index = self._match(data_object, block, key, signature, object_band_keys)
+            deal = (index, data_object.get("publisher"), data_object.get("salePrice"),
+                    data_object.get("validFrom"), data_object.get("validTo"))
+            if deal in self.seen_deals:
+                self.duplicates += 1
+                continue
+            self.seen_deals.add(deal)
+
+            product = self.products[index]
+            data_object["canonicalId"] = product["uuid"]
+            product["offers"] += 1
+            self.resolved += 1
+            yield data_object
+
+    def save(self, client=None):
+        """
+        Upserts the canonical products that offers were linked to in this run. Their aggregates
+        (offer count, publishers, cheapest offer) are recomputed from all their stored offers, so
+        a run that sees only some of them does not overwrite the totals; name, brand and vector
+        of a stored product are kept. Call it once the offers are committed. Returns the number saved.
+        """
+        client = client or get_weaviate_client()
+        if not client:
+            return 0
+
+        create_canonical_product_schema(client)
+        products = {product["uuid"]: product for product in self.products if product["offers"]}
+        saved, failed, deleted = self._refresh(client, products)
+        logger.info("Resolved %d offers to %d canonical products (%d duplicate listings dropped, %d canonical products failed).",
+                    self.resolved, len(products), self.duplicates, failed)
+        return saved
+
+    def prune(self, client=None):
+        """
+        Recomputes the aggregates of every stored canonical product and deletes the ones
+        without offers left, e.g. after expired offers were deleted. Returns the number deleted.
+        """
+        client = client or get_weaviate_client()
+        if not client or not client.collections.exists(CANONICAL_COLLECTION_NAME):
+            return 0
+
+        collection = client.collections.get(CANONICAL_COLLECTION_NAME)
+        products = {str(obj.uuid): None for obj in collection.iterator(return_properties=[])}
+        _, _, deleted = self._refresh(client, products)
+        logger.info("Pruned %d canonical products without offers.", deleted)
+        return deleted
+
+    def _refresh(self, client, products):
+        # Rewrites the given canonical products ({uuid: product of this run or None}) from their stored offers
+        from weaviate.classes.query import Filter
+
+        offers = client.collections.get(COLLECTION_NAME)
+        collection = client.collections.get(CANONICAL_COLLECTION_NAME)
+        updated_at = datetime.now(timezone.utc).isoformat()
+        saved = 0
+        orphans = []
+        with collection.batch.dynamic() as batch:
+            for chunk in _chunked(products, REFRESH_CHUNK_SIZE):
+                aggregates = _offer_aggregates(offers, chunk)
+                stored = {
+                    str(obj.uuid): obj for obj in collection.query.fetch_objects(
+                        filters=Filter.by_id().contains_any(chunk), include_vector=True, limit=len(chunk)
+                    ).objects
+                }
+                for uuid in chunk:
+                    if uuid not in aggregates:
+                        if uuid in stored:
+                            orphans.append(uuid)
+                        continue
+                    if uuid in stored:
+                        properties, vector = dict(stored[uuid].properties), stored[uuid].vector.get("default")
+                    else:
+                        product = products[uuid]
+                        properties = {"name": product["name"], "brand": product["brand"], "size": product["size"]}
+                        vector = None
+                    properties.update(aggregates[uuid], updatedAt=updated_at)
+                    batch.add_object(properties=properties, uuid=uuid, vector=vector)
+                    saved += 1
+
+        failed = len(collection.batch.failed_objects)
+        if orphans:
+            collection.data.delete_many(where=Filter.by_id().contains_any(orphans))
+        return saved - failed, failed, len(orphans)
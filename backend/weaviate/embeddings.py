@@ -0,0 +1,228 @@
+# embeddings.py
+import fcntl
+import hashlib
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+
+import numpy as np
+
+from queries import STATE_DIR
+from schema import COLLECTION_NAME, product_offer_properties
+
+# Use the same model as the text2vec-transformers inference container, so vectors computed
+# here and query vectors computed by Weaviate (near_text / hybrid) live in the same space
+DEFAULT_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/multi-qa-MiniLM-L6-cos-v1")
+VECTOR_CACHE_DIR = os.getenv("VECTOR_CACHE_DIR", os.path.join(STATE_DIR, "vector_cache"))
+
+# sha1 digest of the vectorized text
+KEY_DTYPE = np.dtype("S20")
+
+
+def _camel_case_to_lower(name):
+    # "ProductOffer" -> "product offer", "validFrom" -> "valid from"
+    return re.sub(r"(?<=[a-z0-9])(?=[A-Z])", " ", name).lower()
+
+
+@lru_cache(maxsize=1)
+def _vectorized_properties():
+    # (name, include the property name) of the text properties the vectorizer reads, sorted by name
+    from weaviate.classes.config import DataType
+
+    return tuple(sorted(
+        (prop.name, prop.vectorize_property_name) for prop in product_offer_properties()
+        if prop.dataType in (DataType.TEXT, DataType.TEXT_ARRAY) and not prop.skip_vectorization
+    ))
+
+
+def vectorized_text(data_object, class_name=COLLECTION_NAME):
+    """
+    The text a ProductOffer vector is computed from, built the way the text2vec-transformers
+    module builds it: the class name, then every text property that is not skipped, sorted
+    by name and prefixed with the property name where the schema asks for it.
+
+    Collections filled through blue_green_migrate() carry a suffixed class name, so objects
+    Weaviate vectorizes there get a slightly different text; fill a collection through one
+    path (always --local-vectors or never) to keep its vectors comparable.
+    """
+    parts = [_camel_case_to_lower(class_name)]
+    for name, with_name in _vectorized_properties():
+        value = data_object.get(name)
+        if isinstance(value, list):
+            value = " ".join(str(item) for item in value)
+        if not isinstance(value, str):
+            continue
+        parts.append(f"{_camel_case_to_lower(name)} {value}" if with_name else value)
+    return " ".join(parts)
+
+
+def text_key(text):
+    return hashlib.sha1(text.encode("utf-8")).digest()
+
+
+class VectorCache:
+    """
+    Append-only on-disk vector store keyed by a hash of the vectorized text.
+
+    vectors.f32 holds the float32 rows and is memory-mapped for reads, keys.bin holds
+    the 20-byte key of every row in the same order, meta.json the model and dimension.
+    Rows are written before keys, so a crash mid-append only loses the unfinished rows.
+    Appends hold an exclusive lock on the `lock` file and take their row numbers from the
+    file sizes, so several processes can share one cache; rows they add are picked up on read.
+    """
+
+    def __init__(self, directory=VECTOR_CACHE_DIR, model_name=DEFAULT_MODEL):
+        self.directory = directory
+        self.model_name = model_name
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.keys_path = os.path.join(directory, "keys.bin")
+        self.meta_path = os.path.join(directory, "meta.json")
+        self.lock_path = os.path.join(directory, "lock")
+        self.dim = None
+        self.index = {}
+        self._vectors = None
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        with self._locked():
+            self._repair()
+            self._refresh()
+
+    @contextmanager
+    def _locked(self):
+        # Thread lock for this instance, file lock for the other processes
+        with self._lock, open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def _read_meta(self):
+        if self.dim is None and os.path.exists(self.meta_path):
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("model") != self.model_name:
+                raise ValueError(f"Vector cache '{self.directory}' was built with '{meta.get('model')}', not '{self.model_name}'")
+            self.dim = meta["dim"]
+        return self.dim
+
+    def _complete_rows(self):
+        # Rows with both a vector and a key on disk
+        if not self._read_meta():
+            return 0
+        keys = os.path.getsize(self.keys_path) // KEY_DTYPE.itemsize if os.path.exists(self.keys_path) else 0
+        rows = os.path.getsize(self.vectors_path) // (4 * self.dim) if os.path.exists(self.vectors_path) else 0
+        return min(keys, rows)
+
+    def _repair(self):
+        # Cut off a half-finished append so rows and keys stay aligned; only safe under the file lock
+        count = self._complete_rows()
+        if os.path.exists(self.vectors_path) and os.path.getsize(self.vectors_path) > count * 4 * (self.dim or 0):
+            os.truncate(self.vectors_path, count * 4 * self.dim)
+        if os.path.exists(self.keys_path) and os.path.getsize(self.keys_path) > count * KEY_DTYPE.itemsize:
+            os.truncate(self.keys_path, count * KEY_DTYPE.itemsize)
+        return count
+
+    def _refresh(self):
+        # Indexes the rows other processes appended since the last look
+        count = self._complete_rows()
+        known = len(self.index)
+        if count <= known:
+            return
+        keys = np.fromfile(self.keys_path, dtype=KEY_DTYPE, count=count - known, offset=known * KEY_DTYPE.itemsize)
+        self.index.update((key, row) for row, key in enumerate(keys.tolist(), start=known))
+        self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(count, self.dim))
+
+    def __len__(self):
+        return len(self.index)
+
+    def get_many(self, keys):
+        """
+        Returns {key: vector} for the keys that are cached.
+        """
+        with self._lock:
+            if any(key not in self.index for key in keys):
+                self._refresh()
+            found = {key: self.index[key] for key in keys if key in self.index}
+            if not found:
+                return {}
+            rows = np.fromiter(found.values(), dtype=np.int64, count=len(found))
+            vectors = np.asarray(self._vectors[rows])
+        return dict(zip(found.keys(), vectors))
+
+    def add_many(self, keys, vectors):
+        """
+        Appends new vectors (an (n, dim) array) under their keys.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._locked():
+            if self._read_meta() is None:
+                self.dim = int(vectors.shape[1])
+                with open(self.meta_path, "w", encoding="utf-8") as f:
+                    json.dump({"model": self.model_name, "dim": self.dim}, f)
+
+            # Another process may have appended (or crashed mid-append) since our last look
+            self._repair()
+            self._refresh()
+            new = {}
+            for i, key in enumerate(keys):
+                if key not in self.index and key not in new:
+                    new[key] = i
+            if not new:
+                return
+            with open(self.vectors_path, "ab") as f:
+                f.write(vectors[list(new.values())].tobytes())
+            with open(self.keys_path, "ab") as f:
+                f.write(np.array(list(new.keys()), dtype=KEY_DTYPE).tobytes())
+            self._refresh()
+
+
+class LocalEmbedder:
+    """
+    Computes ProductOffer vectors on the CPU with sentence-transformers, in batches,
+    and only for texts that are not in the vector cache yet.
+    """
+
+    def __init__(self, model_name=DEFAULT_MODEL, cache_dir=VECTOR_CACHE_DIR, batch_size=64):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.cache = VectorCache(cache_dir, model_name)
+        self._model = None
+        self.hits = 0
+        self.misses = 0
+
+    def _load_model(self):
+        if self._model is None:
+            try:
+                from sentence_transformers import SentenceTransformer
+            except ImportError as e:
+                raise ImportError("Local embeddings need sentence-transformers: pip install sentence-transformers") from e
+            self._model = SentenceTransformer(self.model_name, device="cpu")
+        return self._model
+
+    def embed_texts(self, texts):
+        """
+        Returns one vector (list of floats) per text.
+        """
+        keys = [text_key(text) for text in texts]
+        cached = self.cache.get_many(keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            vectors = self._load_model().encode(
+                list(missing.values()), batch_size=self.batch_size, normalize_embeddings=True, convert_to_numpy=True
+            )
+            self.cache.add_many(list(missing.keys()), vectors)
+            cached.update(zip(missing.keys(), vectors))
+
+        return [cached[key].tolist() for key in keys]
+
+    def embed_objects(self, data_objects):
+        return self.embed_texts([vectorized_text(data_object) for data_object in data_objects])
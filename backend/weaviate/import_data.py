@@ -1,135 +1,633 @@
 # ingest_data.py
-import pandas as pd
-from datetime import datetime
-import re
-import weaviate
-from client import get_weaviate_client # Import the client function
-
-# Function to extract specs from description (replicated from previous response for clarity)
-def extract_specs_from_description(description):
-    specs = {
-        "size": None,
-        "quantity": None,
-        "material": None,
-        "specialFeature": None
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import math
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from client import create_weaviate_client, get_weaviate_client # Shared, lazily connected client
+
+from queries import invalidate_search_cache
+from schema import resolve_collection_name
+from specs import extract_specs_batch, extract_specs_from_description
+
+# metrics.py lives in backend/ and is shared with the scraper (run through cli.py)
+from metrics import METRICS, setup_logging
+
+logger = logging.getLogger(__name__)
+
+
+# Scraper fields that hold numbers (CSV stores them as text)
+NUMBER_FIELDS = ("sale_price", "regular_price")
+
+# Properties left out of the content hash (they change without the offer changing)
+UNHASHED_PROPERTIES = ("scrapedAt", "contentHash")
+
+# How many offers are checked against the stored hashes per query in delta mode
+DELTA_CHUNK_SIZE = 500
+
+# Objects vectorized together when computing vectors locally
+EMBED_CHUNK_SIZE = 256
+
+# Objects per request for fixed-size batches, and retry rounds for objects that failed
+DEFAULT_BATCH_SIZE = 200
+MAX_RETRIES = 3
+
+
+def clean_number(value):
+    """
+    Returns a float, or None for missing values ("", None, NaN).
+    """
+    if value is None or value == "":
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(number) else number
+
+
+def read_products_csv(path):
+    """
+    Yields product dictionaries from a scraper CSV file, with prices as numbers and empty cells as None.
+    """
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            product_info = {key: (value if value != "" else None) for key, value in row.items()}
+            for field in NUMBER_FIELDS:
+                product_info[field] = clean_number(product_info.get(field))
+            yield product_info
+
+
+def build_data_object(product_info, specs=None):
+    """
+    Maps a scraped product dictionary onto the 'ProductOffer' schema properties.
+    `specs` can be passed in when they were already extracted in bulk.
+    """
+    # Prepare data for Weaviate ingestion, matching schema
+    data_object = {
+        "name": product_info.get('name'),
+        "brand": product_info.get('brand'),
+        "description": product_info.get('description'),
+        "categories": product_info.get('categories'), # Keep as TEXT for now
+        "salePrice": clean_number(product_info.get('sale_price')),
+        "regularPrice": clean_number(product_info.get('regular_price')),
+        "currency": product_info.get('currency'),
+        "imageURL": product_info.get('image_url'),
+        "offerId": product_info.get('offer_id'),
+        "publisher": product_info.get('publisher'),
+        "validFrom": product_info.get('valid_from'), # Already in ISO format from scraper
+        "validTo": product_info.get('valid_to'),     # Already in ISO format from scraper
+        "scrapedAt": product_info.get('scraped_at'), # Already in ISO format from scraper
+        "specs": specs
     }
+    if specs is None:
+        with METRICS.timer("spec_extraction_seconds"):
+            data_object["specs"] = extract_specs_from_description(product_info.get('description', ''))
 
-    if not description:
-        return specs
+    # Weaviate expects None for empty image_url, not empty string
+    if data_object["imageURL"] == "":
+        data_object["imageURL"] = None
+    
+    # Weaviate expects None for empty brand
+    if data_object["brand"] == "":
+        data_object["brand"] = None
 
-    # Make a mutable copy for parsing
-    working_description = description
+    data_object["contentHash"] = content_hash(data_object)
+    return data_object
 
-    # Example: "100 ml", "300 ml", "3,9 ml", "250 g", "190 x 300 x 125 cm"
-    size_match = re.search(r'(\d+(\.\d+)?\s*(ml|g|cm|x\s*\d+\s*cm)\b)', working_description, re.IGNORECASE)
-    if size_match:
-        specs["size"] = size_match.group(1).strip()
-        working_description = working_description.replace(size_match.group(0), '', 1).strip()
 
-    # Example: "3 Stück", "50 Stück", "2 St"
-    quantity_match = re.search(r'(\d+)\s*(Stück|St)\b', working_description, re.IGNORECASE)
-    if quantity_match:
-        try:
-            specs["quantity"] = int(quantity_match.group(1))
-            working_description = working_description.replace(quantity_match.group(0), '', 1).strip()
-        except ValueError:
-            pass
+def object_uuid(data_object):
+    """
+    UUID of a ProductOffer object. An offer can hold several products that share one offerId,
+    so the product name is part of the key; same result as weaviate.util.generate_uuid5().
+    """
+    key = f"{data_object.get('offerId')}|{data_object.get('name')}"
+    return str(uuid.uuid5(uuid.NAMESPACE_DNS, key))
+
 
-    # Example: "100 % Baumwolle", "Kunststoff", "Velours-Stoff", "ABS-Kunststoff"
-    material_match = re.search(r'(100\s*%\s*Baumwolle|Kunststoff|Velours-Stoff|ABS-Kunststoff)', working_description, re.IGNORECASE)
-    if material_match:
-        specs["material"] = material_match.group(1).strip()
-        working_description = working_description.replace(material_match.group(0), '', 1).strip()
+def content_hash(data_object):
+    """
+    Hash of the properties that matter for search; scrapedAt changes every run and is left out.
+    """
+    stable = {key: value for key, value in data_object.items() if key not in UNHASHED_PROPERTIES}
+    encoded = json.dumps(stable, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
 
-    # The rest of the description can be a special feature
-    if working_description:
-        specs["specialFeature"] = working_description.strip()
 
-    return specs
+def _resolved(data_objects, resolver):
+    # dedup.ProductResolver sets canonicalId after build_data_object() hashed the object, so hash again:
+    # an offer moved to another canonical product has to be sent even in delta mode
+    for data_object in resolver.resolve(data_objects):
+        data_object["contentHash"] = content_hash(data_object)
+        yield data_object
 
 
-def ingest_products_to_weaviate(products_data):
+def fetch_existing_hashes(collection, object_ids):
     """
-    Ingests a list of product dictionaries into the 'ProductOffer' collection in Weaviate.
+    Returns {object UUID: contentHash} for the objects that are already stored, in one query.
     """
-    client = get_weaviate_client()
+    from weaviate.classes.query import Filter
+
+    object_ids = list(set(object_ids))
+    if not object_ids:
+        return {}
+
+    with METRICS.timer("weaviate_query_seconds", query="existing_hashes"):
+        response = collection.query.fetch_objects(
+            filters=Filter.by_id().contains_any(object_ids),
+            limit=len(object_ids),
+            return_properties=["contentHash"],
+        )
+    return {str(obj.uuid): obj.properties.get("contentHash") for obj in response.objects}
+
+
+def iter_changed_objects(collection, data_objects, stats, chunk_size=DELTA_CHUNK_SIZE):
+    """
+    Yields only data objects that are new or whose content hash differs from the stored one.
+    Stored hashes are looked up per chunk, so the stream is never fully materialized.
+    """
+    chunk = []
+
+    def flush():
+        existing = fetch_existing_hashes(collection, [object_uuid(data_object) for data_object in chunk])
+        for data_object in chunk:
+            if existing.get(object_uuid(data_object)) == data_object["contentHash"]:
+                stats["unchanged"] += 1
+            else:
+                yield data_object
+        chunk.clear()
+
+    for data_object in data_objects:
+        chunk.append(data_object)
+        if len(chunk) >= chunk_size:
+            yield from flush()
+    if chunk:
+        yield from flush()
+
+
+def delete_expired_offers(collection, now=None):
+    """
+    Deletes every offer whose validTo lies in the past, in a single batch delete. Returns the count.
+    """
+    from weaviate.classes.query import Filter
+
+    now = now or datetime.now(timezone.utc)
+    result = collection.data.delete_many(where=Filter.by_property("validTo").less_than(now))
+    METRICS.inc("weaviate_objects_total", result.successful, result="deleted")
+    logger.info("Deleted %d expired offers (%d failed).", result.successful, result.failed)
+    return result.successful
+
+
+def retry_failed_objects(collection, failed_objects, max_retries=MAX_RETRIES, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Re-sends objects that failed in a batch, up to `max_retries` rounds.
+    Returns the errors of the objects that still failed after the last round.
+    """
+    for attempt in range(1, max_retries + 1):
+        if not failed_objects:
+            break
+        logger.warning("Retrying %d failed objects (attempt %d/%d)...", len(failed_objects), attempt, max_retries)
+        METRICS.inc("weaviate_retried_objects_total", len(failed_objects))
+        with collection.batch.fixed_size(batch_size=batch_size) as batch:
+            for error in failed_objects:
+                batch.add_object(properties=error.object_.properties, uuid=error.object_.uuid, vector=error.object_.vector)
+        failed_objects = collection.batch.failed_objects
+
+    for error in failed_objects:
+        logger.error("Failed to import object: %s (Object: %s)", error.message, error.object_)
+    return failed_objects
+
+
+def _collect_failed_offer_ids(failed_objects, failed_offer_ids):
+    # Lets the caller (e.g. the pipeline's brochure cache) tell which offers never arrived
+    if failed_offer_ids is not None:
+        failed_offer_ids.update(error.object_.properties.get("offerId") for error in failed_objects)
+
+
+def _report_ingest(stats, failed_count, deleted):
+    # Cached search results are stale once new objects are committed
+    if stats["added"] > failed_count or deleted:
+        invalidate_search_cache()
+
+    METRICS.inc("weaviate_objects_total", stats["added"] - failed_count, result="sent")
+    METRICS.inc("weaviate_objects_total", stats["unchanged"], result="unchanged")
+    METRICS.inc("weaviate_objects_total", failed_count, result="failed")
+
+    if stats["added"] > 0:
+        logger.info("Successfully ingested %d objects into Weaviate (%d unchanged skipped, %d failed).",
+                    stats["added"] - failed_count, stats["unchanged"], failed_count)
+        return True
+    elif stats["unchanged"] > 0:
+        logger.info("All %d objects are unchanged. Nothing to ingest.", stats["unchanged"])
+        return True
+    else:
+        logger.warning("No objects were added to the batch.")
+        return False
+
+
+def _with_vectors(data_objects, embedder, chunk_size=EMBED_CHUNK_SIZE):
+    # Pairs each data object with its precomputed vector (None lets Weaviate vectorize it)
+    if embedder is None:
+        for data_object in data_objects:
+            yield data_object, None
+        return
+    for chunk in _chunked(data_objects, chunk_size):
+        with METRICS.timer("embedding_seconds"):
+            vectors = embedder.embed_objects(chunk)
+        yield from zip(chunk, vectors)
+
+
+def ingest_products_to_weaviate(products_data, skip_unchanged=False, delete_expired=False, embedder=None, resolver=None,
+                                client=None, failed_offer_ids=None):
+    """
+    Ingests product dictionaries into the 'ProductOffer' collection in Weaviate.
+    `products_data` can be any iterable, including a generator fed directly by the scraper.
+
+    With `skip_unchanged`, offers whose stored contentHash matches are not sent again, which
+    spares re-vectorizing them. With `delete_expired`, offers past their validTo are removed.
+    With an `embedder` (embeddings.LocalEmbedder), vectors are computed locally with a
+    persistent cache and sent along, so Weaviate does not run the transformer for them.
+    With a `resolver` (dedup.ProductResolver), offers are linked to canonical products,
+    repeated listings of the same deal are dropped and 'CanonicalProduct' is updated.
+    `client` defaults to the shared client (benchmarks pass a local stand-in).
+    The offerIds of objects that still failed after the retries are added to `failed_offer_ids` (a set).
+    """
+    import weaviate  # Loaded on use, see client.create_weaviate_client()
+
+    client = client or get_weaviate_client()
     if not client:
         return False
 
     product_offers_collection = client.collections.get("ProductOffer")
+    stats = {"added": 0, "unchanged": 0}
 
     try:
-        with product_offers_collection.batch.dynamic() as batch: # Use dynamic batching
-            for product_info in products_data:
-                # Prepare data for Weaviate ingestion, matching schema
-                data_object = {
-                    "name": product_info.get('name'),
-                    "brand": product_info.get('brand'),
-                    "description": product_info.get('description'),
-                    "categories": product_info.get('categories'), # Keep as TEXT for now
-                    "salePrice": product_info.get('sale_price'),
-                    "regularPrice": product_info.get('regular_price'),
-                    "currency": product_info.get('currency'),
-                    "imageURL": product_info.get('image_url'),
-                    "offerId": product_info.get('offer_id'),
-                    "publisher": product_info.get('publisher'),
-                    "validFrom": product_info.get('valid_from'), # Already in ISO format from scraper
-                    "validTo": product_info.get('valid_to'),     # Already in ISO format from scraper
-                    "scrapedAt": product_info.get('scraped_at'), # Already in ISO format from scraper
-                    "specs": extract_specs_from_description(product_info.get('description', ''))
-                }
-
-                # Handle empty strings for numerical fields by setting them to None
-                # Weaviate expects numbers for NUMBER data type, not empty strings
-                if data_object["salePrice"] == "":
-                    data_object["salePrice"] = None
-                if data_object["regularPrice"] == "":
-                    data_object["regularPrice"] = None
-
-                # Weaviate expects None for empty image_url, not empty string
-                if data_object["imageURL"] == "":
-                    data_object["imageURL"] = None
-                
-                # Weaviate expects None for empty brand
-                if data_object["brand"] == "":
-                    data_object["brand"] = None
-
-                batch.add_object(
-                    properties=data_object,
-                    uuid=data_object["offerId"] # Use offerId as the UUID for idempotency
-                )
-        
-        # Check batch results
-        if batch.num_objects_class("ProductOffer") > 0:
-            print(f"Successfully ingested {batch.num_objects_class('ProductOffer')} objects into Weaviate.")
-            for error in batch.failed_objects:
-                print(f"Failed to import object: {error.message} (Object: {error.object_})")
-            return True
-        else:
-            print("No objects were added to the batch.")
-            return False
+        data_objects = (build_data_object(product_info) for product_info in products_data)
+        if resolver is not None:
+            resolver.load(client)
+            data_objects = _resolved(data_objects, resolver)
+        if skip_unchanged:
+            data_objects = iter_changed_objects(product_offers_collection, data_objects, stats)
+
+        with METRICS.timer("stage_seconds", stage="ingest"):
+            with product_offers_collection.batch.dynamic() as batch: # Use dynamic batching
+                for data_object, vector in _with_vectors(data_objects, embedder):
+                    # add_object blocks while the client waits for earlier sends (backpressure)
+                    started = time.perf_counter()
+                    batch.add_object(
+                        properties=data_object,
+                        uuid=object_uuid(data_object), # Derived from offerId and name for idempotency
+                        vector=vector
+                    )
+                    METRICS.observe("weaviate_batch_add_seconds", time.perf_counter() - started, mode="serial")
+                    stats["added"] += 1
+                flush_started = time.perf_counter()
+            METRICS.observe("weaviate_batch_flush_seconds", time.perf_counter() - flush_started, mode="serial")
+
+        # Check batch results and retry what failed
+        failed_objects = retry_failed_objects(product_offers_collection, product_offers_collection.batch.failed_objects)
+        _collect_failed_offer_ids(failed_objects, failed_offer_ids)
+        if resolver is not None:
+            resolver.save(client)
+            METRICS.inc("weaviate_objects_total", resolver.duplicates, result="duplicate")
+
+        deleted = delete_expired_offers(product_offers_collection) if delete_expired else 0
+        if resolver is not None and deleted:
+            resolver.prune(client)
+        return _report_ingest(stats, len(failed_objects), deleted)
 
     except weaviate.exceptions.WeaviateConnectionError as e:
-        print(f"Weaviate connection error during ingestion: {e}")
+        logger.error("Weaviate connection error during ingestion: %s", e)
         return False
     except Exception as e:
-        print(f"An error occurred during ingestion: {e}")
+        logger.exception("An error occurred during ingestion: %s", e)
         return False
+
+def push_price_drops(drops, batch_size=DEFAULT_BATCH_SIZE, chunk_size=DELTA_CHUNK_SIZE):
+    """
+    Stores priceDropPct values from price_history.offer_price_drops() (offer_id, name, drop_pct)
+    on their ProductOffer objects, so search can filter on them. Every offer in the window gets
+    a value, which also clears it on offers that are no longer discounted.
+
+    Weaviate batches cannot patch single properties, so the stored objects are fetched with
+    their vectors and written back through a fixed-size batch; nothing is re-vectorized, and
+    offers whose value did not change are not written. Offers deleted since are skipped.
+    """
+    import weaviate  # Loaded on use, see client.create_weaviate_client()
+    from weaviate.classes.query import Filter
+
+    client = get_weaviate_client()
+    if not client:
+        return False
+
+    product_offers_collection = client.collections.get("ProductOffer")
+    drop_pcts = {object_uuid({"offerId": drop["offer_id"], "name": drop["name"]}): drop["drop_pct"] for drop in drops}
+    updated = 0
+    try:
+        with product_offers_collection.batch.fixed_size(batch_size=batch_size) as batch:
+            for object_ids in _chunked(drop_pcts, chunk_size):
+                response = product_offers_collection.query.fetch_objects(
+                    filters=Filter.by_id().contains_any(object_ids), include_vector=True, limit=len(object_ids)
+                )
+                for obj in response.objects:
+                    drop_pct = drop_pcts[str(obj.uuid)]
+                    if obj.properties.get("priceDropPct") == drop_pct:
+                        continue
+                    batch.add_object(properties={**obj.properties, "priceDropPct": drop_pct}, uuid=obj.uuid,
+                                     vector=obj.vector.get("default"))
+                    updated += 1
+        failed_objects = retry_failed_objects(product_offers_collection, product_offers_collection.batch.failed_objects)
+    except weaviate.exceptions.WeaviateConnectionError as e:
+        logger.error("Weaviate connection error while pushing price drops: %s", e)
+        return False
+
+    if updated > len(failed_objects):
+        invalidate_search_cache()
+    logger.info("Updated priceDropPct on %d of %d offers (%d failed).", updated - len(failed_objects), len(drops),
+                len(failed_objects))
+    return True
+
+
+def rekey_legacy_offers(client=None, batch_size=DEFAULT_BATCH_SIZE, chunk_size=DELTA_CHUNK_SIZE):
+    """
+    One-off cleanup for offers stored before object_uuid() keyed objects by offerId and name,
+    when the offerId itself was the UUID. Such an object shows up in search next to its re-ingested
+    copy until it expires. Each legacy object is written under its current UUID with its stored
+    vector (unless that object exists already) and then deleted. Returns the number deleted.
+    """
+    import weaviate  # Loaded on use, see client.create_weaviate_client()
+    from weaviate.classes.query import Filter
+
+    client = client or get_weaviate_client()
+    if not client or not client.collections.exists(resolve_collection_name(client)):
+        return 0
+
+    product_offers_collection = client.collections.get("ProductOffer")
+    legacy = (obj for obj in product_offers_collection.iterator(include_vector=True)
+              if str(obj.uuid) != object_uuid(obj.properties))
+    deleted = failed = 0
+    try:
+        for chunk in _chunked(legacy, chunk_size):
+            new_ids = {str(obj.uuid): object_uuid(obj.properties) for obj in chunk}
+            existing = fetch_existing_hashes(product_offers_collection, new_ids.values())
+            with product_offers_collection.batch.fixed_size(batch_size=batch_size) as batch:
+                for obj in chunk:
+                    if new_ids[str(obj.uuid)] not in existing:
+                        batch.add_object(properties=obj.properties, uuid=new_ids[str(obj.uuid)],
+                                         vector=obj.vector.get("default"))
+            failed_objects = retry_failed_objects(product_offers_collection, product_offers_collection.batch.failed_objects)
+
+            # A legacy object whose copy did not arrive is kept, so the offer never disappears
+            missing = {str(error.object_.uuid) for error in failed_objects}
+            legacy_ids = [legacy_id for legacy_id, new_id in new_ids.items() if new_id not in missing]
+            failed += len(new_ids) - len(legacy_ids)
+            if legacy_ids:
+                result = product_offers_collection.data.delete_many(where=Filter.by_id().contains_any(legacy_ids))
+                deleted += result.successful
+                failed += result.failed
+    except weaviate.exceptions.WeaviateConnectionError as e:
+        logger.error("Weaviate connection error while re-keying legacy offers: %s", e)
+
+    if deleted:
+        invalidate_search_cache()
+    logger.info("Moved %d offers from their legacy offerId UUID to their current UUID (%d failed).", deleted, failed)
+    return deleted
+
+
+def build_data_objects(products):
+    """
+    Builds data objects for a chunk of products, parsing each distinct description once.
+    Runs in the worker processes of ingest_products_parallel().
+    """
+    with METRICS.timer("spec_extraction_seconds", mode="batch"):
+        specs = extract_specs_batch([product_info.get('description') for product_info in products])
+    return [build_data_object(product_info, product_specs) for product_info, product_specs in zip(products, specs)]
+
+
+def _chunked(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _map_bounded(executor, fn, chunks, max_pending):
+    # Like executor.map, in order, but only keeps `max_pending` chunks in flight so large inputs stay streamed
+    pending = deque()
+    for chunk in chunks:
+        pending.append(executor.submit(fn, chunk))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _send_chunks(chunk_queue, batch_size, concurrent_requests, failed_objects, lost_objects):
+    # Batching is not thread-safe, so every sender thread has its own client and batch.
+    # Each chunk is flushed before the next one is taken, so when a chunk raises, exactly its
+    # objects go to `lost_objects` for the caller to re-send and count
+    client = None
+    chunk = None
+    try:
+        client = create_weaviate_client()
+        collection = client.collections.get("ProductOffer")
+        with collection.batch.fixed_size(batch_size=batch_size, concurrent_requests=concurrent_requests) as batch:
+            while (chunk := chunk_queue.get()) is not None:
+                try:
+                    # Time to send a whole chunk, including waits for earlier sends
+                    with METRICS.timer("weaviate_batch_send_seconds", mode="parallel"):
+                        for data_object, vector in chunk:
+                            batch.add_object(properties=data_object, uuid=object_uuid(data_object), vector=vector)
+                        batch.flush()
+                except Exception as e:
+                    logger.error("Batch sender failed on a chunk of %d objects: %s", len(chunk), e)
+                    lost_objects.extend(chunk)
+            chunk = None
+        failed_objects.extend(collection.batch.failed_objects)
+    except Exception as e:
+        logger.error("Batch sender stopped: %s", e)
+        if chunk:
+            lost_objects.extend(chunk)
     finally:
         if client:
             client.close()
 
-if __name__ == "__main__":
-    # This block is for testing ingestion directly with dummy data or a CSV
-    print("This file is meant to be called by scraper.py with actual data.")
-    print("You can add a test case here to read a local CSV and ingest.")
-
-    # Example: Ingest data from a sample CSV (if you have one)
-    # try:
-    #     df = pd.read_csv("path/to/your/scrapped/some_products.csv")
-    #     products_list = df.to_dict(orient='records')
-    #     ingest_products_to_weaviate(products_list)
-    # except FileNotFoundError:
-    #     print("Test CSV not found.")
-    # except Exception as e:
-    #     print(f"Error reading test CSV: {e}")
\ No newline at end of file
+
+def _resend_lost_objects(collection, lost_objects, batch_size):
+    # Objects of chunks a sender failed on; their UUIDs make re-sending the ones that did arrive harmless
+    logger.warning("Re-sending %d objects from chunks the batch senders failed on...", len(lost_objects))
+    METRICS.inc("weaviate_retried_objects_total", len(lost_objects))
+    with collection.batch.fixed_size(batch_size=batch_size) as batch:
+        for data_object, vector in lost_objects:
+            batch.add_object(properties=data_object, uuid=object_uuid(data_object), vector=vector)
+    return collection.batch.failed_objects
+
+
+def _put_chunk(chunk_queue, chunk, threads):
+    # Hand a chunk to the senders, giving up if all of them have stopped
+    while any(thread.is_alive() for thread in threads):
+        try:
+            chunk_queue.put(chunk, timeout=1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def ingest_products_parallel(products_data, workers=None, senders=2, chunk_size=1000, batch_size=DEFAULT_BATCH_SIZE,
+                             concurrent_requests=2, max_retries=MAX_RETRIES, skip_unchanged=False, delete_expired=False,
+                             embedder=None, resolver=None, failed_offer_ids=None):
+    """
+    Parallel variant of ingest_products_to_weaviate() for large catalogs.
+
+    A process pool of `workers` builds the data objects (normalization and spec extraction)
+    in chunks of `chunk_size` products, and `senders` threads push them to Weaviate
+    concurrently in fixed-size batches of `batch_size` with `concurrent_requests` each.
+    Failed objects are collected from every sender and retried up to `max_retries` times;
+    chunks a sender raised on are re-sent from this thread, so no object goes uncounted.
+    Worker processes are spawned rather than forked, as the sender threads and their clients
+    (and in the pipeline, the crawler threads) already run when the pool starts.
+    With an `embedder`, each chunk is vectorized locally before it is handed to the senders.
+    With a `resolver`, chunks are deduplicated in this process, since it needs to see every offer.
+    """
+    import weaviate  # Loaded on use, see client.create_weaviate_client()
+
+    client = get_weaviate_client()
+    if not client:
+        return False
+
+    product_offers_collection = client.collections.get("ProductOffer")
+    workers = workers or os.cpu_count() or 1
+    stats = {"added": 0, "unchanged": 0}
+    failed_objects = []
+    lost_objects = []
+    chunk_queue = queue.Queue(maxsize=senders * 2)
+    threads = [
+        threading.Thread(target=_send_chunks,
+                         args=(chunk_queue, batch_size, concurrent_requests, failed_objects, lost_objects))
+        for _ in range(senders)
+    ]
+
+    try:
+        if resolver is not None:
+            resolver.load(client)
+        for thread in threads:
+            thread.start()
+
+        try:
+            with METRICS.timer("stage_seconds", stage="ingest"), \
+                    ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+                for chunk in _map_bounded(executor, build_data_objects, _chunked(products_data, chunk_size), workers * 2):
+                    if resolver is not None:
+                        chunk = list(_resolved(chunk, resolver))
+                    if skip_unchanged:
+                        chunk = list(iter_changed_objects(product_offers_collection, chunk, stats))
+                    stats["added"] += len(chunk)
+                    chunk = list(_with_vectors(chunk, embedder, max(len(chunk), 1)))
+                    if chunk and not _put_chunk(chunk_queue, chunk, threads):
+                        lost_objects.extend(chunk)
+                        raise RuntimeError("All batch senders stopped")
+        finally:
+            for _ in threads:
+                _put_chunk(chunk_queue, None, threads)
+            for thread in threads:
+                thread.join()
+            # Chunks still queued when the last sender stopped
+            while not chunk_queue.empty():
+                lost_objects.extend(chunk_queue.get_nowait() or ())
+
+        if lost_objects:
+            failed_objects.extend(_resend_lost_objects(product_offers_collection, lost_objects, batch_size))
+        failed_objects = retry_failed_objects(product_offers_collection, failed_objects, max_retries, batch_size)
+        _collect_failed_offer_ids(failed_objects, failed_offer_ids)
+        if resolver is not None:
+            resolver.save(client)
+            METRICS.inc("weaviate_objects_total", resolver.duplicates, result="duplicate")
+        deleted = delete_expired_offers(product_offers_collection) if delete_expired else 0
+        if resolver is not None and deleted:
+            resolver.prune(client)
+        return _report_ingest(stats, len(failed_objects), deleted)
+
+    except weaviate.exceptions.WeaviateConnectionError as e:
+        logger.error("Weaviate connection error during ingestion: %s", e)
+    except Exception as e:
+        logger.exception("An error occurred during ingestion: %s", e)
+    if lost_objects:
+        logger.error("%d objects from chunks the batch senders failed on were not sent.", len(lost_objects))
+        METRICS.inc("weaviate_objects_total", len(lost_objects), result="failed")
+        if failed_offer_ids is not None:
+            failed_offer_ids.update(data_object.get("offerId") for data_object, _ in lost_objects)
+    return False
+
+
+def main(argv=None):
+    """
+    Command line entry point (also `cli.py ingest`).
+    """
+    # Ingest one or more scraper CSV files, e.g. python cli.py ingest scrapper/scrapped/*.csv
+    # For scrape -> Weaviate without CSV files in between, run python cli.py pipeline instead.
+    parser = argparse.ArgumentParser(description="Ingest scraper CSV files into Weaviate.")
+    parser.add_argument("csv_files", nargs="+", help="Scraper CSV files to ingest")
+    parser.add_argument("--delta", action="store_true", help="Only send new or changed offers")
+    parser.add_argument("--delete-expired", action="store_true", help="Delete offers whose validTo has passed")
+    parser.add_argument("--parallel", action="store_true", help="Build objects in a process pool and send with several senders")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes for --parallel (default: CPU count)")
+    parser.add_argument("--senders", type=int, default=2, help="Concurrent batch senders for --parallel")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Objects per batch request for --parallel")
+    parser.add_argument("--concurrent-requests", type=int, default=2, help="In-flight batch requests per sender for --parallel")
+    parser.add_argument("--local-vectors", action="store_true", help="Compute vectors locally with a persistent vector cache")
+    parser.add_argument("--dedup", action="store_true", help="Link offers to canonical products and drop duplicate listings")
+    parser.add_argument("--price-history", default=None, metavar="DIR",
+                        help="Re-apply priceDropPct from this price history after the ingest (replaced objects lose it)")
+    parser.add_argument("--log-level", default="INFO", help="DEBUG, INFO, WARNING or ERROR")
+    parser.add_argument("--metrics-out", default=None,
+                        help="Write run metrics here at the end: *.jsonl for JSON lines, otherwise Prometheus text")
+    args = parser.parse_args(argv)
+    setup_logging(args.log_level)
+
+    embedder = None
+    if args.local_vectors:
+        from embeddings import LocalEmbedder
+        embedder = LocalEmbedder()
+
+    resolver = None
+    if args.dedup:
+        from dedup import ProductResolver
+        resolver = ProductResolver()
+
+    def products_from_files(paths):
+        for path in paths:
+            try:
+                yield from read_products_csv(path)
+            except FileNotFoundError:
+                logger.error("CSV not found: %s", path)
+
+    products = products_from_files(args.csv_files)
+    try:
+        if args.parallel:
+            ingested = ingest_products_parallel(products, workers=args.workers, senders=args.senders, batch_size=args.batch_size,
+                                     concurrent_requests=args.concurrent_requests, skip_unchanged=args.delta,
+                                     delete_expired=args.delete_expired, embedder=embedder, resolver=resolver)
+        else:
+            ingested = ingest_products_to_weaviate(products, skip_unchanged=args.delta, delete_expired=args.delete_expired,
+                                                   embedder=embedder, resolver=resolver)
+        if ingested and args.price_history:
+            from price_history import offer_price_drops
+            push_price_drops(offer_price_drops(root=args.price_history))
+    finally:
+        if args.metrics_out:
+            METRICS.write(args.metrics_out)
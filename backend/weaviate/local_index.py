@@ -0,0 +1,272 @@
+# local_index.py
+# In-process ProductOffer search for offline development and low-latency lookups:
+# BM25 over name/description/categories, cosine top-k over a NumPy vector matrix,
+# the same filters as queries.build_filters() and prefix autocomplete on names.
+import bisect
+import math
+import re
+from collections import Counter
+from datetime import datetime, timezone
+
+import numpy as np
+
+from import_data import build_data_objects, object_uuid
+from queries import SEARCH_MODES, normalize_query, validity_bounds
+
+# Properties that are searched with BM25, like the TEXT properties Weaviate indexes
+SEARCH_PROPERTIES = ("name", "description", "categories")
+
+# Candidates taken from each side before keyword and vector scores are fused in hybrid mode
+HYBRID_CANDIDATES = 100
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return _TOKEN.findall(normalize_query(text))
+
+
+def _epoch(value):
+    # ISO timestamps from the scraper ("2025-06-09T00:00:00.000+0000", "2025-06-09 12:00:00") as UTC seconds
+    if not value:
+        return math.nan
+    if isinstance(value, datetime):
+        moment = value
+    else:
+        try:
+            moment = datetime.fromisoformat(str(value))
+        except ValueError:
+            return math.nan
+    return (moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)).timestamp()
+
+
+def _number(value):
+    return math.nan if value is None else float(value)
+
+
+class LocalIndex:
+    """
+    Read-only search index over ProductOffer data objects (see import_data.build_data_object).
+
+    Postings are stored per term as NumPy arrays of document ids and term frequencies, filters
+    as one column array per property, so a query is a handful of vectorized operations.
+    Vectors are optional: pass `vectors` (one row per object) or an `embedder`
+    (embeddings.LocalEmbedder) for semantic and hybrid search.
+    """
+
+    def __init__(self, data_objects, vectors=None, embedder=None, k1=1.2, b=0.75):
+        self.objects = list(data_objects)
+        self.embedder = embedder
+        self.k1 = k1
+        self.b = b
+        self._build_postings()
+        self._build_columns()
+        self._build_completions()
+
+        if vectors is None and embedder is not None and self.objects:
+            vectors = embedder.embed_objects(self.objects)
+        self.vectors = None
+        if vectors is not None and len(self.objects):
+            matrix = np.asarray(vectors, dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            self.vectors = matrix / np.where(norms == 0, 1, norms)
+
+    @classmethod
+    def from_products(cls, products, **options):
+        """
+        Builds the index from scraper product dicts (CSV rows, archive rows or a live stream).
+        """
+        return cls(build_data_objects(list(products)), **options)
+
+    def __len__(self):
+        return len(self.objects)
+
+    # ---- Building ----
+
+    def _build_postings(self):
+        postings = {}
+        lengths = np.zeros(len(self.objects), dtype=np.float32)
+        for doc_id, data_object in enumerate(self.objects):
+            tokens = []
+            for prop in SEARCH_PROPERTIES:
+                tokens.extend(tokenize(data_object.get(prop)))
+            lengths[doc_id] = len(tokens)
+            for term, count in Counter(tokens).items():
+                postings.setdefault(term, ([], []))
+                postings[term][0].append(doc_id)
+                postings[term][1].append(count)
+
+        self.doc_lengths = lengths
+        self.avg_doc_length = float(lengths.mean()) if len(lengths) else 0.0
+        self.postings = {
+            term: (np.array(doc_ids, dtype=np.int32), np.array(counts, dtype=np.float32))
+            for term, (doc_ids, counts) in postings.items()
+        }
+
+    def _build_columns(self):
+        objects = self.objects
+        self.sale_price = np.array([_number(o.get("salePrice")) for o in objects], dtype=np.float64)
+        self.price_drop = np.array([_number(o.get("priceDropPct")) for o in objects], dtype=np.float64)
+        self.valid_from = np.array([_epoch(o.get("validFrom")) for o in objects], dtype=np.float64)
+        self.valid_to = np.array([_epoch(o.get("validTo")) for o in objects], dtype=np.float64)
+        # Strings as codes into a small table of distinct values
+        self.publishers, self.publisher_codes = self._encode([normalize_query(o.get("publisher")) for o in objects])
+        self.categories, self.category_codes = self._encode([normalize_query(o.get("categories")) for o in objects])
+
+    @staticmethod
+    def _encode(values):
+        table = {}
+        codes = np.fromiter((table.setdefault(value, len(table)) for value in values), dtype=np.int32, count=len(values))
+        return list(table), codes
+
+    def _build_completions(self):
+        # Sorted (key, name) pairs: the whole name and every word start within it
+        names = {normalize_query(o.get("name")): o.get("name") for o in self.objects if o.get("name")}
+        entries = set()
+        for key, name in names.items():
+            words = key.split(" ")
+            for i in range(len(words)):
+                entries.add((" ".join(words[i:]), name))
+        self._completions = sorted(entries)
+        self._completion_keys = [key for key, _ in self._completions]
+
+    # ---- Querying ----
+
+    def filter_mask(self, publisher=None, min_price=None, max_price=None, category=None, valid_on=None,
+                    min_price_drop=None):
+        """
+        Boolean mask of the objects that pass the filters, with the semantics of queries.build_filters().
+        """
+        mask = np.ones(len(self.objects), dtype=bool)
+        if publisher:
+            wanted = normalize_query(publisher)
+            mask &= self.publisher_codes == (self.publishers.index(wanted) if wanted in self.publishers else -1)
+        # NaN comparisons are False, so objects without a value drop out like in Weaviate
+        if min_price is not None:
+            mask &= self.sale_price >= float(min_price)
+        if max_price is not None:
+            mask &= self.sale_price <= float(max_price)
+        if category:
+            needle = normalize_query(category)
+            matching = np.array([needle in value for value in self.categories], dtype=bool)
+            mask &= matching[self.category_codes] if len(matching) else False
+        if valid_on is not None:
+            start, end = validity_bounds(valid_on)
+            mask &= (self.valid_from <= end.timestamp()) & (self.valid_to >= start.timestamp())
+        if min_price_drop is not None:
+            mask &= self.price_drop >= float(min_price_drop)
+        return mask
+
+    def bm25_scores(self, query):
+        """
+        BM25 score of every object for `query` (0 where no term matches).
+        """
+        scores = np.zeros(len(self.objects), dtype=np.float32)
+        if not len(self.objects):
+            return scores
+        n = len(self.objects)
+        norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / max(self.avg_doc_length, 1e-9))
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            doc_ids, counts = posting
+            idf = math.log(1 + (n - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+            scores[doc_ids] += idf * counts * (self.k1 + 1) / (counts + norm[doc_ids])
+        return scores
+
+    def vector_scores(self, query):
+        """
+        Cosine similarity of every object to the embedded query.
+        """
+        if self.vectors is None or self.embedder is None:
+            raise ValueError("Semantic search needs an index built with vectors and an embedder")
+        query_vector = np.asarray(self.embedder.embed_texts([normalize_query(query)])[0], dtype=np.float32)
+        query_vector /= np.linalg.norm(query_vector) or 1
+        return self.vectors @ query_vector
+
+    @staticmethod
+    def _top(scores, mask, k):
+        # Indices of the k best scores among the masked objects, best first
+        candidates = np.flatnonzero(mask)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+    @staticmethod
+    def _normalized(scores, ids):
+        # Relative score fusion: min-max scale each side to [0, 1] over its own candidates
+        values = scores[ids].astype(np.float64)
+        spread = values.max() - values.min() if len(values) else 0
+        return (values - values.min()) / spread if spread > 0 else np.ones(len(values))
+
+    def search(self, query, mode="hybrid", publisher=None, min_price=None, max_price=None, category=None,
+               valid_on=None, min_price_drop=None, limit=20, offset=0, alpha=0.5):
+        """
+        Same arguments and result dicts (properties plus uuid, score and distance) as queries.search_products();
+        semantic results carry the cosine distance instead of a score.
+        Without vectors, hybrid search falls back to keyword search.
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{mode}', expected one of {SEARCH_MODES}")
+        if self.vectors is None or self.embedder is None:
+            if mode == "semantic":
+                raise ValueError("Semantic search needs an index built with vectors and an embedder")
+            mode = "keyword"
+
+        mask = self.filter_mask(publisher, min_price, max_price, category, valid_on, min_price_drop)
+        wanted = limit + offset
+
+        if mode == "keyword":
+            scores = self.bm25_scores(query)
+            if tokenize(query):
+                mask &= scores > 0
+            ids = self._top(scores, mask, wanted)
+        elif mode == "semantic":
+            scores = self.vector_scores(query)
+            ids = self._top(scores, mask, wanted)
+        else:
+            keyword = self.bm25_scores(query)
+            vector = self.vector_scores(query)
+            keyword_ids = self._top(keyword, mask & (keyword > 0), max(wanted, HYBRID_CANDIDATES))
+            vector_ids = self._top(vector, mask, max(wanted, HYBRID_CANDIDATES))
+            fused = {}
+            for doc_id, score in zip(keyword_ids.tolist(), self._normalized(keyword, keyword_ids) * (1 - alpha)):
+                fused[doc_id] = fused.get(doc_id, 0.0) + score
+            for doc_id, score in zip(vector_ids.tolist(), self._normalized(vector, vector_ids) * alpha):
+                fused[doc_id] = fused.get(doc_id, 0.0) + score
+            ranked = sorted(fused.items(), key=lambda item: -item[1])[:wanted]
+            ids = np.array([doc_id for doc_id, _ in ranked], dtype=np.int64)
+            scores = np.zeros(len(self.objects))
+            scores[ids] = [score for _, score in ranked]
+
+        results = []
+        for doc_id in ids[offset:wanted].tolist():
+            result = dict(self.objects[doc_id])
+            result["uuid"] = object_uuid(result)
+            if mode == "semantic":
+                result["score"], result["distance"] = None, 1.0 - float(scores[doc_id])
+            else:
+                result["score"], result["distance"] = float(scores[doc_id]), None
+            results.append(result)
+        return results
+
+    def complete(self, prefix, limit=10):
+        """
+        Product names that start with `prefix` or have a word that does, e.g. "scho" -> "Milka Schokolade".
+        A binary search over the sorted completion keys, so it answers in microseconds.
+        """
+        key = normalize_query(prefix)
+        if not key:
+            return []
+        names = []
+        seen = set()
+        start = bisect.bisect_left(self._completion_keys, key)
+        for completion_key, name in self._completions[start:]:
+            if not completion_key.startswith(key) or len(names) >= limit:
+                break
+            if name not in seen:
+                seen.add(name)
+                names.append(name)
+        return names
+
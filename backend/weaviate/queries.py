@@ -0,0 +1,255 @@
+# queries.py
+import copy
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, time as dt_time, timezone
+
+from client import get_weaviate_client # Shared, lazily connected client
+from schema import CANONICAL_COLLECTION_NAME, COLLECTION_NAME
+
+# Runtime state shared by the processes on this machine, kept out of the source tree
+STATE_DIR = os.getenv(
+    "PROJECTX_STATE_DIR",
+    os.path.join(os.getenv("XDG_STATE_HOME", os.path.join(os.path.expanduser("~"), ".local", "state")), "projectx"),
+)
+
+# Touched by every committed ingest run; caches in other processes compare its mtime
+INGEST_MARKER_PATH = os.getenv("SEARCH_CACHE_MARKER", os.path.join(STATE_DIR, "last_ingest"))
+
+SEARCH_MODES = ("hybrid", "semantic", "keyword")
+
+# "weaviate" (default) or "local" to answer searches from the in-process index (local_index.py)
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "weaviate")
+
+# Index registered with use_local_index(); also answers when Weaviate is unreachable
+_local_index = None
+
+
+class SearchCache:
+    """
+    Thread-safe LRU cache with a time-to-live. Entries are dropped when they expire,
+    when the cache is full, or all at once when an ingest run commits (see INGEST_MARKER_PATH).
+    Values are copied on the way in and out, so callers may modify the results they get.
+    """
+
+    def __init__(self, maxsize=512, ttl=300, marker_path=INGEST_MARKER_PATH):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.marker_path = marker_path
+        self._entries = OrderedDict()
+        self._marker_mtime = self._read_marker()
+        self._lock = threading.Lock()
+
+    def _read_marker(self):
+        try:
+            return os.stat(self.marker_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def get(self, key):
+        marker_mtime = self._read_marker()
+        with self._lock:
+            if marker_mtime != self._marker_mtime:
+                self._entries.clear()
+                self._marker_mtime = marker_mtime
+                return None
+
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return copy.deepcopy(value)
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, copy.deepcopy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = SearchCache(
+    maxsize=int(os.getenv("SEARCH_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("SEARCH_CACHE_TTL", "300")),
+)
+
+
+def invalidate_search_cache():
+    """
+    Drops cached results here and, through the marker file, in every other process.
+    Called by ingest runs once their objects are committed.
+    """
+    _cache.clear()
+    os.makedirs(os.path.dirname(INGEST_MARKER_PATH) or ".", exist_ok=True)
+    with open(INGEST_MARKER_PATH, "a", encoding="utf-8"):
+        pass
+    os.utime(INGEST_MARKER_PATH, None)
+
+
+def use_local_index(index):
+    """
+    Registers a local_index.LocalIndex for search_products(). It answers every search when
+    SEARCH_BACKEND=local and otherwise only while Weaviate is unreachable. Pass None to remove it.
+    """
+    global _local_index
+    _local_index = index
+    _cache.clear()
+
+
+def normalize_query(query):
+    """
+    Case-folds and collapses whitespace so "  Kaffee " and "kaffee" share a cache entry.
+    """
+    return re.sub(r"\s+", " ", (query or "")).strip().casefold()
+
+
+def validity_bounds(valid_on):
+    # A date covers the whole day, a datetime is an exact instant
+    if isinstance(valid_on, datetime):
+        instant = valid_on if valid_on.tzinfo else valid_on.replace(tzinfo=timezone.utc)
+        return instant, instant
+    start = datetime.combine(valid_on, dt_time.min, tzinfo=timezone.utc)
+    end = datetime.combine(valid_on, dt_time.max, tzinfo=timezone.utc)
+    return start, end
+
+
+def build_filters(publisher=None, min_price=None, max_price=None, category=None, valid_on=None, min_price_drop=None):
+    """
+    Combines the optional search filters into one Weaviate filter (None when there are none).
+    """
+    from weaviate.classes.query import Filter
+
+    filters = []
+    if publisher:
+        filters.append(Filter.by_property("publisher").equal(publisher))
+    if min_price is not None:
+        filters.append(Filter.by_property("salePrice").greater_or_equal(float(min_price)))
+    if max_price is not None:
+        filters.append(Filter.by_property("salePrice").less_or_equal(float(max_price)))
+    if category:
+        # categories is a comma-separated TEXT property
+        filters.append(Filter.by_property("categories").like(f"*{category}*"))
+    if valid_on is not None:
+        start, end = validity_bounds(valid_on)
+        filters.append(Filter.by_property("validFrom").less_or_equal(end))
+        filters.append(Filter.by_property("validTo").greater_or_equal(start))
+    if min_price_drop is not None:
+        filters.append(Filter.by_property("priceDropPct").greater_or_equal(float(min_price_drop)))
+
+    if not filters:
+        return None
+    return Filter.all_of(filters) if len(filters) > 1 else filters[0]
+
+
+def search_products(query, mode="hybrid", publisher=None, min_price=None, max_price=None, category=None,
+                    valid_on=None, min_price_drop=None, limit=20, offset=0, alpha=0.5, use_cache=True):
+    """
+    Searches 'ProductOffer' and returns a list of result dicts: properties plus uuid, score and distance.
+    Keyword and hybrid searches set `score` (higher is better), semantic searches set the vector
+    `distance` (lower is better); the other field is None, as the two are not comparable.
+
+    mode: "hybrid" (vector + BM25, weighted by alpha), "semantic" (vector only) or "keyword" (BM25 only).
+    valid_on: a date (valid at any time that day) or datetime; pass date.today() for current offers.
+    min_price_drop: only offers at least this many percent below their 30-day median price.
+    Results are cached by normalized query plus filters until the TTL runs out or an ingest commits.
+    With a local index registered (use_local_index), it answers when SEARCH_BACKEND=local or Weaviate is unreachable.
+    """
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode '{mode}', expected one of {SEARCH_MODES}")
+
+    normalized = normalize_query(query)
+    key = (
+        normalized, mode, publisher, min_price, max_price, category,
+        valid_on.isoformat() if isinstance(valid_on, (date, datetime)) else valid_on, min_price_drop, limit, offset, alpha,
+    )
+    if use_cache:
+        cached = _cache.get(key)
+        if cached is not None:
+            return cached
+
+    client = None if SEARCH_BACKEND == "local" and _local_index is not None else get_weaviate_client()
+    if not client:
+        if _local_index is None:
+            return []
+        # Offline: answer from the in-process index; not cached, it is as fast as the cache
+        return _local_index.search(normalized, mode, publisher, min_price, max_price, category, valid_on,
+                                   min_price_drop, limit, offset, alpha)
+
+    from weaviate.classes.query import MetadataQuery
+
+    collection = client.collections.get(COLLECTION_NAME)
+    filters = build_filters(publisher, min_price, max_price, category, valid_on, min_price_drop)
+    options = dict(filters=filters, limit=limit, offset=offset, return_metadata=MetadataQuery(score=True, distance=True))
+
+    if mode == "hybrid":
+        response = collection.query.hybrid(query=normalized, alpha=alpha, **options)
+    elif mode == "semantic":
+        response = collection.query.near_text(query=normalized, **options)
+    else:
+        response = collection.query.bm25(query=normalized, **options)
+
+    results = []
+    for obj in response.objects:
+        result = dict(obj.properties)
+        result["uuid"] = str(obj.uuid)
+        result["score"] = obj.metadata.score
+        result["distance"] = obj.metadata.distance
+        results.append(result)
+
+    if use_cache:
+        _cache.put(key, results)
+    return results
+
+
+def find_cheapest(query, brand=None, limit=5, use_cache=True):
+    """
+    "Where is X cheapest?": searches 'CanonicalProduct' (one object per product across all
+    publishers, see dedup.py) and returns the best matches with their cheapest offer.
+    Requires an ingest run with dedup; the offers themselves carry the same canonicalId.
+    """
+    normalized = normalize_query(query)
+    key = ("cheapest", normalized, brand, limit)
+    if use_cache:
+        cached = _cache.get(key)
+        if cached is not None:
+            return cached
+
+    client = get_weaviate_client()
+    if not client or not client.collections.exists(CANONICAL_COLLECTION_NAME):
+        return []
+
+    from weaviate.classes.query import Filter, MetadataQuery
+
+    collection = client.collections.get(CANONICAL_COLLECTION_NAME)
+    filters = Filter.by_property("brand").equal(brand) if brand else None
+    response = collection.query.hybrid(query=normalized, filters=filters, limit=limit,
+                                       return_metadata=MetadataQuery(score=True))
+
+    results = []
+    for obj in response.objects:
+        result = dict(obj.properties)
+        result["uuid"] = str(obj.uuid)
+        result["score"] = obj.metadata.score
+        results.append(result)
+
+    if use_cache:
+        _cache.put(key, results)
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+
+    for product in search_products(" ".join(sys.argv[1:]) or "Kaffee", valid_on=date.today()):
+        print(f"{product.get('salePrice')} EUR  {product.get('name')}  ({product.get('publisher')})")
@@ -1,54 +1,131 @@
 # schema.py
-import weaviate.classes.config as wc
-from client import get_weaviate_client # Import the client function
+import argparse
+import dataclasses
+from datetime import datetime, timezone
 
-def create_product_offer_schema(client):
+from client import get_weaviate_client # Shared, lazily connected client
+
+# Name that search and ingest use; with blue/green migrations it is an alias of the live collection
+COLLECTION_NAME = "ProductOffer"
+
+
+def product_offer_properties():
+    """
+    Properties of the 'ProductOffer' collection. Built on demand, so importing this module
+    does not load the Weaviate client library.
+    """
+    import weaviate.classes.config as wc
+
+    return [
+        wc.Property(name="name", data_type=wc.DataType.TEXT, description="Name of the product"),
+        wc.Property(name="brand", data_type=wc.DataType.TEXT, description="Brand of the product"),
+        wc.Property(name="description", data_type=wc.DataType.TEXT, description="Detailed description of the product"),
+        # Categories is a comma-separated string in your CSV, so store as TEXT for now.
+        # If you want it as an array (TEXT_ARRAY) for better filtering, you'll need to parse it during ingestion.
+        wc.Property(name="categories", data_type=wc.DataType.TEXT, description="Categories the product belongs to (comma-separated)"),
+        wc.Property(name="salePrice", data_type=wc.DataType.NUMBER, description="Sale price of the product"),
+        wc.Property(name="regularPrice", data_type=wc.DataType.NUMBER, description="Regular price of the product (if applicable)"),
+        # Offer-specific text is not vectorized, so the same product gets the same vector at every
+        # offer and publisher, and embeddings.py can reuse cached vectors across them
+        wc.Property(name="currency", data_type=wc.DataType.TEXT, description="Currency of the price",
+                    skip_vectorization=True),
+        wc.Property(name="imageURL", data_type=wc.DataType.TEXT, description="URL of the product image",
+                    skip_vectorization=True),
+        wc.Property(name="offerId", data_type=wc.DataType.TEXT, description="Unique identifier for the offer from the publisher",
+                    skip_vectorization=True),
+        wc.Property(name="publisher", data_type=wc.DataType.TEXT, description="Publisher of the offer (e.g., Action)",
+                    skip_vectorization=True),
+        wc.Property(name="validFrom", data_type=wc.DataType.DATE, description="Start date and time when the offer is valid from"),
+        wc.Property(name="validTo", data_type=wc.DataType.DATE, description="End date and time when the offer is valid until"),
+        wc.Property(name="scrapedAt", data_type=wc.DataType.DATE, description="Timestamp when the data was scraped"),
+        wc.Property(name="contentHash", data_type=wc.DataType.TEXT, description="Hash of the offer content, used to skip unchanged offers on re-ingest",
+                    skip_vectorization=True, tokenization=wc.Tokenization.FIELD),
+        wc.Property(name="priceDropPct", data_type=wc.DataType.NUMBER, description="How far the sale price is below the product's 30-day median, in percent"),
+        wc.Property(name="canonicalId", data_type=wc.DataType.TEXT, description="UUID of the CanonicalProduct this offer is an instance of",
+                    skip_vectorization=True, tokenization=wc.Tokenization.FIELD),
+        wc.Property(
+            name="specs",
+            data_type=wc.DataType.OBJECT,
+            description="Specifications of the product",
+            nested_properties=[
+                wc.Property(name="size", data_type=wc.DataType.TEXT, description="Size or dimensions of the product (e.g., '100 ml', '300 ml', '250 g')"),
+                wc.Property(name="quantity", data_type=wc.DataType.INT, description="Number of items in a pack (e.g., '3 Stück', '50 Stück')"),
+                wc.Property(name="material", data_type=wc.DataType.TEXT, description="Material of the product (e.g., '100 % Baumwolle')"),
+                wc.Property(name="specialFeature", data_type=wc.DataType.TEXT, description="Any other notable feature from the description")
+            ]
+        )
+    ]
+
+
+# One object per real-world product, shared by the offers of every publisher (see dedup.py)
+CANONICAL_COLLECTION_NAME = "CanonicalProduct"
+
+
+def canonical_product_properties():
+    import weaviate.classes.config as wc
+
+    return [
+        wc.Property(name="name", data_type=wc.DataType.TEXT, description="Representative name of the product"),
+        wc.Property(name="brand", data_type=wc.DataType.TEXT, description="Brand of the product"),
+        wc.Property(name="size", data_type=wc.DataType.TEXT, description="Normalized size (e.g., '250g', '1500ml')",
+                    skip_vectorization=True, tokenization=wc.Tokenization.FIELD),
+        wc.Property(name="offerCount", data_type=wc.DataType.INT, description="Number of offers linked to the product"),
+        wc.Property(name="publishers", data_type=wc.DataType.TEXT_ARRAY, description="Publishers that offer the product",
+                    skip_vectorization=True, tokenization=wc.Tokenization.FIELD),
+        wc.Property(name="minPrice", data_type=wc.DataType.NUMBER, description="Lowest sale price over all linked offers"),
+        wc.Property(name="cheapestPublisher", data_type=wc.DataType.TEXT, description="Publisher of the cheapest offer",
+                    skip_vectorization=True, tokenization=wc.Tokenization.FIELD),
+        wc.Property(name="cheapestOfferId", data_type=wc.DataType.TEXT, description="offerId of the cheapest offer",
+                    skip_vectorization=True, tokenization=wc.Tokenization.FIELD),
+        wc.Property(name="updatedAt", data_type=wc.DataType.DATE, description="When the offers were last resolved"),
+    ]
+
+
+def create_canonical_product_schema(client, collection_name=CANONICAL_COLLECTION_NAME):
+    """
+    Creates the 'CanonicalProduct' collection if it does not exist yet.
+    """
+    if not client:
+        print("Weaviate client not available to create schema.")
+        return
+
+    if client.collections.exists(collection_name):
+        return
+    import weaviate.classes.config as wc
+
+    print(f"Creating collection '{collection_name}'...")
+    client.collections.create(
+        name=collection_name,
+        properties=canonical_product_properties(),
+        vectorizer_config=wc.Configure.Vectorizer.text2vec_transformers(),
+    )
+
+
+def create_product_offer_schema(client, collection_name=COLLECTION_NAME, recreate=False):
     """
     Defines and creates the 'ProductOffer' collection schema in Weaviate.
+    An existing collection is only deleted and recreated when `recreate` is set;
+    otherwise use migrate_product_offer_schema() to bring it up to date.
     """
     if not client:
         print("Weaviate client not available to create schema.")
         return
 
-    collection_name = "ProductOffer"
+    import weaviate.classes.config as wc
 
     try:
         # Check if the collection already exists
         if client.collections.exists(collection_name):
+            if not recreate:
+                print(f"Collection '{collection_name}' already exists. Use migrate to update it in place.")
+                return
             print(f"Collection '{collection_name}' already exists. Deleting and recreating for fresh start.")
             client.collections.delete(collection_name)
 
         print(f"Creating collection '{collection_name}'...")
         client.collections.create(
             name=collection_name,
-            properties=[
-                wc.Property(name="name", data_type=wc.DataType.TEXT, description="Name of the product"),
-                wc.Property(name="brand", data_type=wc.DataType.TEXT, description="Brand of the product"),
-                wc.Property(name="description", data_type=wc.DataType.TEXT, description="Detailed description of the product"),
-                # Categories is a comma-separated string in your CSV, so store as TEXT for now.
-                # If you want it as an array (TEXT_ARRAY) for better filtering, you'll need to parse it during ingestion.
-                wc.Property(name="categories", data_type=wc.DataType.TEXT, description="Categories the product belongs to (comma-separated)"),
-                wc.Property(name="salePrice", data_type=wc.DataType.NUMBER, description="Sale price of the product"),
-                wc.Property(name="regularPrice", data_type=wc.DataType.NUMBER, description="Regular price of the product (if applicable)"),
-                wc.Property(name="currency", data_type=wc.DataType.TEXT, description="Currency of the price"),
-                wc.Property(name="imageURL", data_type=wc.DataType.TEXT, description="URL of the product image"),
-                wc.Property(name="offerId", data_type=wc.DataType.TEXT, description="Unique identifier for the offer from the publisher"),
-                wc.Property(name="publisher", data_type=wc.DataType.TEXT, description="Publisher of the offer (e.g., Action)"),
-                wc.Property(name="validFrom", data_type=wc.DataType.DATE, description="Start date and time when the offer is valid from"),
-                wc.Property(name="validTo", data_type=wc.DataType.DATE, description="End date and time when the offer is valid until"),
-                wc.Property(name="scrapedAt", data_type=wc.DataType.DATE, description="Timestamp when the data was scraped"),
-                wc.Property(
-                    name="specs",
-                    data_type=wc.DataType.OBJECT,
-                    description="Specifications of the product",
-                    nested_properties=[
-                        wc.Property(name="size", data_type=wc.DataType.TEXT, description="Size or dimensions of the product (e.g., '100 ml', '300 ml', '250 g')"),
-                        wc.Property(name="quantity", data_type=wc.DataType.INT, description="Number of items in a pack (e.g., '3 Stück', '50 Stück')"),
-                        wc.Property(name="material", data_type=wc.DataType.TEXT, description="Material of the product (e.g., '100 % Baumwolle')"),
-                        wc.Property(name="specialFeature", data_type=wc.DataType.TEXT, description="Any other notable feature from the description")
-                    ]
-                )
-            ],
+            properties=product_offer_properties(),
             # Configure the vectorizer module. Use 'text2vec-transformers' for local setup.
             # If using WCS with OpenAI, uncomment the OpenAI config.
             vectorizer_config=wc.Configure.Vectorizer.text2vec_transformers(), # For local with transformers module
@@ -61,8 +138,295 @@ def create_product_offer_schema(client):
     except Exception as e:
         print(f"Error creating schema: {e}")
 
-if __name__ == "__main__":
+
+def resolve_collection_name(client, name=COLLECTION_NAME):
+    """
+    Returns the collection behind `name`, following the alias if there is one.
+    """
+    alias = client.alias.get(alias_name=name)
+    return alias.collection if alias else name
+
+
+def _changed_nested_properties(desired, live, prefix):
+    # Nested properties (e.g. specs.energyClass) that are missing or typed differently in the live schema
+    live = {prop.name: prop for prop in live or []}
+    changed = []
+    for prop in desired or []:
+        path = f"{prefix}.{prop.name}"
+        if prop.name not in live or live[prop.name].data_type != prop.dataType:
+            changed.append(path)
+        else:
+            changed += _changed_nested_properties(prop.nestedProperties, live[prop.name].nested_properties, path)
+    return changed
+
+
+def diff_product_offer_schema(client, collection_name):
+    """
+    Compares the desired properties with the live collection, including the nested
+    properties of object properties such as `specs`.
+    Returns (missing properties, names of properties whose type or nested properties differ).
+    Nested properties cannot be added in place, so they count as changed.
+    """
+    live = {prop.name: prop for prop in client.collections.get(collection_name).config.get().properties}
+    desired = product_offer_properties()
+    missing = [prop for prop in desired if prop.name not in live]
+    changed = []
+    for prop in desired:
+        if prop.name not in live:
+            continue
+        if live[prop.name].data_type != prop.dataType:
+            changed.append(prop.name)
+        else:
+            changed += _changed_nested_properties(prop.nestedProperties, live[prop.name].nested_properties, prop.name)
+    return missing, changed
+
+
+def migrate_product_offer_schema(client, name=COLLECTION_NAME):
+    """
+    Non-destructive migration: adds properties missing from the live collection.
+    Existing objects and their vectors are kept, so nothing is re-embedded.
+    Returns False when a property changed type or nested properties, which needs blue_green_migrate() instead.
+    """
+    if not client:
+        print("Weaviate client not available to migrate schema.")
+        return False
+
+    collection_name = resolve_collection_name(client, name)
+    if not client.collections.exists(collection_name):
+        create_product_offer_schema(client, name)
+        return True
+
+    missing, changed = diff_product_offer_schema(client, collection_name)
+    if changed:
+        print(f"Properties changed type or nested properties in '{collection_name}': {', '.join(changed)}. Run a blue/green migration.")
+        return False
+
+    collection = client.collections.get(collection_name)
+    for prop in missing:
+        print(f"Adding property '{prop.name}' to '{collection_name}'...")
+        collection.config.add_property(prop)
+
+    print(f"Collection '{collection_name}' is up to date ({len(missing)} properties added).")
+    return True
+
+
+# Objects fetched per request when syncing collections by UUID
+SYNC_CHUNK_SIZE = 500
+
+# Diff and sync passes before a blue/green switch gives up on a collection that keeps changing
+SYNC_ROUNDS = 3
+
+
+def _add_copies(batch, objects, property_names):
+    # Re-adds objects with their stored vectors and UUIDs, so copying an object twice overwrites it
+    count = 0
+    for obj in objects:
+        properties = {key: value for key, value in obj.properties.items() if key in property_names}
+        batch.add_object(properties=properties, uuid=obj.uuid, vector=obj.vector.get("default"))
+        count += 1
+    return count
+
+
+def _copy_objects(client, source_name, target_name, property_names, batch_size):
+    """
+    Copies every object with its stored vector from one collection to another, keeping the UUIDs.
+    Returns the number of objects copied, or None if the batch reported failed objects.
+    """
+    source = client.collections.get(source_name)
+    target = client.collections.get(target_name)
+    with target.batch.fixed_size(batch_size=batch_size) as batch:
+        copied = _add_copies(batch, source.iterator(include_vector=True), property_names)
+
+    failed_objects = target.batch.failed_objects
+    if failed_objects:
+        print(f"Copying '{source_name}' to '{target_name}' failed for {len(failed_objects)} objects.")
+        return None
+    return copied
+
+
+def _cursor(collection):
+    # (UUID, last update time) of every object in UUID order; the cursor pages without offsets,
+    # so it is not capped at QUERY_MAXIMUM_RESULTS
+    for obj in collection.iterator(return_properties=[], return_metadata=["last_update_time"]):
+        yield str(obj.uuid), obj.metadata.last_update_time
+
+
+def diff_collections(client, source_name, target_name):
+    """
+    Compares a copy with its source object by object, walking both cursors in UUID order.
+    Returns (UUIDs missing from the target or updated in the source after they were copied,
+    UUIDs only the target has, e.g. offers deleted from the source since).
+    Updates count even when they keep scrapedAt and contentHash, like priceDropPct rewrites.
+    """
+    source = _cursor(client.collections.get(source_name))
+    target = _cursor(client.collections.get(target_name))
+    stale, extra = [], []
+    source_obj, target_obj = next(source, None), next(target, None)
+    while source_obj is not None or target_obj is not None:
+        if target_obj is None or (source_obj is not None and source_obj[0] < target_obj[0]):
+            stale.append(source_obj[0])
+            source_obj = next(source, None)
+        elif source_obj is None or target_obj[0] < source_obj[0]:
+            extra.append(target_obj[0])
+            target_obj = next(target, None)
+        else:
+            if source_obj[1] > target_obj[1]:
+                stale.append(source_obj[0])
+            source_obj, target_obj = next(source, None), next(target, None)
+    return stale, extra
+
+
+def _sync_objects(client, source_name, target_name, property_names, batch_size, stale, extra):
+    # Copies the stale objects over (fetched by id, any number of them) and deletes the extra ones.
+    # Returns False if the batch reported failed objects.
+    from weaviate.classes.query import Filter
+
+    source = client.collections.get(source_name)
+    target = client.collections.get(target_name)
+    with target.batch.fixed_size(batch_size=batch_size) as batch:
+        for start in range(0, len(stale), SYNC_CHUNK_SIZE):
+            chunk = stale[start:start + SYNC_CHUNK_SIZE]
+            response = source.query.fetch_objects(filters=Filter.by_id().contains_any(chunk), include_vector=True,
+                                                  limit=len(chunk))
+            _add_copies(batch, response.objects, property_names)
+
+    failed_objects = target.batch.failed_objects
+    if failed_objects:
+        print(f"Syncing '{source_name}' to '{target_name}' failed for {len(failed_objects)} objects.")
+        return False
+    for start in range(0, len(extra), SYNC_CHUNK_SIZE):
+        target.data.delete_many(where=Filter.by_id().contains_any(extra[start:start + SYNC_CHUNK_SIZE]))
+    return True
+
+
+def _catch_up(client, source_name, target_name, property_names, batch_size, rounds=SYNC_ROUNDS):
+    """
+    Diffs and syncs until the target matches the source object by object: writes, rewrites and
+    deletions that reached the source during the backfill. Returns True once a diff comes back
+    clean, False if the source keeps changing for `rounds` passes or a sync failed.
+    """
+    for _ in range(rounds):
+        stale, extra = diff_collections(client, source_name, target_name)
+        if not stale and not extra:
+            return True
+        print(f"Catching up '{target_name}': {len(stale)} new or updated and {len(extra)} deleted objects...")
+        if not _sync_objects(client, source_name, target_name, property_names, batch_size, stale, extra):
+            return False
+    stale, extra = diff_collections(client, source_name, target_name)
+    return not stale and not extra
+
+
+def _count_objects(client, collection_name):
+    return client.collections.get(collection_name).aggregate.over_all(total_count=True).total_count
+
+
+def blue_green_migrate(client, name=COLLECTION_NAME, batch_size=200, drop_old=False):
+    """
+    Builds a new collection with the current schema, backfills it from the live one
+    (copying the stored vectors, so nothing is re-embedded) and points the `name` alias at it.
+    Search keeps using the old collection until the alias flips.
+
+    Writes, rewrites and deletions that reach the old collection during the backfill are caught
+    up by diffing both collections by UUID and last update time, and the alias only moves once
+    that diff comes back clean. The old collection is kept for rollback unless `drop_old` is set.
+    """
+    if not client:
+        print("Weaviate client not available to migrate schema.")
+        return None
+
+    old_name = resolve_collection_name(client, name)
+    new_name = f"{name}_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+    if client.collections.exists(new_name):
+        print(f"Collection '{new_name}' already exists. Alias left on '{old_name}'.")
+        return None
+    create_product_offer_schema(client, new_name)
+    property_names = {prop.name for prop in product_offer_properties()}
+    first_switch = not client.alias.exists(alias_name=name)
+
+    copied = 0
+    if client.collections.exists(old_name):
+        print(f"Backfilling '{new_name}' from '{old_name}'...")
+        copied = _copy_objects(client, old_name, new_name, property_names, batch_size)
+        if copied is None:
+            print(f"Backfill failed. Alias left on '{old_name}'.")
+            return None
+
+        if not _catch_up(client, old_name, new_name, property_names, batch_size):
+            print(f"Verification failed: '{new_name}' does not match '{old_name}' object by object. "
+                  f"Alias left on '{old_name}'.")
+            return None
+        print(f"Verified '{new_name}' against '{old_name}' ({_count_objects(client, new_name)} objects).")
+
+        if first_switch and old_name == name and not drop_old:
+            # The live collection carries the alias name and has to go before the alias can be
+            # created, so keep a copy with its original schema as the rollback target
+            legacy_name = f"{name}_legacy_{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}"
+            config = client.collections.export_config(old_name)
+            client.collections.create_from_config(dataclasses.replace(config, name=legacy_name))
+            print(f"Copying '{old_name}' to '{legacy_name}' for rollback...")
+            if _copy_objects(client, old_name, legacy_name, {prop.name for prop in config.properties}, batch_size) is None:
+                print(f"Rollback copy failed. '{old_name}' left in place.")
+                return None
+            old_name = legacy_name
+
+    if first_switch:
+        if client.collections.exists(name):
+            # Changes that reached the original while it was verified and copied for rollback;
+            # after that only the delete and the alias creation are left (a gap of two API calls)
+            if not _catch_up(client, name, new_name, property_names, batch_size):
+                print(f"Final catch-up failed. '{name}' left in place.")
+                return None
+            client.collections.delete(name)
+        client.alias.create(alias_name=name, target_collection=new_name)
+    else:
+        client.alias.update(alias_name=name, new_target_collection=new_name)
+        # Writes that still went to the old collection before the flip. New writes now reach the
+        # new collection, so objects only it has are kept
+        if client.collections.exists(old_name) and old_name != new_name:
+            stale, _ = diff_collections(client, old_name, new_name)
+            _sync_objects(client, old_name, new_name, property_names, batch_size, stale, [])
+
+    print(f"Alias '{name}' now points to '{new_name}' ({copied} objects copied).")
+    if old_name != name and old_name != new_name and client.collections.exists(old_name):
+        if drop_old:
+            client.collections.delete(old_name)
+            print(f"Deleted old collection '{old_name}'.")
+        else:
+            print(f"Old collection '{old_name}' kept for rollback; delete it once the new one is verified "
+                  f"(or run with --drop-old).")
+    return new_name
+
+
+def main(argv=None):
+    """
+    Command line entry point (also `cli.py migrate-schema`).
+    """
+    parser = argparse.ArgumentParser(description="Create or migrate the ProductOffer schema.")
+    parser.add_argument("--mode", choices=["migrate", "blue-green", "recreate"], default="migrate",
+                        help="migrate: add missing properties in place (default); "
+                             "blue-green: build, backfill and swap a new collection; "
+                             "recreate: delete and recreate (drops all data)")
+    parser.add_argument("--drop-old", action="store_true",
+                        help="blue-green: delete the old collection once the alias points to the verified new one")
+    parser.add_argument("--rekey-offers", action="store_true",
+                        help="One-off: move offers still stored under their offerId UUID to their current UUID "
+                             "(offerId + name), removing the duplicates they cause in search")
+    args = parser.parse_args(argv)
+
     client = get_weaviate_client()
     if client:
-        create_product_offer_schema(client)
-        client.close()
\ No newline at end of file
+        create_canonical_product_schema(client)
+        if args.rekey_offers and args.mode != "recreate":
+            # Before a blue/green backfill, so the duplicates are not copied along
+            from import_data import rekey_legacy_offers
+            rekey_legacy_offers(client)
+        if args.mode == "migrate":
+            migrate_product_offer_schema(client)
+        elif args.mode == "blue-green":
+            blue_green_migrate(client, drop_old=args.drop_old)
+        else:
+            create_product_offer_schema(client, recreate=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# specs.py
+import json
+import os
+import re
+from functools import lru_cache
+
+# Table of units, quantity words and materials; edit it to teach the extractor new terms
+SPEC_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "spec_rules.json")
+
+# Number like "100", "3.9" or "3,9"
+_NUMBER = r'\d+(?:[.,]\d+)?'
+
+
+def _alternation(terms):
+    """
+    Builds a regex alternation from literal terms, longest first so that
+    e.g. "ABS-Kunststoff" wins over "Kunststoff". Spaces match any whitespace.
+    """
+    ordered = sorted(set(terms), key=len, reverse=True)
+    return "|".join(re.escape(term).replace(r'\ ', r'\s*') for term in ordered)
+
+
+class SpecRules:
+    """
+    Precompiled patterns built from a rules table (see spec_rules.json).
+    """
+
+    def __init__(self, size_units, quantity_words, materials):
+        # Example: "100 ml", "250 g", "3,9 ml", "190 x 300 x 125 cm"
+        self.size = re.compile(
+            rf'({_NUMBER}(?:\s*x\s*{_NUMBER})*\s*(?:{_alternation(size_units)})\b)', re.IGNORECASE
+        )
+        # Example: "3 Stück", "50 Stück", "2 St"
+        self.quantity = re.compile(rf'(\d+)\s*(?:{_alternation(quantity_words)})\b', re.IGNORECASE)
+        # Example: "100 % Baumwolle", "Kunststoff", "Velours-Stoff", "ABS-Kunststoff"
+        self.material = re.compile(rf'({_alternation(materials)})', re.IGNORECASE)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            table = json.load(f)
+        return cls(table.get("size_units", []), table.get("quantity_words", []), table.get("materials", []))
+
+
+_rules = None
+
+
+def get_spec_rules():
+    """
+    Returns the compiled rules, loading the table on first use.
+    """
+    global _rules
+    if _rules is None:
+        _rules = SpecRules.from_file(SPEC_RULES_PATH)
+    return _rules
+
+
+def set_spec_rules(rules):
+    """
+    Replaces the active rules (e.g. SpecRules.from_file(other_table)) and drops memoized results.
+    """
+    global _rules
+    _rules = rules
+    _extract_specs.cache_clear()
+
+
+def _cut(text, match):
+    # Remove the matched span and tidy up the remaining text
+    return (text[:match.start()] + text[match.end():]).strip()
+
+
+@lru_cache(maxsize=65536)
+def _extract_specs(description):
+    rules = get_spec_rules()
+    size = quantity = material = None
+    working_description = description
+
+    size_match = rules.size.search(working_description)
+    if size_match:
+        size = size_match.group(1).strip()
+        working_description = _cut(working_description, size_match)
+
+    quantity_match = rules.quantity.search(working_description)
+    if quantity_match:
+        quantity = int(quantity_match.group(1))
+        working_description = _cut(working_description, quantity_match)
+
+    material_match = rules.material.search(working_description)
+    if material_match:
+        material = material_match.group(1).strip()
+        working_description = _cut(working_description, material_match)
+
+    # The rest of the description can be a special feature
+    return size, quantity, material, working_description.strip() or None
+
+
+def extract_specs_from_description(description):
+    """
+    Extracts size, quantity, material and the remaining text (specialFeature) from a description.
+    Results for repeated descriptions are memoized.
+    """
+    if not description or not isinstance(description, str):
+        return {"size": None, "quantity": None, "material": None, "specialFeature": None}
+
+    size, quantity, material, special_feature = _extract_specs(description)
+    return {"size": size, "quantity": quantity, "material": material, "specialFeature": special_feature}
+
+
+def extract_specs_batch(descriptions):
+    """
+    Extracts specs for a list (or array) of descriptions in one pass.
+    Duplicate descriptions are parsed once; every product still gets its own dict.
+    """
+    parsed = {}
+    results = []
+    for description in descriptions:
+        key = description if isinstance(description, str) else None
+        if key not in parsed:
+            parsed[key] = extract_specs_from_description(key)
+        results.append(dict(parsed[key]))
+    return results